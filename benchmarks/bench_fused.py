@@ -0,0 +1,103 @@
+"""
+Three-agent chain vs fused single-call agent mode, side by side.
+
+Each topic is researched once per mode with the completion cache bypassed,
+alternating the order so neither mode benefits from warmer connections.
+Reports end-to-end latency, generation latency (agent stages only) and
+the token usage reported by the provider.
+
+Needs the Agents SDK and OPENAI_API_KEY; point OPENAI_BASE_URL at a local
+stub to run it offline.
+
+Usage:
+    python benchmarks/bench_fused.py "Quantum error correction" "Solid-state batteries"
+    python benchmarks/bench_fused.py --topics topics.txt --rounds 2
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sage_lens_batch import quiet_streamlit, read_topics  # noqa: E402
+
+MODES = {"chain": False, "fused": True}
+AGENT_STAGES = {"research_agent", "content_agent", "analysis_agent", "fused_agent"}
+
+
+def generation_time(result) -> float:
+    """Wall time from the first agent stage starting to the last one ending"""
+    tasks = [t for t in result["metadata"]["timings"]["tasks"] if t["task"] in AGENT_STAGES]
+    if not tasks:
+        return 0.0
+    return max(t["end"] for t in tasks) - min(t["start"] for t in tasks)
+
+
+def measure(system, topics, rounds: int):
+    samples = {mode: [] for mode in MODES}
+    for round_ in range(rounds):
+        for i, topic in enumerate(topics):
+            order = list(MODES) if (round_ + i) % 2 == 0 else list(reversed(MODES))
+            for mode in order:
+                started = time.perf_counter()
+                result = system.process_query_agentic(topic, use_agents=True, use_cache=False, fused=MODES[mode])
+                usage = result["metadata"].get("usage") or {"input_tokens": 0, "output_tokens": 0}
+                samples[mode].append({
+                    "total": time.perf_counter() - started,
+                    "generation": generation_time(result),
+                    "input_tokens": usage["input_tokens"],
+                    "output_tokens": usage["output_tokens"],
+                    "ok": bool(result.get("content")) and bool(result.get("analysis"))
+                })
+    return samples
+
+
+def report(samples):
+    print(f"{'mode':<6} {'runs':>5} {'ok':>4} {'total p50 (s)':>14} {'gen p50 (s)':>12} {'in tok':>8} {'out tok':>8}")
+    for mode, runs in samples.items():
+        print(
+            f"{mode:<6} {len(runs):>5} {sum(r['ok'] for r in runs):>4} "
+            f"{statistics.median(r['total'] for r in runs):>14.2f} "
+            f"{statistics.median(r['generation'] for r in runs):>12.2f} "
+            f"{statistics.mean(r['input_tokens'] for r in runs):>8.0f} "
+            f"{statistics.mean(r['output_tokens'] for r in runs):>8.0f}"
+        )
+    chain, fused = samples["chain"], samples["fused"]
+    saved = statistics.median(r["generation"] for r in chain) - statistics.median(r["generation"] for r in fused)
+    chain_tokens = statistics.mean(r["input_tokens"] + r["output_tokens"] for r in chain)
+    fused_tokens = statistics.mean(r["input_tokens"] + r["output_tokens"] for r in fused)
+    print(f"fused saves {saved:.2f}s of generation and {chain_tokens - fused_tokens:.0f} tokens per query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("topics", nargs="*", help="topics to research")
+    parser.add_argument("--topics", dest="topics_file", help="file with one topic per line")
+    parser.add_argument("--rounds", type=int, default=1, help="passes over the topic list")
+    args = parser.parse_args()
+
+    topics = list(args.topics)
+    if args.topics_file:
+        with open(args.topics_file, encoding="utf-8") as f:
+            topics += read_topics(f)
+    if not topics:
+        parser.error("give at least one topic")
+
+    quiet_streamlit()
+    from sage_lens_enhanced import SageLensAgenticSystem
+
+    system = SageLensAgenticSystem()
+    if not system.agents_initialized:
+        print("OpenAI Agents SDK not available - both modes need it", file=sys.stderr)
+        sys.exit(2)
+    try:
+        report(measure(system, topics, max(1, args.rounds)))
+    finally:
+        system.close()
+
+
+if __name__ == "__main__":
+    main()
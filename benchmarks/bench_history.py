@@ -0,0 +1,163 @@
+"""
+Version history storage: full copies vs delta-encoded versions.
+
+Builds a seeded, realistic history: several topics, each regenerated a
+number of times. Every regeneration rewrites a share of the document's
+paragraphs and analysis and reshuffles part of the references, the way a
+fresh LLM run does. Each version is stored in both layouts:
+
+  before: full result dicts held in session state (serialized size), and
+          every version compressed in full on disk (keyframe_every=1)
+  after:  version summaries in session state, and versions stored as
+          deltas against the previous version of the topic
+
+Reports bytes per version for each, plus add and reconstruction (Load
+Version) latency for the delta store. No API keys needed.
+
+Usage:
+    python benchmarks/bench_history.py
+    python benchmarks/bench_history.py --topics 5 --versions 12 --churn 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sage_lens_history import HistoryStore, summarize  # noqa: E402
+
+WORDS = (
+    "model data system performance latency training inference research method result "
+    "architecture memory token attention layer scale benchmark accuracy cost deploy "
+    "pipeline agent search source analysis evidence approach limitation future design"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 24))).capitalize() + "."
+
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(sentence(rng) for _ in range(rng.randint(3, 6)))
+
+
+def document(rng: random.Random, sections: int) -> list:
+    """Markdown blocks: headings, paragraphs and bullet lists"""
+    blocks = []
+    for i in range(sections):
+        blocks.append(f"## Section {i + 1}: {' '.join(rng.choice(WORDS) for _ in range(3)).title()}")
+        blocks += [paragraph(rng) for _ in range(3)]
+        blocks.append("\n".join(f"- {sentence(rng)}" for _ in range(4)))
+    return blocks
+
+
+def revise(rng: random.Random, blocks: list, churn: float) -> list:
+    """A regeneration: rewrite roughly `churn` of the blocks"""
+    return [paragraph(rng) if rng.random() < churn else block for block in blocks]
+
+
+def reference(rng: random.Random, i: int) -> dict:
+    return {
+        "title": " ".join(rng.choice(WORDS) for _ in range(6)).title(),
+        "url": f"https://example{i}.com/{rng.choice(WORDS)}/{rng.randint(1, 9999)}",
+        "snippet": sentence(rng) + " " + sentence(rng),
+        "source": rng.choice(["Tavily", "Serper"])
+    }
+
+
+def make_result(rng: random.Random, topic: str, version: int, content: list, analysis: list, web: list) -> dict:
+    return {
+        "content": {"provider": "Agent-content_agent", "content": "\n\n".join(content), "latency": rng.uniform(8, 30)},
+        "analysis": {"provider": "Agent-analysis_agent", "content": "\n\n".join(analysis), "latency": rng.uniform(4, 12)},
+        "references": {
+            "web": web,
+            "videos": [{"title": sentence(rng), "url": f"https://youtube.com/watch?v={rng.randint(1, 10 ** 9)}", "views": f"{rng.randint(1, 900)}K views"} for _ in range(5)]
+        },
+        "metadata": {
+            "timestamp": f"2026-10-18T{version // 60:02d}:{version % 60:02d}:00",
+            "topic": topic,
+            "method": "agentic",
+            "agent_mode": "chain",
+            "usage": {"input_tokens": rng.randint(2000, 6000), "output_tokens": rng.randint(2000, 5000)}
+        }
+    }
+
+
+def build_history(topics: int, versions: int, churn: float, seed: int) -> list:
+    """Results in the order a user would produce them, topics interleaved"""
+    rng = random.Random(seed)
+    state = []
+    for t in range(topics):
+        state.append({
+            "topic": f"Research topic {t}",
+            "content": document(rng, 8),
+            "analysis": document(rng, 3),
+            "web": [reference(rng, i) for i in range(10)]
+        })
+    history = []
+    for version in range(versions):
+        for topic in state:
+            if version:
+                topic["content"] = revise(rng, topic["content"], churn)
+                topic["analysis"] = revise(rng, topic["analysis"], churn)
+                keep = [r for r in topic["web"] if rng.random() > churn]
+                topic["web"] = (keep + [reference(rng, rng.randint(0, 10 ** 6)) for _ in range(10)])[:10]
+            history.append(make_result(rng, topic["topic"], version, topic["content"], topic["analysis"], list(topic["web"])))
+    return history
+
+
+def measure(history: list, keyframe_every: int):
+    path = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+    store = HistoryStore(path, max_per_session=len(history), max_bytes=1 << 40, keyframe_every=keyframe_every)
+    add_times, ids = [], []
+    for result in history:
+        started = time.perf_counter()
+        ids.append(store.add("bench", result))
+        add_times.append(time.perf_counter() - started)
+    load_times = []
+    for version_id, result in zip(ids, history):
+        started = time.perf_counter()
+        loaded = store.load("bench", version_id)
+        load_times.append(time.perf_counter() - started)
+        assert loaded == result, f"version {version_id} did not round-trip"
+    return store.stats(), add_times, load_times
+
+
+def report(history: list, keyframe_every: int):
+    count = len(history)
+    session_before = sum(len(json.dumps(result)) for result in history)
+    session_after = sum(len(json.dumps(summarize(result))) for result in history)
+    full, _, full_loads = measure(history, 1)
+    delta, add_times, load_times = measure(history, keyframe_every)
+
+    print(f"{count} versions, {count and session_before // count:,} bytes of JSON each on average\n")
+    print(f"{'':<28} {'before':>12} {'after':>12}")
+    print(f"{'session state / version':<28} {session_before / count:>12,.0f} {session_after / count:>12,.0f}")
+    print(f"{'disk / version':<28} {full['bytes'] / count:>12,.0f} {delta['bytes'] / count:>12,.0f}")
+    print(f"{'load p50 (ms)':<28} {statistics.median(full_loads) * 1000:>12.2f} {statistics.median(load_times) * 1000:>12.2f}")
+    print(f"{'load max (ms)':<28} {max(full_loads) * 1000:>12.2f} {max(load_times) * 1000:>12.2f}")
+    print(
+        f"\n{delta['delta_versions']} of {count} versions stored as deltas (keyframe every {keyframe_every}); "
+        f"disk {full['bytes'] / max(1, delta['bytes']):.1f}x smaller, add p50 {statistics.median(add_times) * 1000:.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=4, help="distinct topics in the history")
+    parser.add_argument("--versions", type=int, default=10, help="versions generated per topic")
+    parser.add_argument("--churn", type=float, default=0.25, help="share of blocks rewritten per regeneration")
+    parser.add_argument("--keyframe-every", type=int, default=10, help="store every n-th version of a topic in full")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    report(build_history(args.topics, args.versions, args.churn, args.seed), args.keyframe_every)
+
+
+if __name__ == "__main__":
+    main()
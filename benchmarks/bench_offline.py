@@ -0,0 +1,361 @@
+"""
+End-to-end pipeline benchmark against local stand-ins for every API.
+
+Starts the stand-in servers (benchmarks/stub_servers.py) in-process,
+points both apps at them and researches a set of distinct synthetic
+topics with each selected pipeline:
+
+  chain     process_query_agentic, three-agent chain (needs the Agents SDK)
+  fused     process_query_agentic, fused single-call agents (Agents SDK)
+  ensemble  process_query_agentic without agents: every provider races
+  async     process_query_async on one event loop, agent chain
+  legacy    SageLensSystem.process_query from sage-lens.py
+
+Reports throughput, query latency percentiles, per-stage percentiles taken
+from each query's trace, failed queries, requests and injected errors per
+stand-in, and memory: growth in peak RSS, plus the Python heap peak with
+--tracemalloc. The completion cache is bypassed and rate limits are lifted
+unless --rate-limits is given. Results are saved as JSON named after the
+current commit, so runs on two commits can be compared with --compare. No
+API keys or network needed.
+
+Usage:
+    python benchmarks/bench_offline.py
+    python benchmarks/bench_offline.py --pipelines chain,async --queries 40 --concurrency 8 --stream
+    python benchmarks/bench_offline.py --set openai.median_ms=3000 --set serper.error_rate=0.1
+    python benchmarks/bench_offline.py --compare benchmarks/results/1a2b3c4.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sage_lens_batch import percentile, quiet_streamlit  # noqa: E402
+from sage_lens_concurrency import QUERY_FAN_OUT  # noqa: E402
+from stub_servers import StubServers, parse_overrides  # noqa: E402
+
+PIPELINES = ["chain", "fused", "ensemble", "async", "legacy"]
+RATE_LIMITED = ["openai", "anthropic", "deepseek", "tavily", "serper"]
+
+# System config entry -> stand-in environment variable
+CONFIG_ENV = {
+    "openai_key": "OPENAI_API_KEY",
+    "anthropic_key": "ANTHROPIC_API_KEY",
+    "deepseek_key": "DEEPSEEK_API_KEY",
+    "tavily_key": "TAVILY_API_KEY",
+    "serper_key": "SERPER_API_KEY",
+    "openai_base_url": "OPENAI_BASE_URL",
+    "anthropic_base_url": "ANTHROPIC_BASE_URL",
+    "deepseek_base_url": "DEEPSEEK_BASE_URL",
+    "tavily_base_url": "TAVILY_BASE_URL",
+    "serper_url": "SERPER_URL",
+    "youtube_base_url": "YOUTUBE_BASE_URL"
+}
+
+SUBJECTS = [
+    "retrieval augmented generation", "solid-state batteries", "quantum error correction",
+    "vector databases", "small language models", "carbon capture", "edge inference",
+    "protein structure prediction", "speculative decoding", "grid-scale storage"
+]
+
+
+def topics(pipeline: str, count: int) -> List[str]:
+    """Distinct per pipeline, so no pipeline is served another's cached searches"""
+    return [f"{SUBJECTS[i % len(SUBJECTS)]} ({pipeline} {i + 1})" for i in range(count)]
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--"], cwd=ROOT).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": False}
+    return {"commit": commit, "dirty": dirty}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def stage_durations(result: Dict[str, Any]) -> Dict[str, float]:
+    """Seconds per stage of one query's trace; LLM calls are split by stage"""
+    stages: Dict[str, float] = {}
+    for span in ((result.get("metadata") or {}).get("trace") or {}).get("spans", []):
+        if span["parent_id"] is None:
+            continue
+        name = span["name"]
+        if name.startswith("llm.") and "stage" in span["attributes"]:
+            name = f"{name}[{span['attributes']['stage']}]"
+        stages[name] = stages.get(name, 0.0) + span["duration"]
+    return stages
+
+
+def query_record(result: Optional[Dict[str, Any]], elapsed: float, error: Optional[str] = None) -> Dict[str, Any]:
+    if error is None and result is not None:
+        error = (result.get("metadata") or {}).get("error") or (None if result.get("content") else "no content generated")
+    return {"elapsed": elapsed, "error": error, "stages": stage_durations(result) if result else {}}
+
+
+def load_systems(config_overrides: Dict[str, str], concurrency: int) -> Dict[str, Callable[[], Any]]:
+    """Builders for the enhanced and legacy systems, configured for the stand-ins"""
+    from sage_lens_enhanced import SageLensAgenticSystem
+
+    spec = importlib.util.spec_from_file_location("sage_lens_legacy", os.path.join(ROOT, "sage-lens.py"))
+    legacy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(legacy)
+
+    def configured(system_class):
+        # resolve_config loads .env; the stand-in keys and endpoints win over it
+        config = system_class.resolve_config()
+        config.update({key: config_overrides[var] for key, var in CONFIG_ENV.items() if key in config})
+        if "max_workers" in config:
+            # Enough pool workers for every query in flight, as the batch runner sizes it
+            config["max_workers"] = max(config["max_workers"], concurrency * QUERY_FAN_OUT)
+        return system_class(config=config)
+
+    return {
+        "enhanced": lambda: configured(SageLensAgenticSystem),
+        "legacy": lambda: configured(legacy.SageLensSystem)
+    }
+
+
+def run_pipeline(pipeline: str, system, queries: List[str], concurrency: int, stream: bool) -> List[Dict[str, Any]]:
+    on_delta = (lambda *_: None) if stream else None
+
+    if pipeline == "async":
+        async def run_all():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def research(topic: str):
+                async with slots:
+                    started = time.perf_counter()
+                    try:
+                        result = await system.process_query_async(topic, use_agents=True, on_delta=on_delta, use_cache=False)
+                        return query_record(result, time.perf_counter() - started)
+                    except Exception as e:
+                        return query_record(None, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+
+            try:
+                return await asyncio.gather(*(research(topic) for topic in queries))
+            finally:
+                await system.aclose()
+
+        return list(asyncio.run(run_all()))
+
+    def research(topic: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            if pipeline == "legacy":
+                result = system.process_query(topic, on_delta=on_delta, use_cache=False)
+            else:
+                result = system.process_query_agentic(
+                    topic, use_agents=pipeline != "ensemble", on_delta=on_delta, use_cache=False, fused=pipeline == "fused"
+                )
+            return query_record(result, time.perf_counter() - started)
+        except Exception as e:
+            return query_record(None, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(research, queries))
+
+
+def summarize(records: List[Dict[str, Any]], wall: float, memory: Dict[str, float], stub_requests: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    latencies = [r["elapsed"] for r in records]
+    stages: Dict[str, List[float]] = {}
+    for record in records:
+        for name, seconds in record["stages"].items():
+            stages.setdefault(name, []).append(seconds)
+    errors: Dict[str, int] = {}
+    for record in records:
+        if record["error"]:
+            errors[record["error"][:120]] = errors.get(record["error"][:120], 0) + 1
+    return {
+        "queries": len(records),
+        "failed": sum(1 for r in records if r["error"]),
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_qps": len(records) / wall if wall else 0.0,
+        "latency": {
+            "mean": statistics.mean(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=0.0)
+        },
+        "stages": {
+            name: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "max": max(values)}
+            for name, values in sorted(stages.items())
+        },
+        "memory": memory,
+        "stub_requests": stub_requests
+    }
+
+
+def print_summary(name: str, summary: Dict[str, Any]):
+    latency = summary["latency"]
+    print(
+        f"\n== {name}: {summary['queries']} queries, {summary['failed']} failed, "
+        f"{summary['throughput_qps']:.2f} queries/s over {summary['wall_seconds']:.1f}s"
+    )
+    print(f"   latency  p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s  p99 {latency['p99']:.2f}s  max {latency['max']:.2f}s")
+    memory = summary["memory"]
+    heap = f", Python heap peak {memory['heap_peak_mb']:.1f} MB" if "heap_peak_mb" in memory else ""
+    print(f"   memory   peak RSS {memory['peak_rss_mb']:.0f} MB (+{memory['peak_rss_growth_mb']:.1f} MB){heap}")
+    if summary["stages"]:
+        print(f"   {'stage':<28} {'count':>6} {'p50 (s)':>9} {'p95 (s)':>9} {'max (s)':>9}")
+        for stage, s in summary["stages"].items():
+            print(f"   {stage:<28} {s['count']:>6} {s['p50']:>9.3f} {s['p95']:>9.3f} {s['max']:>9.3f}")
+    else:
+        print("   (no per-stage trace for this pipeline)")
+    calls = ", ".join(
+        f"{provider} {counts['requests']}" + (f" ({counts['errors']} errors)" if counts["errors"] else "")
+        for provider, counts in summary["stub_requests"].items() if counts["requests"]
+    )
+    print(f"   stand-in requests: {calls or 'none'}")
+    for error, count in summary["errors"].items():
+        print(f"   {count} x {error}")
+
+
+def change(before: float, after: float) -> str:
+    return f"{(after - before) / before:+.0%}" if before else "n/a"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    print(f"\nCompared with {baseline['commit']}{' (dirty)' if baseline.get('dirty') else ''} from {baseline['timestamp'][:19]}:")
+    print(f"{'pipeline':<10} {'metric':<30} {'before':>10} {'after':>10} {'change':>8}")
+    for name, after in current["pipelines"].items():
+        before = baseline["pipelines"].get(name)
+        if not before:
+            continue
+        rows = [
+            ("queries/s", before["throughput_qps"], after["throughput_qps"]),
+            ("latency p50 (s)", before["latency"]["p50"], after["latency"]["p50"]),
+            ("latency p95 (s)", before["latency"]["p95"], after["latency"]["p95"]),
+            ("failed", before["failed"], after["failed"]),
+            ("peak RSS growth (MB)", before["memory"]["peak_rss_growth_mb"], after["memory"]["peak_rss_growth_mb"])
+        ]
+        rows += [
+            (f"{stage} p95 (s)", before["stages"][stage]["p95"], stats["p95"])
+            for stage, stats in after["stages"].items() if stage in before["stages"]
+        ]
+        for metric, b, a in rows:
+            print(f"{name:<10} {metric:<30} {b:>10.3f} {a:>10.3f} {change(b, a):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipelines", default=",".join(PIPELINES), help=f"comma-separated, from {', '.join(PIPELINES)}")
+    parser.add_argument("--queries", type=int, default=20, help="topics researched per pipeline")
+    parser.add_argument("--concurrency", type=int, default=4, help="queries in flight at once")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed queries per pipeline before measuring")
+    parser.add_argument("--stream", action="store_true", help="stream tokens, as the UI does")
+    parser.add_argument("--set", dest="settings", action="append", default=[], metavar="PROVIDER.KEY=VALUE", help="stand-in profile override, see stub_servers.py")
+    parser.add_argument("--seed", type=int, default=7, help="seed for stand-in latencies, errors and content")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the configured provider rate limits")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record the Python heap peak (slows the run)")
+    parser.add_argument("--output-dir", default=os.path.join(ROOT, "benchmarks", "results"), help="where the results JSON is saved")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    selected = [p.strip() for p in args.pipelines.split(",") if p.strip()]
+    unknown = [p for p in selected if p not in PIPELINES]
+    if unknown:
+        parser.error(f"unknown pipelines: {', '.join(unknown)}")
+    try:
+        profiles = parse_overrides(args.settings)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stubs = StubServers(profiles=profiles, seed=args.seed).start()
+    os.environ.update(stubs.env())
+    # Fresh caches and history, and traces kept in memory only
+    os.environ["SAGE_LENS_CACHE_DIR"] = tempfile.mkdtemp(prefix="sage_lens_bench_")
+    os.environ["SAGE_LENS_TRACE_FILE_MB"] = "0"
+    if not args.rate_limits:
+        for provider in RATE_LIMITED:
+            os.environ[f"SAGE_LENS_RPM_{provider.upper()}"] = "0"
+            os.environ[f"SAGE_LENS_TPM_{provider.upper()}"] = "0"
+
+    quiet_streamlit()
+    concurrency = max(1, args.concurrency)
+    builders = load_systems(stubs.env(), concurrency)
+    systems = {"enhanced": builders["enhanced"]()}
+    if "legacy" in selected:
+        systems["legacy"] = builders["legacy"]()
+
+    results = dict(
+        git_revision(),
+        timestamp=datetime.now().isoformat(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        settings={"queries": args.queries, "concurrency": concurrency, "stream": args.stream, "rate_limits": args.rate_limits, "seed": args.seed},
+        profiles=stubs.profiles,
+        pipelines={}
+    )
+    print(f"Stand-ins on {stubs.url}; {args.queries} queries per pipeline, concurrency {concurrency}")
+    try:
+        for pipeline in selected:
+            system = systems["legacy" if pipeline == "legacy" else "enhanced"]
+            if pipeline in ("chain", "fused", "async") and not system.agents_initialized:
+                print(f"\n== {pipeline}: skipped, the OpenAI Agents SDK is not installed")
+                continue
+            if args.warmup:
+                run_pipeline(pipeline, system, topics(f"{pipeline} warm-up", args.warmup), concurrency, args.stream)
+
+            stub_before = stubs.stats()
+            rss_before = peak_rss_mb()
+            if args.tracemalloc:
+                tracemalloc.start()
+            started = time.perf_counter()
+            records = run_pipeline(pipeline, system, topics(pipeline, args.queries), concurrency, args.stream)
+            wall = time.perf_counter() - started
+            memory = {"peak_rss_mb": peak_rss_mb(), "peak_rss_growth_mb": peak_rss_mb() - rss_before}
+            if args.tracemalloc:
+                memory["heap_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+            stub_after = stubs.stats()
+            stub_requests = {
+                provider: {field: stub_after[provider][field] - stub_before[provider][field] for field in counts}
+                for provider, counts in stub_after.items()
+            }
+
+            summary = summarize(records, wall, memory, stub_requests)
+            results["pipelines"][pipeline] = summary
+            print_summary(pipeline, summary)
+    finally:
+        for system in systems.values():
+            system.close()
+        stubs.stop()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{results['commit']}{'-dirty' if results['dirty'] else ''}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold vs warm first-request latency for the shared system registry.
+
+Cold: a fresh registry builds SageLensAgenticSystem (secrets, clients,
+agents) and the first request opens new TCP+TLS connections.
+Warm: the registry hands back the already-built system and the request
+reuses its pooled connections.
+
+The request is a cheap authenticated call (models.list) so no tokens are
+spent. Point OPENAI_BASE_URL at a local stub to run it offline.
+
+Usage:
+    python benchmarks/bench_registry.py --rounds 5
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sage_lens_enhanced import SageLensAgenticSystem  # noqa: E402
+from sage_lens_registry import SystemRegistry  # noqa: E402
+
+
+def first_request(system) -> float:
+    started = time.perf_counter()
+    system.openai_client.models.list()
+    return time.perf_counter() - started
+
+
+def get_system(registry: SystemRegistry):
+    config = SageLensAgenticSystem.resolve_config()
+    return registry.get("agentic", config, lambda cfg: SageLensAgenticSystem(config=cfg))
+
+
+def measure(rounds: int):
+    cold, warm = [], []
+    for _ in range(rounds):
+        # Cold: nothing built yet, no open connections
+        registry = SystemRegistry()
+        started = time.perf_counter()
+        system = get_system(registry)
+        build = time.perf_counter() - started
+        cold.append((build, first_request(system)))
+
+        # Warm: same registry, same clients, pooled connections
+        started = time.perf_counter()
+        system = get_system(registry)
+        lookup = time.perf_counter() - started
+        warm.append((lookup, first_request(system)))
+        registry.clear()
+    return cold, warm
+
+
+def report(label: str, samples):
+    setup = [s[0] for s in samples]
+    request = [s[1] for s in samples]
+    total = [a + b for a, b in samples]
+    print(
+        f"{label:<5} setup p50 {statistics.median(setup) * 1000:8.1f} ms | "
+        f"request p50 {statistics.median(request) * 1000:8.1f} ms | "
+        f"total p50 {statistics.median(total) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="cold/warm pairs to measure")
+    args = parser.parse_args()
+
+    cold, warm = measure(args.rounds)
+    report("cold", cold)
+    report("warm", warm)
+    saved = statistics.median([a + b for a, b in cold]) - statistics.median([a + b for a, b in warm])
+    print(f"warm reuse saves {saved * 1000:.1f} ms per first request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Script run time per rerun of the results view on a large result.
+
+Loads a large synthetic result (long document and analysis, dozens of
+references and videos) into a headless Streamlit session of the enhanced
+app and times full reruns with each result tab selected - the cost of any
+widget interaction on the page. No API keys or network needed.
+
+Usage:
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --references 80 --words 8000 --reruns 20
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sage_lens_batch import quiet_streamlit  # noqa: E402
+
+WORDS = (
+    "model data system performance latency training inference research method result "
+    "architecture memory token attention layer scale benchmark accuracy cost deploy"
+).split()
+TABS = ["📝 Content", "🔗 References", "🎬 Top Videos", "📊 Analysis", "⚙️ Workflow", "📈 Metrics"]
+
+
+def text(rng: random.Random, words: int) -> str:
+    """Markdown with a heading every ~150 words and a list every ~300"""
+    blocks, written = [], 0
+    while written < words:
+        blocks.append(f"## {' '.join(rng.choice(WORDS) for _ in range(3)).title()}")
+        blocks.append(" ".join(rng.choice(WORDS) for _ in range(120)))
+        blocks.append("\n".join(f"- {' '.join(rng.choice(WORDS) for _ in range(10))}" for _ in range(3)))
+        written += 153
+    return "\n\n".join(blocks)
+
+
+def large_result(references: int, videos: int, words: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    return {
+        "content": {"provider": "Agent-content_agent", "content": text(rng, words), "latency": 21.4},
+        "analysis": {"provider": "Agent-analysis_agent", "content": text(rng, words // 3), "latency": 9.8},
+        "references": {
+            "web": [
+                {
+                    "title": " ".join(rng.choice(WORDS) for _ in range(8)).title(),
+                    "url": f"https://example{i}.com/{rng.choice(WORDS)}",
+                    "snippet": " ".join(rng.choice(WORDS) for _ in range(50)),
+                    "sources": rng.sample(["serper", "tavily"], rng.randint(1, 2))
+                }
+                for i in range(references)
+            ],
+            "videos": [
+                {"title": " ".join(rng.choice(WORDS) for _ in range(7)), "url": f"https://youtube.com/watch?v={i}", "views": f"{i}K", "views_num": i * 1000}
+                for i in range(videos)
+            ]
+        },
+        "metadata": {
+            "id": "bench-render",
+            "timestamp": "2026-10-18T12:00:00",
+            "topic": "Render benchmark",
+            "method": "agentic",
+            "agent_mode": "chain",
+            "tavily_used": True,
+            "serper_used": True
+        }
+    }
+
+
+def history(count: int) -> list:
+    return [
+        {"id": i, "timestamp": f"2026-10-18T12:{i:02d}:00", "topic": "Render benchmark", "method": "agentic", "provider": "Agent-content_agent", "latency": 20.0}
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(result: dict, reruns: int, versions: int):
+    from streamlit.testing.v1 import AppTest
+
+    # Run main() from an imported module: a server compiles the script once,
+    # while AppTest.from_file would recompile the whole file on every run
+    script = f"import sys\nsys.path.insert(0, {ROOT!r})\nimport sage_lens_enhanced\nsage_lens_enhanced.main()\n"
+    at = AppTest.from_string(script, default_timeout=120)
+    at.session_state["current_result"] = result
+    at.session_state["history"] = history(versions)
+    at.session_state["history_session"] = "bench"
+    at.run()
+    samples = {}
+    for tab in TABS:
+        if "result_tab" in at.session_state:
+            at.session_state["result_tab"] = tab
+        at.run()
+        times = []
+        for _ in range(reruns):
+            started = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        samples[tab] = times
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--references", type=int, default=40, help="web references in the result")
+    parser.add_argument("--videos", type=int, default=25, help="videos in the result")
+    parser.add_argument("--words", type=int, default=6000, help="words in the generated document")
+    parser.add_argument("--versions", type=int, default=5, help="version summaries in history")
+    parser.add_argument("--reruns", type=int, default=10, help="timed reruns per selected tab")
+    args = parser.parse_args()
+
+    quiet_streamlit()
+    # Keep the history store the page opens away from the app's own
+    os.environ.setdefault("SAGE_LENS_CACHE_DIR", os.path.join(ROOT, ".sage_lens_cache", "bench_render"))
+    samples = measure(large_result(args.references, args.videos, args.words), args.reruns, args.versions)
+
+    print(f"{'selected tab':<16} {'p50 (ms)':>10} {'max (ms)':>10}")
+    for tab, times in samples.items():
+        print(f"{tab:<16} {statistics.median(times) * 1000:>10.1f} {max(times) * 1000:>10.1f}")
+    overall = [t for times in samples.values() for t in times]
+    print(f"{'all':<16} {statistics.median(overall) * 1000:>10.1f} {max(overall) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cold-start cost of both entry points, with a per-package import profile.
+
+Each run imports an entry point in a fresh interpreter, the way a new
+container does on its first page load, and times the module import. The
+profile run uses `python -X importtime` and adds up the time spent in each
+top-level package. Exits with status 1 when an entry point's median import
+time is over the budget. No API keys needed.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --top 20 --budget-ms 1000
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module name -> statement importing it. The legacy app's file name is not
+# importable, so it is loaded from its path under another name; neither
+# entry point runs main() unless it is __main__.
+ENTRY_POINTS = {
+    "sage_lens_enhanced.py": "import sage_lens_enhanced",
+    "sage-lens.py": (
+        "import importlib.util\n"
+        "spec = importlib.util.spec_from_file_location('sage_lens_legacy', 'sage-lens.py')\n"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+    )
+}
+
+TIMED = "import time\nstarted = time.perf_counter()\n{statement}\nprint(time.perf_counter() - started)"
+
+
+def python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def import_seconds(statement: str, runs: int) -> List[float]:
+    """Import time in a fresh interpreter, once per run"""
+    return [float(python(TIMED.format(statement=statement)).stdout.split()[-1]) for _ in range(runs)]
+
+
+def import_profile(statement: str) -> Tuple[Dict[str, float], float]:
+    """Seconds of import time per top-level package, and the total"""
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in python(statement, "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us) / 1e6
+    return packages, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=12, help="packages listed in each import profile")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="median import time allowed per entry point")
+    args = parser.parse_args()
+
+    over_budget = []
+    for entry, statement in ENTRY_POINTS.items():
+        times = import_seconds(statement, args.runs)
+        packages, total = import_profile(statement)
+        median = statistics.median(times) * 1000
+        print(f"{entry}: import p50 {median:.0f} ms, max {max(times) * 1000:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+        print(f"  {'package':<28} {'ms':>8} {'share':>7}")
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<28} {seconds * 1000:>8.1f} {seconds / max(total, 1e-9):>7.0%}")
+        print()
+        if median > args.budget_ms:
+            over_budget.append(entry)
+
+    if over_budget:
+        print(f"Over the {args.budget_ms:.0f} ms startup budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
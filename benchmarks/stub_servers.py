@@ -0,0 +1,382 @@
+"""
+Local stand-ins for every external API the engine calls.
+
+One threaded HTTP server answers for OpenAI, DeepSeek, Anthropic, Tavily,
+Serper and YouTube under a path prefix each, speaking enough of every
+wire format (including OpenAI and Anthropic streaming) for the real SDKs
+and the engine's parsers. Each provider has a profile:
+
+  median_ms, p95_ms  response latency, drawn from a log-normal with that
+                     median and 95th percentile (time to first token for
+                     streamed LLM calls)
+  token_ms           extra time per generated word, streamed or not
+  error_rate         share of requests answered with error_status
+  error_status       e.g. 429, 500, or 403 (what Serper sends for a bad key)
+  words / results    response size: words per LLM answer, results per search
+
+LLM answers follow the prompt: a JSON research brief when the prompt asks
+for one, marked sections for the fused agent, markdown otherwise.
+
+Usage:
+    python benchmarks/stub_servers.py --port 8765
+    python benchmarks/stub_servers.py --set openai.median_ms=2000 --set serper.error_rate=0.2
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_PROFILES: Dict[str, Dict[str, float]] = {
+    "openai": {"median_ms": 900, "p95_ms": 2500, "token_ms": 2, "error_rate": 0.0, "error_status": 500, "words": 450},
+    "deepseek": {"median_ms": 1200, "p95_ms": 3500, "token_ms": 2, "error_rate": 0.0, "error_status": 500, "words": 450},
+    "anthropic": {"median_ms": 1000, "p95_ms": 2800, "token_ms": 2, "error_rate": 0.0, "error_status": 529, "words": 450},
+    "tavily": {"median_ms": 700, "p95_ms": 1800, "token_ms": 0, "error_rate": 0.0, "error_status": 500, "results": 5},
+    "serper": {"median_ms": 350, "p95_ms": 900, "token_ms": 0, "error_rate": 0.0, "error_status": 403, "results": 10},
+    "youtube": {"median_ms": 600, "p95_ms": 1500, "token_ms": 0, "error_rate": 0.0, "error_status": 429, "results": 10}
+}
+
+WORDS = (
+    "model data system performance latency training inference research method result "
+    "architecture memory token attention layer scale benchmark accuracy cost deploy "
+    "pipeline agent search source analysis evidence approach limitation future design"
+).split()
+
+
+def parse_overrides(settings: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    """provider.key=value strings as profile overrides"""
+    overrides: Dict[str, Dict[str, float]] = {}
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        provider, _, key = name.partition(".")
+        if provider not in DEFAULT_PROFILES:
+            raise ValueError(f"Unknown provider in {setting!r}; expected one of {sorted(DEFAULT_PROFILES)}")
+        if key not in DEFAULT_PROFILES[provider] or not value:
+            raise ValueError(f"Expected {provider}.KEY=VALUE with KEY one of {sorted(DEFAULT_PROFILES[provider])}, got {setting!r}")
+        overrides.setdefault(provider, {})[key] = float(value)
+    return overrides
+
+
+class StubServers:
+    """The stand-in server, run on a daemon thread. port=0 picks a free port."""
+
+    def __init__(self, port: int = 0, host: str = "127.0.0.1", profiles: Optional[Dict[str, Dict[str, float]]] = None, seed: int = 7):
+        self.profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+        for name, overrides in (profiles or {}).items():
+            self.profiles[name].update(overrides)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {name: {"requests": 0, "errors": 0, "bytes": 0} for name in self.profiles}
+        self.server = ThreadingHTTPServer((host, port), _handler(self))
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServers":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub-servers", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def env(self) -> Dict[str, str]:
+        """Keys and endpoint overrides pointing both apps at these stand-ins"""
+        return {
+            "OPENAI_API_KEY": "sk-stub",
+            "OPENAI_BASE_URL": f"{self.url}/openai/v1",
+            "ANTHROPIC_API_KEY": "sk-ant-stub",
+            "ANTHROPIC_BASE_URL": f"{self.url}/anthropic",
+            "DEEPSEEK_API_KEY": "sk-stub",
+            "DEEPSEEK_BASE_URL": f"{self.url}/deepseek",
+            "TAVILY_API_KEY": "tvly-stub",
+            "TAVILY_BASE_URL": f"{self.url}/tavily",
+            "SERPER_API_KEY": "stub",
+            "SERPER_URL": f"{self.url}/serper/search",
+            "YOUTUBE_BASE_URL": f"{self.url}/youtube"
+        }
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def _count(self, provider: str, size: int, error: bool = False):
+        with self._lock:
+            stats = self._stats[provider]
+            stats["requests"] += 1
+            stats["errors"] += error
+            stats["bytes"] += size
+
+    def latency(self, provider: str) -> float:
+        """Seconds before the first byte, log-normal around the profile's median"""
+        profile = self.profiles[provider]
+        median = profile["median_ms"] / 1000
+        sigma = math.log(max(profile["p95_ms"], profile["median_ms"]) / max(median * 1000, 1e-9)) / 1.645
+        with self._rng_lock:
+            return median * math.exp(sigma * self._rng.gauss(0, 1))
+
+    def fails(self, provider: str) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.profiles[provider]["error_rate"]
+
+    def words(self, count: int) -> List[str]:
+        with self._rng_lock:
+            return [self._rng.choice(WORDS) for _ in range(count)]
+
+    def answer(self, provider: str, prompt: str) -> List[str]:
+        """An LLM answer shaped by the prompt, as a list of stream chunks"""
+        count = int(self.profiles[provider]["words"])
+        if '"key_facts"' in prompt:
+            brief = {
+                "summary": " ".join(self.words(40)).capitalize() + ".",
+                "outline": [{"heading": " ".join(self.words(3)).title(), "points": [" ".join(self.words(10)) for _ in range(3)]} for _ in range(4)],
+                "key_facts": [{"fact": " ".join(self.words(14)), "sources": [i + 1, i + 2]} for i in range(6)],
+                "citations": [{"source": i + 1, "note": " ".join(self.words(8))} for i in range(5)]
+            }
+            parts = json.dumps(brief).split(" ")
+            return [part + " " for part in parts[:-1]] + parts[-1:]
+        if "<<<RESEARCH>>>" in prompt:
+            chunks = []
+            for marker, share in (("RESEARCH", 0.3), ("CONTENT", 0.5), ("ANALYSIS", 0.2)):
+                chunks.append(f"\n<<<{marker}>>>\n")
+                chunks += self._markdown(max(20, int(count * share)))
+            return chunks
+        return self._markdown(count)
+
+    def _markdown(self, count: int) -> List[str]:
+        chunks, written = [], 0
+        while written < count:
+            chunks.append(f"\n\n## {' '.join(self.words(3)).title()}\n\n")
+            chunks += [word + " " for word in self.words(min(80, count - written))]
+            written += 80
+        return chunks
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        parts.append(content if isinstance(content, str) else json.dumps(content))
+    return " ".join(parts)
+
+
+def _handler(stubs: StubServers):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real APIs; streams use chunked encoding
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except ConnectionError:
+                # Clients drop idle keep-alive connections when their pools close
+                pass
+
+        def _send(self, provider: str, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            stubs._count(provider, len(body), error=status >= 400)
+
+        def _json(self, provider: str, payload: Any, status: int = 200):
+            self._send(provider, status, json.dumps(payload).encode("utf-8"))
+
+        def _stream(self, provider: str, events: Iterable[str], pace: float):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            size = 0
+            for i, event in enumerate(events):
+                if i and pace:
+                    time.sleep(pace)
+                data = event.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+                size += len(data)
+            self.wfile.write(b"0\r\n\r\n")
+            stubs._count(provider, size)
+
+        def _error(self, provider: str) -> bool:
+            """Answer with the profile's error status, if this request draws one"""
+            if not stubs.fails(provider):
+                return False
+            status = int(stubs.profiles[provider]["error_status"])
+            self._json(provider, {"error": {"type": "stub_error", "message": f"Injected {status} from the {provider} stand-in"}}, status)
+            return True
+
+        def _read_json(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self._read_json()
+            if path == "/openai/v1/chat/completions":
+                return self._openai("openai", body)
+            if path == "/deepseek/chat/completions":
+                return self._openai("deepseek", body)
+            if path == "/anthropic/v1/messages":
+                return self._anthropic(body)
+            if path == "/tavily/search":
+                return self._search("tavily", body.get("query", ""))
+            if path == "/serper/search":
+                return self._search("serper", body.get("q", ""))
+            self.send_error(404)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/youtube/results":
+                return self._youtube(parse_qs(url.query).get("search_query", [""])[0])
+            self.send_error(404)
+
+        def _openai(self, provider: str, body: Dict[str, Any]):
+            time.sleep(stubs.latency(provider))
+            if self._error(provider):
+                return
+            prompt = _prompt_text(body)
+            chunks = stubs.answer(provider, prompt)
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(chunks), "total_tokens": len(prompt) // 4 + len(chunks)}
+            pace = stubs.profiles[provider]["token_ms"] / 1000
+            base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model", "stub")}
+            if body.get("stream"):
+                events = [
+                    "data: " + json.dumps(dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {"content": chunk}, "finish_reason": None}])) + "\n\n"
+                    for chunk in chunks
+                ]
+                events.append("data: " + json.dumps(dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])) + "\n\n")
+                events.append("data: " + json.dumps(dict(base, object="chat.completion.chunk", choices=[], usage=usage)) + "\n\n")
+                events.append("data: [DONE]\n\n")
+                return self._stream(provider, events, pace)
+            time.sleep(pace * len(chunks))
+            self._json(provider, dict(
+                base,
+                object="chat.completion",
+                choices=[{"index": 0, "message": {"role": "assistant", "content": "".join(chunks)}, "finish_reason": "stop"}],
+                usage=usage
+            ))
+
+        def _anthropic(self, body: Dict[str, Any]):
+            time.sleep(stubs.latency("anthropic"))
+            if self._error("anthropic"):
+                return
+            prompt = _prompt_text(body)
+            chunks = stubs.answer("anthropic", prompt)
+            pace = stubs.profiles["anthropic"]["token_ms"] / 1000
+            message = {
+                "id": "msg_stub", "type": "message", "role": "assistant", "model": body.get("model", "stub"),
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": len(prompt) // 4, "output_tokens": 1}
+            }
+            if body.get("stream"):
+                def event(name: str, data: Dict[str, Any]) -> str:
+                    return f"event: {name}\ndata: {json.dumps(dict(data, type=name))}\n\n"
+
+                events = [
+                    event("message_start", {"message": message}),
+                    event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+                ]
+                events += [event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}}) for chunk in chunks]
+                events += [
+                    event("content_block_stop", {"index": 0}),
+                    event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": len(chunks)}}),
+                    event("message_stop", {})
+                ]
+                return self._stream("anthropic", events, pace)
+            time.sleep(pace * len(chunks))
+            message.update(
+                content=[{"type": "text", "text": "".join(chunks)}],
+                stop_reason="end_turn",
+                usage={"input_tokens": len(prompt) // 4, "output_tokens": len(chunks)}
+            )
+            self._json("anthropic", message)
+
+        def _search(self, provider: str, query: str):
+            time.sleep(stubs.latency(provider))
+            if self._error(provider):
+                return
+            count = int(stubs.profiles[provider]["results"])
+            slug = "-".join(query.lower().split()[:4]) or "topic"
+            results = [
+                {
+                    "title": f"{' '.join(stubs.words(6)).title()} ({provider} {i + 1})",
+                    "url": f"https://{provider}-{i % 7}.example.com/{slug}/{i}",
+                    "snippet": " ".join(stubs.words(40))
+                }
+                for i in range(count)
+            ]
+            if provider == "tavily":
+                return self._json(provider, {
+                    "query": query,
+                    "results": [{"title": r["title"], "url": r["url"], "content": r["snippet"], "score": 1 - i / count} for i, r in enumerate(results)],
+                    "response_time": 0.0
+                })
+            self._json(provider, {"organic": [{"title": r["title"], "link": r["url"], "snippet": r["snippet"], "position": i + 1} for i, r in enumerate(results)]})
+
+        def _youtube(self, query: str):
+            time.sleep(stubs.latency("youtube"))
+            if self._error("youtube"):
+                return
+            videos = [
+                {"videoRenderer": {
+                    "videoId": f"stub{i:07d}",
+                    "title": {"runs": [{"text": f"{query} {' '.join(stubs.words(5))}"}]},
+                    "viewCountText": {"simpleText": f"{(i + 1) * 1379:,} views"},
+                    "lengthText": {"simpleText": "12:34"},
+                    "publishedTimeText": {"simpleText": "1 month ago"},
+                    "navigationEndpoint": {"commandMetadata": {"webCommandMetadata": {"url": f"/watch?v=stub{i:07d}"}}}
+                }}
+                for i in range(int(stubs.profiles["youtube"]["results"]))
+            ]
+            data = {"contents": {"twoColumnSearchResultsRenderer": {"primaryContents": {"sectionListRenderer": {
+                "contents": [{"itemSectionRenderer": {"contents": videos}}]
+            }}}}}
+            page = f"<html><script>var ytInitialData = {json.dumps(data)};</script></html>"
+            self._send("youtube", 200, page.encode("utf-8"), "text/html; charset=utf-8")
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--set", dest="settings", action="append", default=[], metavar="PROVIDER.KEY=VALUE", help="override a profile value")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    try:
+        profiles = parse_overrides(args.settings)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stubs = StubServers(args.port, args.host, profiles, seed=args.seed).start()
+    print(f"Stand-ins listening on {stubs.url}; point the apps at them with:\n")
+    for name, value in stubs.env().items():
+        print(f"export {name}={value}")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stubs.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,78 @@
 import os
 import time
-import requests
 import streamlit as st
-from openai import OpenAI
-from tavily import TavilyClient
-from youtube_search import YoutubeSearch
-from dotenv import load_dotenv
-import anthropic
+from sage_lens_cache import get_completion_cache
+from sage_lens_ranking import merge_results
+from sage_lens_ratelimit import estimate_request_tokens, get_rate_limiter
+from sage_lens_registry import get_registry
+from sage_lens_tokens import ContextBudget
+from sage_lens_transport import TransportLayer, youtube_search
+from sage_lens_streaming import response_usage, stream_anthropic_messages, stream_openai_chat
 
-# Load environment variables, overriding any existing ones
-load_dotenv(override=True)
+# Provider SDKs and dotenv are imported when the system is first built, not
+# at module load, so the page itself renders without paying for them
+
+
+# Helper function to get secrets: Streamlit Cloud first, then env vars
+def get_secret(key: str, default: str = "") -> str:
+    """Get secret from Streamlit secrets (Cloud) or environment variables (local)"""
+    # Try Streamlit secrets first (for Streamlit Cloud)
+    try:
+        if hasattr(st, 'secrets') and st.secrets is not None:
+            # Try accessing as attribute (st.secrets.KEY_NAME)
+            try:
+                value = getattr(st.secrets, key, None)
+                if value:
+                    return str(value).strip().strip('"').strip("'")
+            except (AttributeError, TypeError):
+                pass
+            
+            # Try accessing as dictionary (st.secrets["KEY_NAME"])
+            try:
+                if isinstance(st.secrets, dict) and key in st.secrets:
+                    value = st.secrets[key]
+                    if value:
+                        return str(value).strip().strip('"').strip("'")
+            except (KeyError, TypeError):
+                pass
+    except Exception:
+        # If st.secrets fails, continue to env vars
+        pass
+    
+    # Fall back to environment variables (for local development)
+    value = os.getenv(key, default)
+    return str(value).strip().strip('"').strip("'")
 
 
 class SageLensSystem:
-    def __init__(self):
+    @staticmethod
+    def resolve_config() -> dict:
+        """Resolve API keys; the registry rebuilds the system only when these change"""
+        # Force reload environment variables (for local development)
+        from dotenv import load_dotenv
+        load_dotenv(override=True)
+        return {
+            "openai_key": get_secret("OPENAI_API_KEY"),
+            "anthropic_key": get_secret("ANTHROPIC_API_KEY"),
+            "tavily_key": get_secret("TAVILY_API_KEY"),
+            "serper_key": get_secret("SERPER_API_KEY"),
+            # Provider endpoints; overridden to point at local stand-ins (see benchmarks/stub_servers.py)
+            "openai_base_url": get_secret("OPENAI_BASE_URL"),
+            "anthropic_base_url": get_secret("ANTHROPIC_BASE_URL"),
+            "tavily_base_url": get_secret("TAVILY_BASE_URL"),
+            "serper_url": get_secret("SERPER_URL", "https://google.serper.dev/search"),
+            "youtube_base_url": get_secret("YOUTUBE_BASE_URL")
+        }
+
+    def __init__(self, config: dict = None):
         try:
-            # Force reload environment variables (for local development)
-            load_dotenv(override=True)
-            
-            # Helper function to get secrets: Streamlit Cloud first, then env vars
-            def get_secret(key: str, default: str = "") -> str:
-                """Get secret from Streamlit secrets (Cloud) or environment variables (local)"""
-                # Try Streamlit secrets first (for Streamlit Cloud)
-                try:
-                    if hasattr(st, 'secrets') and st.secrets is not None:
-                        # Try accessing as attribute (st.secrets.KEY_NAME)
-                        try:
-                            value = getattr(st.secrets, key, None)
-                            if value:
-                                return str(value).strip().strip('"').strip("'")
-                        except (AttributeError, TypeError):
-                            pass
-                        
-                        # Try accessing as dictionary (st.secrets["KEY_NAME"])
-                        try:
-                            if isinstance(st.secrets, dict) and key in st.secrets:
-                                value = st.secrets[key]
-                                if value:
-                                    return str(value).strip().strip('"').strip("'")
-                        except (KeyError, TypeError):
-                            pass
-                except Exception:
-                    # If st.secrets fails, continue to env vars
-                    pass
-                
-                # Fall back to environment variables (for local development)
-                value = os.getenv(key, default)
-                return str(value).strip().strip('"').strip("'")
+            config = config or self.resolve_config()
             
-            # Get API keys using the helper function
-            openai_key = get_secret("OPENAI_API_KEY")
-            anthropic_key = get_secret("ANTHROPIC_API_KEY")
-            tavily_key = get_secret("TAVILY_API_KEY")
-            serper_key = get_secret("SERPER_API_KEY")
+            # Get API keys from the resolved config
+            openai_key = config["openai_key"]
+            anthropic_key = config["anthropic_key"]
+            tavily_key = config["tavily_key"]
+            serper_key = config["serper_key"]
             
             # Validate API keys are not empty BEFORE creating clients
             errors = []
@@ -82,25 +102,47 @@ class SageLensSystem:
             # Initialize OpenAI client - latest SDK uses api_key parameter
             # OpenAI SDK 2.0+ uses: OpenAI(api_key=key)
             # Only create clients if keys are valid
+            # Both SDKs and Serper share keep-alive connection pools
+            self.transport = TransportLayer()
+            self.context_budget = ContextBudget()
+            from openai import OpenAI
+            from anthropic import Anthropic
             self.llms = {
-                "openai": OpenAI(api_key=openai_key),
-                "anthropic": anthropic.Anthropic(api_key=anthropic_key)
+                "openai": OpenAI(
+                    api_key=openai_key,
+                    base_url=config["openai_base_url"] or None,
+                    http_client=self.transport.httpx_client(OpenAI)
+                ),
+                "anthropic": Anthropic(
+                    api_key=anthropic_key,
+                    base_url=config["anthropic_base_url"] or None,
+                    http_client=self.transport.httpx_client(Anthropic)
+                )
             }
             
             # Initialize other services
             if tavily_key:
-                self.tavily = TavilyClient(api_key=tavily_key)
+                from tavily import TavilyClient
+                endpoint = {"api_base_url": config["tavily_base_url"]} if config["tavily_base_url"] else {}
+                try:
+                    self.tavily = TavilyClient(api_key=tavily_key, session=self.transport.session, **endpoint)
+                except TypeError:
+                    # Older tavily-python without session support
+                    self.tavily = TavilyClient(api_key=tavily_key, **endpoint)
             else:
                 self.tavily = None
                 
             if serper_key:
                 self.serper_config = {
-                    "url": "https://google.serper.dev/search",
+                    "url": config["serper_url"],
                     "headers": {"X-API-KEY": serper_key},
                     "timeout": 10
                 }
             else:
                 self.serper_config = None
+            
+            # Results page origin for video search; empty means youtube.com
+            self.youtube_base_url = config["youtube_base_url"]
                 
         except ValueError as e:
             # Show detailed error with next steps
@@ -121,45 +163,48 @@ class SageLensSystem:
             st.error(error_msg)
             st.stop()  # Stop execution to prevent further errors
 
+    def close(self):
+        """Release the connection pools when the registry retires this system"""
+        self.transport.close()
+
     def _search_web(self, query: str) -> list:
-        all_results = []
+        rankings = {}
         try:
             # Tavily Search
             if self.tavily:
                 try:
+                    get_rate_limiter().reserve("tavily")
                     tavily_results = self.tavily.search(query=query, max_results=5)
-                    all_results.extend([
+                    rankings["tavily"] = [
                         {"title": r.get("title", "Untitled"), "url": r["url"]}
                         for r in tavily_results.get("results", []) if "url" in r
-                    ])
+                    ]
                 except Exception as e:
                     st.warning(f"Tavily search error: {str(e)}")
 
             # Google Serper
             if self.serper_config:
                 try:
-                    response = requests.post(**self.serper_config, json={"q": query, "num": 5})
+                    get_rate_limiter().reserve("serper")
+                    response = self.transport.session.post(**self.serper_config, json={"q": query, "num": 5})
                     response.raise_for_status()
                     serper_results = response.json()
-                    all_results.extend([
+                    rankings["serper"] = [
                         {"title": r.get("title", "Untitled"), "url": r["link"]}
                         for r in serper_results.get("organic", []) if "link" in r
-                    ])
+                    ]
                 except Exception as e:
                     st.warning(f"Serper search error: {str(e)}")
 
-            # Deduplicate and return top results (already sorted by search relevance from APIs)
-            seen = set()
-            unique_results = [x for x in all_results if not (x["url"] in seen or seen.add(x["url"]))]
-            # Return top 10 highest searched/most relevant links
-            return unique_results[:10]
+            # Merge URL variants and fuse both engines' rankings, keep the top 10
+            return merge_results(rankings, max_results=10)[0]
         except Exception as e:
             st.error(f"Search error: {str(e)}")
             return []
 
     def _search_videos(self, query: str) -> list:
         try:
-            results = YoutubeSearch(query, max_results=10).to_dict()
+            results = youtube_search(query, max_results=10, base_url=self.youtube_base_url)
             # Extract videos with views and sort by view count (highest first)
             videos = []
             for r in results:
@@ -193,39 +238,47 @@ class SageLensSystem:
             st.error(f"Video search error: {str(e)}")
             return []
 
-    def _generate_content(self, provider: str, prompt: str) -> dict:
+    def _generate_content(self, provider: str, prompt: str, on_delta=None, use_cache=True) -> dict:
         try:
-            start_time = time.time()
             if provider == "anthropic":
                 # Anthropic SDK: client.messages.create()
-                response = self.llms[provider].messages.create(
+                content = f"Generate a concise, comprehensive summary about: {prompt}"
+                request = dict(
                     model="claude-3-5-sonnet-20241022",
-                    max_tokens=4000,
+                    max_tokens=self.context_budget.max_tokens("summary", "claude-3-5-sonnet-20241022", content),
                     messages=[
-                        {"role": "user", "content": f"Generate a concise, comprehensive summary about: {prompt}"}
+                        {"role": "user", "content": content}
                     ]
                 )
-                # Anthropic response structure: response.content is a list of ContentBlock objects
-                # Each block has a .text attribute
-                content_text = response.content[0].text if response.content else ""
-                return {
-                    "content": content_text,
-                    "provider": "Claude-3.5-Sonnet",
-                    "latency": time.time() - start_time
-                }
             else:
                 # OpenAI SDK 2.0+: client.chat.completions.create()
-                response = self.llms["openai"].chat.completions.create(
+                provider = "openai"
+                content = f"Create a concise, comprehensive summary about: {prompt}"
+                request = dict(
                     model="gpt-4-turbo",
-                    messages=[{"role": "user", "content": f"Create a concise, comprehensive summary about: {prompt}"}],
-                    temperature=0.3
+                    messages=[{"role": "user", "content": content}],
+                    temperature=0.3,
+                    max_tokens=self.context_budget.max_tokens("summary", "gpt-4-turbo", content)
                 )
-                # OpenAI response structure: response.choices[0].message.content
-                return {
-                    "content": response.choices[0].message.content,
-                    "provider": "OpenAI-GPT4",
-                    "latency": time.time() - start_time
-                }
+            def call():
+                # Queue for provider quota instead of hitting 429s
+                reservation = get_rate_limiter().reserve(provider, estimate_request_tokens(request))
+                try:
+                    result = self._call_llm(provider, request, on_delta)
+                except BaseException:
+                    reservation.refund()
+                    raise
+                reservation.settle(result.get("usage"))
+                return result
+
+            # Identical requests are answered from the shared completion cache
+            return get_completion_cache().complete(
+                provider,
+                request,
+                call,
+                use_cache=use_cache,
+                on_hit=(lambda hit: on_delta(hit["content"])) if on_delta else None
+            )
         except Exception as e:
             # More detailed error logging
             error_msg = str(e)
@@ -235,12 +288,40 @@ class SageLensSystem:
                 st.error(f"{provider} error: {error_msg}")
             return None
 
-    def process_query(self, topic: str) -> dict:
+    def _call_llm(self, provider: str, request: dict, on_delta=None) -> dict:
+        start_time = time.time()
+        if provider == "anthropic":
+            if on_delta:
+                # Stream token deltas; the final dict also carries TTFT and tokens/sec
+                return stream_anthropic_messages(self.llms[provider], "Claude-3.5-Sonnet", **request).consume(on_delta)
+            response = self.llms[provider].messages.create(**request)
+            # Anthropic response structure: response.content is a list of ContentBlock objects
+            # Each block has a .text attribute
+            content_text = response.content[0].text if response.content else ""
+            return {
+                "content": content_text,
+                "provider": "Claude-3.5-Sonnet",
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
+            }
+        if on_delta:
+            return stream_openai_chat(self.llms["openai"], "OpenAI-GPT4", **request).consume(on_delta)
+        response = self.llms["openai"].chat.completions.create(**request)
+        # OpenAI response structure: response.choices[0].message.content
+        return {
+            "content": response.choices[0].message.content,
+            "provider": "OpenAI-GPT4",
+            "latency": time.time() - start_time,
+            "usage": response_usage(response)
+        }
+
+    def process_query(self, topic: str, on_delta=None, use_cache=True) -> dict:
         result = {"content": "", "references": {"web": [], "videos": []}}
         try:
             versions = []
             for provider in ["openai", "anthropic"]:
-                if content := self._generate_content(provider, topic):
+                stream_to = (lambda delta, p=provider: on_delta(p, delta)) if on_delta else None
+                if content := self._generate_content(provider, topic, on_delta=stream_to, use_cache=use_cache):
                     versions.append(content)
             if versions:
                 result["content"] = max(versions, key=lambda x: len(x["content"]))
@@ -251,6 +332,13 @@ class SageLensSystem:
         return result
 
 
+def get_system(acquire: bool = False) -> SageLensSystem:
+    """Shared SageLensSystem, built once per process and rebuilt only when keys change.
+    With acquire=True it stays open until get_registry().release(system)."""
+    config = SageLensSystem.resolve_config()
+    return get_registry().get("legacy", config, lambda cfg: SageLensSystem(config=cfg), acquire=acquire)
+
+
 def main():
     st.set_page_config(
         page_title="Sage-Lens",
@@ -274,6 +362,13 @@ def main():
     st.markdown("### Your AI-Powered Research Companion")
     st.write("---")
 
+    # Sidebar options
+    use_cache = st.sidebar.checkbox(
+        "♻️ Use completion cache",
+        value=True,
+        help="Reuse stored answers for identical prompts. Untick to force fresh generations."
+    )
+
     # Initialize session state
     if 'history' not in st.session_state:
         st.session_state.history = []
@@ -292,14 +387,30 @@ def main():
         with btn_col:
             st.write("")
             st.write("")
-            if st.button("🚀 Generate", use_container_width=True):
-                if topic.strip():
-                    with st.spinner("🔬 Agentic AI processors analyzing..."):
-                        st.session_state.current_result = SageLensSystem().process_query(topic)
-                        # Only add to history if content is a dict (successful generation)
-                        if isinstance(st.session_state.current_result["content"], dict):
-                            st.session_state.history.append(st.session_state.current_result)
-                            st.rerun()
+            generate = st.button("🚀 Generate", use_container_width=True)
+
+    if generate and topic.strip():
+        # Live preview that fills in token by token while each provider streams
+        preview = st.empty()
+        streamed = {"provider": None, "text": ""}
+
+        def show_delta(provider, delta):
+            if provider != streamed["provider"]:
+                streamed.update(provider=provider, text="")
+            streamed["text"] += delta
+            preview.markdown(f"*Streaming from {provider}...*\n\n{streamed['text']} ▌")
+
+        with st.spinner("🔬 Agentic AI processors analyzing..."):
+            # Another session changing keys must not close the system mid-query
+            system = get_system(acquire=True)
+            try:
+                st.session_state.current_result = system.process_query(topic, on_delta=show_delta, use_cache=use_cache)
+            finally:
+                get_registry().release(system)
+            # Only add to history if content is a dict (successful generation)
+            if isinstance(st.session_state.current_result["content"], dict):
+                st.session_state.history.append(st.session_state.current_result)
+                st.rerun()
 
     # Results display
     if st.session_state.current_result:
@@ -320,6 +431,12 @@ def main():
                     cols = st.columns(2)
                     cols[0].metric("Processing Time", f"{result['content']['latency']:.2f}s")
                     cols[1].metric("AI Engine", result['content']['provider'])
+                    if result['content'].get('cached'):
+                        st.caption(f"♻️ Served from cache (originally {result['content']['original_latency']:.2f}s)")
+                    if result['content'].get('ttft') is not None:
+                        cols = st.columns(2)
+                        cols[0].metric("Time to First Token", f"{result['content']['ttft']:.2f}s")
+                        cols[1].metric("Tokens/sec", f"{result['content']['tokens_per_sec']:.1f}")
                     st.caption("Powered by Claude-3.5-Sonnet and GPT-4 Turbo")
 
             with ref_col:
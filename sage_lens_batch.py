@@ -0,0 +1,258 @@
+"""
+Sage-Lens Batch: headless research runner for large topic lists
+
+Reads topics (one per line, blank lines and # comments ignored) from a file
+or stdin, researches them with bounded concurrency and appends one JSON
+line per topic to the output file as soon as it finishes. The output file
+doubles as the checkpoint: rerunning with --resume skips topics that
+already have a successful record.
+
+Usage:
+    python sage_lens_batch.py topics.txt -o results.jsonl --concurrency 16
+    cat topics.txt | python sage_lens_batch.py - -o results.jsonl --resume
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, TextIO
+
+from sage_lens_concurrency import QUERY_FAN_OUT
+
+
+def read_topics(source: TextIO) -> List[str]:
+    """Topics in input order, without blanks, comments or duplicates"""
+    topics, seen = [], set()
+    for line in source:
+        topic = line.strip()
+        if not topic or topic.startswith("#") or topic in seen:
+            continue
+        seen.add(topic)
+        topics.append(topic)
+    return topics
+
+
+def completed_topics(output_path: str) -> Set[str]:
+    """Topics with a successful record in an existing output file"""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if record.get("status") == "ok":
+                done.add(record["topic"])
+    return done
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class BatchWriter:
+    """Appends records to the JSONL output and keeps per-stage latencies"""
+
+    def __init__(self, path: str, total: int):
+        self.total = total
+        self.records: List[Dict[str, Any]] = []
+        self.stage_durations: Dict[str, List[float]] = {}
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.records.append(record)
+            timings = ((record.get("result") or {}).get("metadata") or {}).get("timings") or {}
+            for task in timings.get("tasks", []):
+                self.stage_durations.setdefault(task["task"], []).append(task["duration"])
+            status = "✓" if record["status"] == "ok" else "✗"
+            print(
+                f"[{len(self.records)}/{self.total}] {status} {record['topic'][:60]} ({record['elapsed']:.1f}s)",
+                file=sys.stderr
+            )
+
+    def close(self):
+        self._file.close()
+
+
+def make_record(topic: str, result: Optional[Dict[str, Any]], elapsed: float, error: Optional[str] = None) -> Dict[str, Any]:
+    """One JSONL line. A query counts as failed if it raised, reported a
+    processing error, or produced no content."""
+    if error is None and result is not None:
+        error = result["metadata"].get("error")
+        if error is None and not result.get("content"):
+            error = "no content generated"
+    return {
+        "topic": topic,
+        "status": "error" if error else "ok",
+        "error": error,
+        "elapsed": elapsed,
+        "finished_at": datetime.now().isoformat(),
+        "result": result
+    }
+
+
+async def run_async(system, topics: List[str], writer: BatchWriter, concurrency: int, use_agents: bool, use_cache: bool, fused: bool = False):
+    """Research topics on the async engine, at most `concurrency` at a time"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def research(topic: str):
+        async with slots:
+            started = time.perf_counter()
+            try:
+                result = await system.process_query_async(topic, use_agents=use_agents, use_cache=use_cache, fused=fused)
+                writer.write(make_record(topic, result, time.perf_counter() - started))
+            except Exception as e:
+                writer.write(make_record(topic, None, time.perf_counter() - started, error=str(e)))
+
+    try:
+        await asyncio.gather(*(research(topic) for topic in topics))
+    finally:
+        await system.aclose()
+
+
+def run_threads(system, topics: List[str], writer: BatchWriter, concurrency: int, use_agents: bool, use_cache: bool, fused: bool = False):
+    """Research topics with process_query_agentic on a thread pool"""
+
+    def research(topic: str):
+        started = time.perf_counter()
+        try:
+            result = system.process_query_agentic(topic, use_agents=use_agents, use_cache=use_cache, fused=fused)
+            writer.write(make_record(topic, result, time.perf_counter() - started))
+        except Exception as e:
+            writer.write(make_record(topic, None, time.perf_counter() - started, error=str(e)))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sage-lens-batch") as pool:
+        for future in as_completed([pool.submit(research, topic) for topic in topics]):
+            future.result()
+
+
+def summarize(writer: BatchWriter, wall_time: float, skipped: int) -> Dict[str, Any]:
+    records = writer.records
+    latencies = [r["elapsed"] for r in records]
+    return {
+        "topics": len(records),
+        "succeeded": sum(1 for r in records if r["status"] == "ok"),
+        "failed": sum(1 for r in records if r["status"] != "ok"),
+        "skipped": skipped,
+        "wall_time": wall_time,
+        "topics_per_min": len(records) / wall_time * 60 if wall_time > 0 else 0.0,
+        "latency": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95)},
+        "stages": {
+            stage: {"count": len(durations), "p50": percentile(durations, 50), "p95": percentile(durations, 95)}
+            for stage, durations in sorted(writer.stage_durations.items())
+        }
+    }
+
+
+def print_summary(summary: Dict[str, Any]):
+    print("", file=sys.stderr)
+    print(
+        f"Researched {summary['topics']} topics ({summary['succeeded']} ok, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped) in {summary['wall_time']:.1f}s - {summary['topics_per_min']:.1f} topics/min",
+        file=sys.stderr
+    )
+    print(
+        f"{'stage':<16} {'count':>6} {'p50 (s)':>9} {'p95 (s)':>9}",
+        file=sys.stderr
+    )
+    print(f"{'total':<16} {summary['topics']:>6} {summary['latency']['p50']:>9.2f} {summary['latency']['p95']:>9.2f}", file=sys.stderr)
+    for stage, stats in summary["stages"].items():
+        print(f"{stage:<16} {stats['count']:>6} {stats['p50']:>9.2f} {stats['p95']:>9.2f}", file=sys.stderr)
+
+
+def quiet_streamlit():
+    """st.* calls are no-ops outside a script run; keep Streamlit's bare-mode
+    warnings off the console. Parsing the config resets the log level, so
+    parse it first and then override it."""
+    from streamlit import config, logger
+    logger.set_log_level("error")
+    config.get_option("logger.level")
+    config.set_option("logger.level", "error")
+    logger.set_log_level("error")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", default="-", help="topics file, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="sage_lens_batch.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="topics researched at once (default 8)")
+    parser.add_argument("--agentic", action="store_true", help="use the research/content/analysis agent chain instead of the provider ensemble")
+    parser.add_argument("--fused", action="store_true", help="with --agentic, one fused call per topic instead of the three-agent chain")
+    parser.add_argument("--engine", choices=["async", "threads"], default="async", help="async engine or process_query_agentic on threads")
+    parser.add_argument("--no-cache", action="store_true", help="bypass completion cache lookups")
+    parser.add_argument("--resume", action="store_true", help="skip topics that already have a successful record in the output")
+    parser.add_argument("--summary-json", help="also write the final summary to this file")
+    args = parser.parse_args(argv)
+
+    quiet_streamlit()
+    from sage_lens_enhanced import SageLensAgenticSystem
+
+    if args.input == "-":
+        topics = read_topics(sys.stdin)
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            topics = read_topics(f)
+
+    skipped = 0
+    if args.resume:
+        done = completed_topics(args.output)
+        skipped = sum(1 for topic in topics if topic in done)
+        topics = [topic for topic in topics if topic not in done]
+    if not topics:
+        print("Nothing to do.", file=sys.stderr)
+        return 0
+
+    config = SageLensAgenticSystem.resolve_config()
+    if not config["openai_key"]:
+        print("❌ OPENAI_API_KEY is not set (environment or .env)", file=sys.stderr)
+        return 2
+    concurrency = max(1, args.concurrency)
+    # Size the shared search/generation pool for every topic in flight, or
+    # topics queue behind each other's provider calls
+    system = SageLensAgenticSystem(max_workers=max(config["max_workers"], concurrency * QUERY_FAN_OUT), config=config)
+    if args.agentic and not system.agents_initialized:
+        print("⚠️ OpenAI Agents SDK not available, using the provider ensemble", file=sys.stderr)
+
+    print(f"Researching {len(topics)} topics ({skipped} already done), concurrency {concurrency}, {args.engine} engine", file=sys.stderr)
+    writer = BatchWriter(args.output, len(topics))
+    started = time.perf_counter()
+    try:
+        if args.engine == "async":
+            asyncio.run(run_async(system, topics, writer, concurrency, args.agentic, not args.no_cache, args.fused))
+        else:
+            run_threads(system, topics, writer, concurrency, args.agentic, not args.no_cache, args.fused)
+    except KeyboardInterrupt:
+        print("\nInterrupted - rerun with --resume to continue.", file=sys.stderr)
+    finally:
+        writer.close()
+        system.close()
+
+    summary = summarize(writer, time.perf_counter() - started, skipped)
+    print_summary(summary)
+    if args.summary_json:
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
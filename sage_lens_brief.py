@@ -0,0 +1,135 @@
+"""
+Sage-Lens Brief: compact structured hand-off from the research agent
+
+The research stage answers with a JSON brief instead of a long document:
+
+    {
+        "summary": "two or three sentences",
+        "outline": [{"heading": "...", "points": ["...", "..."]}],
+        "key_facts": [{"fact": "...", "sources": [1, 3]}],
+        "citations": [{"source": 1, "note": "what this source supports"}]
+    }
+
+Source numbers are 1-based indexes into result["references"]["web"], the
+same numbering the research prompt shows. The prompt may list only the
+first few results, so parse_brief() is given just those. Later stages get
+the brief rendered as short text, so they no longer re-read a full
+document.
+"""
+
+import re
+import json
+from typing import Any, Dict, List, Optional, Set
+
+BRIEF_FORMAT = """{
+  "summary": "two or three sentence overview",
+  "outline": [{"heading": "section heading", "points": ["key point", "..."]}],
+  "key_facts": [{"fact": "specific, checkable fact", "sources": [1]}],
+  "citations": [{"source": 1, "note": "what this source supports"}]
+}"""
+
+
+def _json_object(text: str) -> Optional[Dict[str, Any]]:
+    """The first JSON object in a reply, tolerating code fences and chatter"""
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _list(value: Any) -> List[Any]:
+    """A JSON array field, or [] if it is missing, null or not an array"""
+    return value if isinstance(value, list) else []
+
+
+def _sources(values: Any, source_count: int) -> List[int]:
+    """Valid, de-duplicated source numbers in their original order"""
+    if not isinstance(values, list):
+        values = [values]
+    sources: List[int] = []
+    for value in values:
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= source_count and number not in sources:
+            sources.append(number)
+    return sources
+
+
+def parse_brief(text: str, web_results: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+    """Validate a research reply into a brief; None if it is not one.
+    web_results are the sources the prompt listed. Malformed entries and
+    source numbers outside them are dropped."""
+    data = _json_object(text)
+    if data is None:
+        return None
+    source_count = len(web_results)
+    outline = [
+        {
+            "heading": str(section.get("heading") or "").strip(),
+            "points": [str(point).strip() for point in _list(section.get("points")) if str(point).strip()]
+        }
+        for section in _list(data.get("outline")) if isinstance(section, dict)
+    ]
+    key_facts = [
+        {"fact": str(fact.get("fact") or "").strip(), "sources": _sources(fact.get("sources") or [], source_count)}
+        for fact in _list(data.get("key_facts")) if isinstance(fact, dict) and str(fact.get("fact") or "").strip()
+    ]
+    citations = []
+    for citation in _list(data.get("citations")):
+        if not isinstance(citation, dict):
+            continue
+        source = _sources(citation.get("source"), source_count)
+        if source:
+            citations.append({"source": source[0], "note": str(citation.get("note") or "").strip()})
+    outline = [section for section in outline if section["heading"] or section["points"]]
+    if not outline and not key_facts:
+        return None
+    return {
+        "summary": str(data.get("summary") or "").strip(),
+        "outline": outline,
+        "key_facts": key_facts,
+        "citations": citations
+    }
+
+
+def cited_sources(brief: Optional[Dict[str, Any]]) -> Set[int]:
+    """Source numbers the brief points to"""
+    if not brief:
+        return set()
+    cited = {source for fact in brief["key_facts"] for source in fact["sources"]}
+    cited.update(citation["source"] for citation in brief["citations"])
+    return cited
+
+
+def render_brief(brief: Dict[str, Any], web_results: List[Dict[str, str]]) -> str:
+    """The brief as compact markdown for downstream prompts, listing only
+    the sources it cites"""
+    lines: List[str] = []
+    if brief["summary"]:
+        lines += [brief["summary"], ""]
+    for section in brief["outline"]:
+        lines.append(f"## {section['heading']}" if section["heading"] else "##")
+        lines += [f"- {point}" for point in section["points"]]
+        lines.append("")
+    if brief["key_facts"]:
+        lines.append("## Key facts")
+        for fact in brief["key_facts"]:
+            refs = "".join(f"[{source}]" for source in fact["sources"])
+            lines.append(f"- {fact['fact']} {refs}".rstrip())
+        lines.append("")
+    notes = {citation["source"]: citation["note"] for citation in brief["citations"]}
+    sources = sorted(cited_sources(brief))
+    if sources:
+        lines.append("## Sources")
+        for source in sources:
+            item = web_results[source - 1]
+            note = f" - {notes[source]}" if notes.get(source) else ""
+            lines.append(f"[{source}] {item.get('title', 'Untitled')} ({item.get('url', '')}){note}")
+    return "\n".join(lines).strip()
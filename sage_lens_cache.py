@@ -0,0 +1,507 @@
+"""
+Sage-Lens Cache: in-memory LRU in front of an on-disk SQLite store
+"""
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from sage_lens_singleflight import get_single_flight
+
+DEFAULT_CACHE_DIR = ".sage_lens_cache"
+
+
+def cache_dir() -> str:
+    """Directory for on-disk caches (SAGE_LENS_CACHE_DIR, default .sage_lens_cache)"""
+    path = os.getenv("SAGE_LENS_CACHE_DIR", DEFAULT_CACHE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class TieredCache:
+    """Two-tier key/value cache with per-entry TTL.
+
+    Values must be JSON-serializable. The memory tier is an LRU bounded by
+    item count; the disk tier is a SQLite table bounded by total bytes,
+    evicting least-recently-used rows first. With compress=True disk rows
+    are zlib-compressed. Expired entries are kept for stale_retention more
+    seconds so callers can opt into stale reads.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        memory_items: int = 256,
+        max_disk_bytes: int = 50 * 1024 * 1024,
+        default_ttl: float = 3600,
+        compress: bool = False,
+        stale_retention: float = 0
+    ):
+        self.compress = compress
+        self.stale_retention = stale_retention
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB, stored_at REAL, expires_at REAL, "
+                "last_access REAL, size INTEGER)"
+            )
+            self._db.commit()
+
+    def _encode(self, value: Any) -> bytes:
+        blob = json.dumps(value).encode("utf-8")
+        return zlib.compress(blob, 6) if self.compress else blob
+
+    def _decode(self, blob: bytes) -> Any:
+        if self.compress:
+            blob = zlib.decompress(blob)
+        return json.loads(blob.decode("utf-8"))
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def lookup(self, key: str, max_stale: float = 0) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (tier, entry) for a live entry, or (None, None) on a miss.
+        An entry is {"value", "stored_at", "expires_at"}. Entries expired by
+        less than max_stale seconds (within stale_retention) still count as
+        hits; the caller tells them apart by expires_at."""
+        now = time.time()
+        max_stale = min(max_stale, self.stale_retention)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] + max_stale > now:
+                    self._memory.move_to_end(key)
+                    return "memory", entry
+                if entry["expires_at"] + self.stale_retention <= now:
+                    del self._memory[key]
+            if self._db is None:
+                return None, None
+            row = self._db.execute(
+                "SELECT value, stored_at, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            if row[2] + max_stale <= now:
+                if row[2] + self.stale_retention <= now:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                return None, None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            entry = {"value": self._decode(row[0]), "stored_at": row[1], "expires_at": row[2]}
+            self._remember(key, entry)
+            return "disk", entry
+
+    def get(self, key: str) -> Optional[Any]:
+        _, entry = self.lookup(key)
+        return entry["value"] if entry else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        entry = {"value": value, "stored_at": now, "expires_at": now + (ttl if ttl is not None else self.default_ttl)}
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is None:
+                return
+            blob = self._encode(value)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, expires_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, entry["stored_at"], entry["expires_at"], now, len(blob))
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _evict_disk(self, now: float):
+        """Drop expired rows, then least-recently-used rows until under the byte budget"""
+        self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (now - self.stale_retention,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    def disk_usage(self) -> Dict[str, int]:
+        with self._lock:
+            if self._db is None:
+                return {"entries": 0, "bytes": 0}
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return {"entries": entries, "bytes": size}
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace/punctuation so trivially different
+    spellings of the same topic share a cache entry"""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+# Seconds a search result stays fresh, per provider
+DEFAULT_SEARCH_TTLS = {
+    "tavily": 6 * 3600,
+    "serper": 6 * 3600,
+    "youtube": 24 * 3600
+}
+
+# Seconds past its TTL a search result may still be served while it is
+# refreshed in the background, per provider
+DEFAULT_SEARCH_MAX_STALE = {
+    "tavily": 24 * 3600,
+    "serper": 24 * 3600,
+    "youtube": 3 * 24 * 3600
+}
+
+
+class BackgroundRefresher:
+    """Small bounded pool that re-fetches stale cache entries off the request
+    path. Each key is refreshed at most once at a time; when max_pending
+    refreshes are already queued new ones are dropped, and the next stale
+    read schedules them again."""
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sage-lens-refresh")
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "refreshed": 0, "failed": 0, "dropped": 0}
+
+    def schedule(self, key: str, refresh: Callable[[], bool]) -> bool:
+        """Queue refresh() (returns True on success) unless key is already
+        pending or the queue is full"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self._stats["dropped"] += 1
+                return False
+            self._pending.add(key)
+            self._stats["scheduled"] += 1
+
+        def run():
+            ok = False
+            try:
+                ok = refresh()
+            except Exception:
+                ok = False
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                    self._stats["refreshed" if ok else "failed"] += 1
+
+        self._pool.submit(run)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+
+class SearchCache:
+    """Cache for Tavily, Serper and YouTube results keyed by provider,
+    normalized query and max_results.
+
+    Stale-while-revalidate: an entry past its TTL but within the provider's
+    max staleness is served immediately and refreshed in the background.
+    Concurrent misses for the same key share one provider call.
+    """
+
+    def __init__(
+        self,
+        cache: TieredCache,
+        ttls: Optional[Dict[str, float]] = None,
+        max_stale: Optional[Dict[str, float]] = None,
+        refresher: Optional[BackgroundRefresher] = None
+    ):
+        self.cache = cache
+        self.ttls = dict(DEFAULT_SEARCH_TTLS, **(ttls or {}))
+        self.max_stale = dict(DEFAULT_SEARCH_MAX_STALE, **(max_stale or {}))
+        self.refresher = refresher or BackgroundRefresher()
+        self.flight = get_single_flight("search")
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def key(provider: str, query: str, max_results: int) -> str:
+        return f"{provider}|{max_results}|{normalize_query(query)}"
+
+    def _count(self, provider: str, outcome: str, stale_age: float = 0.0):
+        with self._stats_lock:
+            counters = self._stats.setdefault(provider, {
+                "memory_hits": 0, "disk_hits": 0, "stale_hits": 0, "misses": 0,
+                "refreshes": 0, "refresh_failures": 0, "total_stale_age": 0.0, "max_stale_age": 0.0
+            })
+            counters[outcome] += 1
+            if outcome == "stale_hits":
+                counters["total_stale_age"] += stale_age
+                counters["max_stale_age"] = max(counters["max_stale_age"], stale_age)
+
+    def _store(self, provider: str, key: str, value: Any) -> bool:
+        # Empty results usually mean the provider failed - don't pin that
+        if not value:
+            return False
+        self.cache.set(key, value, ttl=self.ttls.get(provider))
+        return True
+
+    def _hit(self, provider: str, key: str, tier: str, entry: Dict[str, Any], refresh: Optional[Callable[[], Any]]) -> Any:
+        """Count a hit; a stale one also schedules a background refresh"""
+        stale_age = time.time() - entry["expires_at"]
+        if stale_age <= 0:
+            self._count(provider, f"{tier}_hits")
+            return entry["value"]
+        self._count(provider, "stale_hits", stale_age)
+        if refresh is not None:
+            def revalidate() -> bool:
+                ok = self._store(provider, key, refresh())
+                self._count(provider, "refreshes" if ok else "refresh_failures")
+                return ok
+            self.refresher.schedule(key, revalidate)
+        return entry["value"]
+
+    def get_or_fetch(self, provider: str, query: str, max_results: int, fetch: Callable[[], Any]) -> Any:
+        """Return the cached result, or call fetch() and cache a non-empty answer"""
+        key = self.key(provider, query, max_results)
+        tier, entry = self.cache.lookup(key, max_stale=self.max_stale.get(provider, 0))
+        if entry is not None:
+            return self._hit(provider, key, tier, entry, fetch)
+        self._count(provider, "misses")
+
+        def fetch_and_store() -> Any:
+            value = fetch()
+            self._store(provider, key, value)
+            return value
+        value, _ = self.flight.do(key, fetch_and_store)
+        return value
+
+    async def get_or_fetch_async(self, provider: str, query: str, max_results: int, fetch: Callable[[], Awaitable[Any]], refresh: Optional[Callable[[], Any]] = None) -> Any:
+        """get_or_fetch for async fetchers. Lookups and stores are local
+        SQLite calls and stay inline; only the provider call is awaited.
+        Stale entries are revalidated with refresh, a blocking fetcher run
+        on the refresher's threads, since the caller's loop may be gone by
+        the time the refresh runs."""
+        key = self.key(provider, query, max_results)
+        tier, entry = self.cache.lookup(key, max_stale=self.max_stale.get(provider, 0))
+        if entry is not None:
+            return self._hit(provider, key, tier, entry, refresh)
+        self._count(provider, "misses")
+
+        async def fetch_and_store() -> Any:
+            value = await fetch()
+            self._store(provider, key, value)
+            return value
+        value, _ = await self.flight.do_async(key, fetch_and_store)
+        return value
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {provider: dict(counters) for provider, counters in self._stats.items()}
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Process-wide search cache shared by every session.
+
+    TTLs can be overridden per provider with SAGE_LENS_SEARCH_TTL_<PROVIDER>
+    (seconds), how long past the TTL stale results are still served with
+    SAGE_LENS_SEARCH_MAX_STALE_<PROVIDER> (seconds, 0 disables), the number
+    of background refresh workers with SAGE_LENS_SEARCH_REFRESH_WORKERS and
+    the disk tier size with SAGE_LENS_SEARCH_CACHE_MB.
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            ttls, max_stale = {}, {}
+            for provider in DEFAULT_SEARCH_TTLS:
+                value = os.getenv(f"SAGE_LENS_SEARCH_TTL_{provider.upper()}")
+                if value:
+                    ttls[provider] = float(value)
+                value = os.getenv(f"SAGE_LENS_SEARCH_MAX_STALE_{provider.upper()}")
+                if value:
+                    max_stale[provider] = float(value)
+            tiered = TieredCache(
+                os.path.join(cache_dir(), "search.sqlite3"),
+                memory_items=512,
+                max_disk_bytes=int(float(os.getenv("SAGE_LENS_SEARCH_CACHE_MB", "50")) * 1024 * 1024),
+                stale_retention=max(dict(DEFAULT_SEARCH_MAX_STALE, **max_stale).values())
+            )
+            refresher = BackgroundRefresher(workers=int(os.getenv("SAGE_LENS_SEARCH_REFRESH_WORKERS", "2")))
+            _search_cache = SearchCache(tiered, ttls, max_stale, refresher)
+        return _search_cache
+
+
+class CompletionCache:
+    """Content-addressed cache for LLM completions.
+
+    Keyed by a hash of (provider, model, temperature, max_tokens, messages).
+    Stored results keep their original latency and usage; hits come back
+    flagged with "cached": True so the UI can label them. Identical calls
+    already in flight are joined rather than repeated; those results come
+    back flagged with "coalesced": True.
+    """
+
+    def __init__(self, cache: TieredCache, ttl: float):
+        self.cache = cache
+        self.ttl = ttl
+        self.flight = get_single_flight("completion")
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def key(provider: str, request: Dict[str, Any]) -> str:
+        material = json.dumps({
+            "provider": provider,
+            "model": request.get("model"),
+            "temperature": request.get("temperature"),
+            "max_tokens": request.get("max_tokens"),
+            "messages": request.get("messages")
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self._stats[outcome] += 1
+
+    def get(self, provider: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        started = time.time()
+        tier, entry = self.cache.lookup(self.key(provider, request))
+        if entry is None:
+            self._count("misses")
+            return None
+        self._count(f"{tier}_hits")
+        result = dict(entry["value"])
+        result.update({
+            "cached": True,
+            "cache_tier": tier,
+            "cache_age": started - entry["stored_at"],
+            "original_latency": result.get("latency", 0.0),
+            "latency": time.time() - started
+        })
+        return result
+
+    def put(self, provider: str, request: Dict[str, Any], result: Dict[str, Any]):
+        stored = {k: v for k, v in result.items() if k not in ("cached", "cache_tier", "cache_age", "original_latency", "coalesced")}
+        self.cache.set(self.key(provider, request), stored, ttl=self.ttl)
+
+    @staticmethod
+    def _joined(result: Optional[Dict[str, Any]], on_hit: Optional[Callable[[Dict[str, Any]], None]]) -> Optional[Dict[str, Any]]:
+        """A result shared from another caller's call. Its tokens streamed
+        to that caller only, so it is replayed through on_hit like a hit."""
+        if result is None:
+            return None
+        result["coalesced"] = True
+        if on_hit and result.get("content"):
+            on_hit(result)
+        return result
+
+    def complete(
+        self,
+        provider: str,
+        request: Dict[str, Any],
+        call: Callable[[], Optional[Dict[str, Any]]],
+        use_cache: bool = True,
+        on_hit: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Serve from the cache, or run call() and store its result.
+        With use_cache=False the lookup is bypassed but the fresh result
+        still refreshes the cache."""
+        if use_cache:
+            hit = self.get(provider, request)
+            if hit is not None:
+                if on_hit:
+                    on_hit(hit)
+                return hit
+        else:
+            self._count("bypassed")
+
+        def call_and_store() -> Optional[Dict[str, Any]]:
+            result = call()
+            if result and result.get("content"):
+                self.put(provider, request, result)
+            return result
+        result, shared = self.flight.do(self.key(provider, request), call_and_store)
+        return self._joined(result, on_hit) if shared else result
+
+    async def complete_async(
+        self,
+        provider: str,
+        request: Dict[str, Any],
+        call: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        use_cache: bool = True,
+        on_hit: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """complete() for async providers: call() returns an awaitable"""
+        if use_cache:
+            hit = self.get(provider, request)
+            if hit is not None:
+                if on_hit:
+                    on_hit(hit)
+                return hit
+        else:
+            self._count("bypassed")
+
+        async def call_and_store() -> Optional[Dict[str, Any]]:
+            result = await call()
+            if result and result.get("content"):
+                self.put(provider, request, result)
+            return result
+        result, shared = await self.flight.do_async(self.key(provider, request), call_and_store)
+        return self._joined(result, on_hit) if shared else result
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+_completion_cache: Optional[CompletionCache] = None
+_completion_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> CompletionCache:
+    """Process-wide completion cache shared by every generation path.
+
+    SAGE_LENS_COMPLETION_TTL sets the lifetime in seconds (default 7 days)
+    and SAGE_LENS_COMPLETION_CACHE_MB the compressed disk budget.
+    """
+    global _completion_cache
+    with _completion_cache_lock:
+        if _completion_cache is None:
+            tiered = TieredCache(
+                os.path.join(cache_dir(), "completions.sqlite3"),
+                memory_items=128,
+                max_disk_bytes=int(float(os.getenv("SAGE_LENS_COMPLETION_CACHE_MB", "200")) * 1024 * 1024),
+                compress=True
+            )
+            _completion_cache = CompletionCache(tiered, ttl=float(os.getenv("SAGE_LENS_COMPLETION_TTL", str(7 * 24 * 3600))))
+        return _completion_cache
@@ -0,0 +1,390 @@
+"""
+Sage-Lens Concurrency: shared thread-pool execution engine with per-task timing
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+# Worker threads need the Streamlit script context so st.warning/st.error
+# raised inside a task still reach the page
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+# Pool tasks one query keeps in flight at once: the YouTube, Tavily and
+# Serper searches, then up to three ensemble providers (or the content and
+# analysis agents) while the video search may still be running. Pools
+# shared by several concurrent queries need this many workers per query.
+QUERY_FAN_OUT = 4
+
+
+class TaskGroup:
+    """A set of tasks belonging to one query, sharing a clock for timing"""
+
+    def __init__(self, executor: "ConcurrentExecutor"):
+        self.executor = executor
+        self.started = time.perf_counter()
+        self.timings: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, submitted: float, start: float, end: float, status: str):
+        with self._lock:
+            self.timings.append({
+                "task": name,
+                "queued": start - submitted,
+                "start": start - self.started,
+                "end": end - self.started,
+                "duration": end - start,
+                "status": status
+            })
+
+    def submit(self, name: str, fn: Callable, *args, **kwargs) -> Future:
+        """Run fn on the pool and record its timing under the given name"""
+        submitted = time.perf_counter()
+
+        def timed():
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                self._record(name, submitted, start, time.perf_counter(), status)
+
+        return self.executor.submit(timed)
+
+    def run(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn inline on the calling thread, timed like a pooled task"""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self._record(name, start, start, time.perf_counter(), status)
+
+    async def run_async(self, name: str, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """Await fn(*args, **kwargs), timed like a pooled task. Wrap the call in
+        asyncio.create_task to overlap it with other work."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self._record(name, start, start, time.perf_counter(), status)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def critical_path(self) -> Optional[Dict[str, Any]]:
+        """The task that finished last, i.e. the one the query was waiting on"""
+        with self._lock:
+            if not self.timings:
+                return None
+            return max(self.timings, key=lambda t: t["end"])
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-friendly timing summary for result metadata"""
+        critical = self.critical_path()
+        with self._lock:
+            timings = sorted(self.timings, key=lambda t: t["start"])
+        return {
+            "tasks": timings,
+            "wall_time": self.elapsed(),
+            "critical_task": critical["task"] if critical else None,
+            "max_workers": self.executor.max_workers
+        }
+
+
+def gather_within(
+    futures: Dict[str, Future],
+    deadline: float,
+    grace: Optional[float] = None,
+    accept: Optional[Callable[[Any], bool]] = None
+) -> Dict[str, Any]:
+    """Collect whatever finishes before the deadline.
+
+    Once the first accepted result arrives, the others get at most `grace`
+    more seconds. Anything still running afterwards is cancelled if it has
+    not started, or left to finish in the background and ignored; work that
+    should stop early needs its own flag to check.
+    """
+    accept = accept or (lambda value: value is not None)
+    started = time.perf_counter()
+    cutoff = started + deadline
+    pending = set(futures.values())
+    names = {future: name for name, future in futures.items()}
+    finished: Dict[str, Any] = {}
+
+    while pending:
+        remaining = cutoff - time.perf_counter()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                value = future.result()
+            except Exception:
+                continue
+            if accept(value):
+                finished[names[future]] = value
+                if grace is not None:
+                    cutoff = min(cutoff, time.perf_counter() + grace)
+
+    for future in pending:
+        future.cancel()
+
+    return {
+        "results": finished,
+        "stragglers": sorted(names[future] for future in pending),
+        "elapsed": time.perf_counter() - started
+    }
+
+
+async def gather_within_async(
+    tasks: Dict[str, "asyncio.Task"],
+    deadline: float,
+    grace: Optional[float] = None,
+    accept: Optional[Callable[[Any], bool]] = None
+) -> Dict[str, Any]:
+    """Async counterpart of gather_within for asyncio tasks. Stragglers are
+    cancelled outright, which also closes their HTTP streams."""
+    accept = accept or (lambda value: value is not None)
+    started = time.perf_counter()
+    cutoff = started + deadline
+    pending = set(tasks.values())
+    names = {task: name for name, task in tasks.items()}
+    finished: Dict[str, Any] = {}
+
+    while pending:
+        remaining = cutoff - time.perf_counter()
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.cancelled() or task.exception() is not None:
+                continue
+            value = task.result()
+            if accept(value):
+                finished[names[task]] = value
+                if grace is not None:
+                    cutoff = min(cutoff, time.perf_counter() + grace)
+
+    for task in pending:
+        task.cancel()
+
+    return {
+        "results": finished,
+        "stragglers": sorted(names[task] for task in pending),
+        "elapsed": time.perf_counter() - started
+    }
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call (YouTube scraping, SDKs without async support) on
+    the default thread pool without stalling the event loop, carrying the
+    Streamlit script context and context variables along like
+    ConcurrentExecutor.submit"""
+    ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx else None
+    context = contextvars.copy_context()
+
+    def call():
+        if ctx is not None and add_script_run_ctx:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return context.run(fn, *args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+class ConcurrentExecutor:
+    """Thread pool shared by the search tools and generation stages"""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sage-lens")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit fn to the pool, carrying the Streamlit script context and
+        the caller's context variables (current tracing span, job) along"""
+        ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx else None
+        context = contextvars.copy_context()
+
+        def call():
+            if ctx is not None and add_script_run_ctx:
+                add_script_run_ctx(threading.current_thread(), ctx)
+            return context.run(fn, *args, **kwargs)
+
+        return self._pool.submit(call)
+
+    def group(self) -> TaskGroup:
+        """Start a new timed task group, typically one per query"""
+        return TaskGroup(self)
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait)
+
+
+class StageGraph:
+    """A pipeline declared as a DAG of named stages.
+
+    Each stage is fn(**inputs) -> output, where inputs maps the names of
+    the stages it depends on to their outputs. A stage starts as soon as
+    all of its inputs are ready, so independent stages overlap. A stage
+    whose input failed or returned None is skipped and yields None.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn: Callable, inputs: Sequence[str] = ()) -> "StageGraph":
+        for dependency in inputs:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+        self.stages[name] = {"fn": fn, "inputs": tuple(inputs)}
+        return self
+
+    def _mark(self, name: str, status: str, start: Optional[float] = None, end: Optional[float] = None):
+        with self._lock:
+            self.timings[name] = {
+                "inputs": list(self.stages[name]["inputs"]),
+                "status": status,
+                "start": (start - self.started) if start is not None else None,
+                "end": (end - self.started) if end is not None else None,
+                "duration": (end - start) if start is not None and end is not None else 0.0
+            }
+
+    def _ready(self, pending: List[str], outputs: Dict[str, Any]) -> List[str]:
+        """Pop the stages whose inputs are all settled, marking skipped ones"""
+        launch = []
+        progressed = True
+        while progressed:
+            progressed = False
+            for name in list(pending):
+                inputs = self.stages[name]["inputs"]
+                if not all(dependency in outputs for dependency in inputs):
+                    continue
+                pending.remove(name)
+                progressed = True
+                if any(outputs[dependency] is None for dependency in inputs):
+                    outputs[name] = None
+                    self._mark(name, "skipped")
+                else:
+                    launch.append(name)
+        return launch
+
+    def _call(self, name: str, outputs: Dict[str, Any]) -> Any:
+        stage = self.stages[name]
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return stage["fn"](**{dependency: outputs[dependency] for dependency in stage["inputs"]})
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self._mark(name, status, start, time.perf_counter())
+
+    async def _call_async(self, name: str, outputs: Dict[str, Any]) -> Any:
+        stage = self.stages[name]
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await stage["fn"](**{dependency: outputs[dependency] for dependency in stage["inputs"]})
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self._mark(name, status, start, time.perf_counter())
+
+    def run(self, group: TaskGroup) -> Dict[str, Any]:
+        """Run every stage on the group's pool; returns {stage: output}"""
+        self.started = time.perf_counter()
+        pending = list(self.stages)
+        outputs: Dict[str, Any] = {}
+        running: Dict[Future, str] = {}
+        while True:
+            for name in self._ready(pending, outputs):
+                running[group.submit(name, self._call, name, dict(outputs))] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    outputs[name] = future.result()
+                except Exception:
+                    outputs[name] = None
+        self.finished = time.perf_counter()
+        return outputs
+
+    async def run_async(self, group: TaskGroup) -> Dict[str, Any]:
+        """run() for stages whose fn returns an awaitable"""
+        self.started = time.perf_counter()
+        pending = list(self.stages)
+        outputs: Dict[str, Any] = {}
+        running: Dict["asyncio.Task", str] = {}
+        while True:
+            for name in self._ready(pending, outputs):
+                task = asyncio.create_task(group.run_async(name, self._call_async, name, dict(outputs)))
+                running[task] = name
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                outputs[name] = None if task.cancelled() or task.exception() else task.result()
+        self.finished = time.perf_counter()
+        return outputs
+
+    def report(self) -> Dict[str, Any]:
+        """Per-stage timing plus how much overlapping shortened the pipeline.
+
+        serial_time is what the stages would take back to back,
+        critical_time the longest dependency chain actually run, and
+        saved the difference.
+        """
+        with self._lock:
+            timings = {name: dict(timing) for name, timing in self.timings.items()}
+        # Longest chain through the DAG by measured duration (insertion order is topological)
+        chain: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name, stage in self.stages.items():
+            duration = timings.get(name, {}).get("duration", 0.0)
+            parent = max(stage["inputs"], key=lambda dependency: chain[dependency], default=None)
+            chain[name] = (chain[parent] if parent else 0.0) + duration
+            previous[name] = parent
+        path: List[str] = []
+        node = max(chain, key=chain.get) if chain else None
+        while node:
+            path.append(node)
+            node = previous[node]
+        serial_time = sum(timing["duration"] for timing in timings.values())
+        critical_time = chain[path[0]] if path else 0.0
+        return {
+            "stages": timings,
+            "serial_time": serial_time,
+            "critical_time": critical_time,
+            "elapsed": (self.finished - self.started) if self.finished and self.started else 0.0,
+            "saved": max(0.0, serial_time - critical_time),
+            "critical_path": list(reversed(path))
+        }
@@ -4,144 +4,487 @@ Built with OpenAI Agents SDK for advanced AI capabilities
 """
 
 import os
+import re
 import time
+import uuid
+import asyncio
+import weakref
+import threading
 import json
-import requests
+import inspect
+import importlib.util
 import streamlit as st
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from openai import OpenAI
-from tavily import TavilyClient
-from youtube_search import YoutubeSearch
-from dotenv import load_dotenv
-import anthropic
-
-# Try to import OpenAI Agents SDK
-# Try multiple possible import paths
-AGENTS_SDK_AVAILABLE = False
-Agent = None
-Runner = None
-Tool = None
-
-try:
-    from agents import Agent, Runner, Tool
-    AGENTS_SDK_AVAILABLE = True
-except ImportError:
-    try:
-        from openai.agents import Agent, Runner, Tool
-        AGENTS_SDK_AVAILABLE = True
-    except ImportError:
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple, Any
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from sage_lens_concurrency import QUERY_FAN_OUT, ConcurrentExecutor, StageGraph, TaskGroup, gather_within, gather_within_async, run_blocking
+from sage_lens_brief import BRIEF_FORMAT, cited_sources, parse_brief, render_brief
+from sage_lens_history import content_diff, get_history_store
+from sage_lens_jobs import current_job, get_job_queue, job_workers
+from sage_lens_metrics import EngineMetrics, get_metrics
+from sage_lens_cache import SearchCache, get_completion_cache, get_search_cache, normalize_query
+from sage_lens_ranking import MergeStats, merge_results
+from sage_lens_ratelimit import RateLimiter, estimate_request_tokens, get_rate_limiter
+from sage_lens_registry import get_registry
+from sage_lens_singleflight import get_single_flight, single_flight_stats
+from sage_lens_transport import TransportLayer, youtube_search
+from sage_lens_tokens import ContextBudget
+from sage_lens_tracing import get_tracer, span, trace
+from sage_lens_streaming import (
+    AsyncGenerationStream,
+    GenerationStream,
+    StreamCancelled,
+    response_usage,
+    stream_anthropic_messages,
+    stream_anthropic_messages_async,
+    stream_openai_chat,
+    stream_openai_chat_async
+)
+
+if TYPE_CHECKING:
+    import requests
+
+# Provider SDKs (openai, anthropic, tavily, youtube_search, requests) are
+# imported where a configured provider first needs them, not at module load.
+# The Agents SDK is the slowest import of all: only check that it is
+# installed here and import it when a system builds its agents.
+AGENTS_SDK_AVAILABLE = any(importlib.util.find_spec(name) is not None for name in ("agents", "openai_agents"))
+
+
+@lru_cache(maxsize=None)
+def load_agents_sdk() -> Optional[Tuple[Any, Any, Any]]:
+    """(Agent, Runner, Tool) from whichever Agents SDK import path works, or None"""
+    for module in ("agents", "openai.agents", "openai_agents"):
         try:
-            from openai_agents import Agent, Runner, Tool
-            AGENTS_SDK_AVAILABLE = True
-        except ImportError:
-            pass
+            sdk = importlib.import_module(module)
+            return sdk.Agent, sdk.Runner, sdk.Tool
+        except (ImportError, AttributeError):
+            continue
+    return None
+
+
+def load_env():
+    """Load .env, overriding existing variables. Runs at the start of each
+    script run and before resolving config rather than at import."""
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
 
-if not AGENTS_SDK_AVAILABLE:
-    # Only show warning if Streamlit is available (not during import)
+
+def get_secret(key: str, default: str = "") -> str:
+    """Get secret from Streamlit secrets or environment variables"""
     try:
-        import streamlit as st
-        st.warning("⚠️ OpenAI Agents SDK not installed. Install with: pip install openai-agents")
-    except:
+        if hasattr(st, 'secrets') and st.secrets is not None:
+            try:
+                value = getattr(st.secrets, key, None)
+                if value:
+                    return str(value).strip().strip('"').strip("'")
+            except (AttributeError, TypeError):
+                pass
+            
+            try:
+                if isinstance(st.secrets, dict) and key in st.secrets:
+                    value = st.secrets[key]
+                    if value:
+                        return str(value).strip().strip('"').strip("'")
+            except (KeyError, TypeError):
+                pass
+    except Exception:
         pass
+    
+    value = os.getenv(key, default)
+    return str(value).strip().strip('"').strip("'")
+
+
+def progress(message: str):
+    """st.spinner inside a Streamlit script run, a no-op for headless callers.
+    Inside a background job the message becomes the job's current stage."""
+    job = current_job()
+    if job is not None:
+        job.set_stage(message)
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return nullcontext()
+    return st.spinner(message)
 
-# Load environment variables
-load_dotenv(override=True)
+
+def report(level: str, message: str):
+    """st.warning / st.error, or, inside a background job, a message kept on
+    the job for the page to show"""
+    job = current_job()
+    if job is not None:
+        job.report(level, message)
+    else:
+        getattr(st, level)(message)
+
+
+def score_by_length(result: Dict[str, Any]) -> float:
+    """Prefer the most comprehensive answer (the original selection rule)"""
+    return float(len(result.get("content") or ""))
+
+
+def score_by_structure(result: Dict[str, Any]) -> float:
+    """Prefer well-organized answers: word count plus credit for headings and lists"""
+    content = result.get("content") or ""
+    lines = [line.lstrip() for line in content.splitlines()]
+    headings = sum(1 for line in lines if line.startswith("#"))
+    list_items = sum(1 for line in lines if line.startswith(("- ", "* ")) or re.match(r"\d+\.\s", line))
+    return float(len(content.split()) + 50 * headings + 10 * list_items)
+
+
+# Pluggable scorers for picking the ensemble winner in standard mode
+ENSEMBLE_SCORERS: Dict[str, Callable[[Dict[str, Any]], float]] = {
+    "length": score_by_length,
+    "structure": score_by_structure
+}
+
+# Fused agent mode: one call returns all three agent outputs, each section
+# introduced by a marker line such as <<<CONTENT>>>
+FUSED_SECTIONS = {"research": "research_agent", "content": "content_agent", "analysis": "analysis_agent"}
+FUSED_MARKER = re.compile(r"^[ \t]*<<<\s*(RESEARCH|CONTENT|ANALYSIS)\s*>>>[ \t]*$\n?", re.IGNORECASE | re.MULTILINE)
+
+
+def split_fused_sections(text: str) -> Dict[str, str]:
+    """Split a fused response into {"research", "content", "analysis"}.
+    Text before the first marker is dropped; a response without markers is
+    treated as content only."""
+    matches = list(FUSED_MARKER.finditer(text or ""))
+    if not matches:
+        return {"content": (text or "").strip()}
+    sections: Dict[str, str] = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        body = text[match.end():end].strip()
+        if body:
+            sections[match.group(1).lower()] = body
+    return sections
+
+
+def make_section_router(on_delta: Callable[[str, str], None]) -> tuple:
+    """Wrap an on_delta(label, delta) callback so a streamed fused response is
+    delivered per section, labelled like the matching chain stage. Returns
+    (route, flush): route takes raw deltas, flush emits the held-back tail."""
+    state = {"label": FUSED_SECTIONS["research"], "pending": ""}
+    # Longest possible marker prefix that may still be completed by the next delta
+    holdback = len("<<< ANALYSIS >>>") + 2
+    
+    def switch(final: bool):
+        while True:
+            match = FUSED_MARKER.search(state["pending"])
+            if not match:
+                break
+            # A marker at the very end may still be followed by the rest of
+            # its line (or its newline) in the next delta
+            if not final and match.end() == len(state["pending"]) and not match.group(0).endswith("\n"):
+                break
+            if match.start():
+                on_delta(state["label"], state["pending"][:match.start()])
+            state["label"] = FUSED_SECTIONS[match.group(1).lower()]
+            state["pending"] = state["pending"][match.end():]
+    
+    def route(delta: str):
+        state["pending"] += delta
+        switch(final=False)
+        if len(state["pending"]) > holdback:
+            on_delta(state["label"], state["pending"][:-holdback])
+            state["pending"] = state["pending"][-holdback:]
+    
+    def flush():
+        switch(final=True)
+        if state["pending"]:
+            on_delta(state["label"], state["pending"])
+            state["pending"] = ""
+    
+    return route, flush
 
 
 class WebSearchTool:
     """Tool for web search functionality"""
     
-    def __init__(self, tavily_client=None, serper_config=None):
+    def __init__(self, tavily_client=None, serper_config=None, executor: Optional[ConcurrentExecutor] = None, cache: Optional[SearchCache] = None, session: Optional["requests.Session"] = None, async_clients: Optional[Callable[[], Dict[str, Any]]] = None, rate_limiter: Optional[RateLimiter] = None, metrics: Optional[EngineMetrics] = None):
         self.tavily = tavily_client
         self.serper_config = serper_config
+        self.executor = executor
+        self.cache = cache
+        # Pooled keep-alive session; plain requests opens a new connection per call
+        self.http = session
+        # Returns the running event loop's async clients ("http", "tavily")
+        self.async_clients = async_clients
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.merge_stats = MergeStats()
+    
+    def _throttle(self, provider: str):
+        """Queue for provider quota (cache misses only) instead of hitting 429s"""
+        if self.rate_limiter:
+            reservation = self.rate_limiter.reserve(provider)
+            if self.metrics:
+                self.metrics.rate_limit_wait.observe(reservation.waited, provider=provider)
+    
+    async def _throttle_async(self, provider: str):
+        if self.rate_limiter:
+            reservation = await self.rate_limiter.reserve_async(provider)
+            if self.metrics:
+                self.metrics.rate_limit_wait.observe(reservation.waited, provider=provider)
+    
+    def _observe(self, provider: str, started: float, status: int = 200):
+        """Record a provider call's latency; a non-200 answer counts as an error"""
+        if self.metrics:
+            self.metrics.record_search_call(provider, time.perf_counter() - started, status)
+    
+    def _failed(self, provider: str, error: Exception):
+        if self.metrics:
+            self.metrics.record_search_error(provider, error)
+    
+    def _cached(self, provider: str, query: str, max_results: int, fetch: Callable[[], List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        with span(f"search.{provider}", provider=provider) as s:
+            fetched = []
+            
+            def fetch_once():
+                fetched.append(True)
+                return fetch()
+            
+            results = fetch_once() if self.cache is None else self.cache.get_or_fetch(provider, query, max_results, fetch_once)
+            s.set(cache_hit=not fetched, results=len(results))
+            if self.metrics:
+                self.metrics.record_search(provider, cache_hit=not fetched)
+            return results
+    
+    async def _cached_async(self, provider: str, query: str, max_results: int, fetch: Callable[[], Awaitable[List[Dict[str, str]]]], refresh: Callable[[], List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        with span(f"search.{provider}", provider=provider) as s:
+            fetched = []
+            
+            async def fetch_once():
+                fetched.append(True)
+                return await fetch()
+            
+            if self.cache is None:
+                results = await fetch_once()
+            else:
+                results = await self.cache.get_or_fetch_async(provider, query, max_results, fetch_once, refresh=refresh)
+            s.set(cache_hit=not fetched, results=len(results))
+            if self.metrics:
+                self.metrics.record_search(provider, cache_hit=not fetched)
+            return results
+    
+    def _search_tavily(self, query: str) -> List[Dict[str, str]]:
+        """Tavily Search (cached)"""
+        if not self.tavily:
+            return []
+        return self._cached("tavily", query, 5, lambda: self._fetch_tavily(query))
+    
+    def _search_serper(self, query: str) -> List[Dict[str, str]]:
+        """Google Serper Search (cached)"""
+        if not self.serper_config:
+            return []
+        return self._cached("serper", query, 10, lambda: self._fetch_serper(query))
+    
+    @staticmethod
+    def _parse_tavily(tavily_results: Dict[str, Any]) -> List[Dict[str, str]]:
+        return [
+            {"title": r.get("title", "Untitled"), "url": r["url"], "snippet": r.get("content", "")}
+            for r in tavily_results.get("results", []) if "url" in r
+        ]
+    
+    def _fetch_tavily(self, query: str) -> List[Dict[str, str]]:
+        """Tavily Search"""
+        try:
+            self._throttle("tavily")
+            started = time.perf_counter()
+            response = self.tavily.search(query=query, max_results=5)
+            self._observe("tavily", started)
+            return self._parse_tavily(response)
+        except Exception as e:
+            self._failed("tavily", e)
+            report("warning", f"Tavily search error: {str(e)}")
+            return []
+    
+    def _serper_request(self, query: str) -> Dict[str, Any]:
+        """Serper request arguments, shared by the sync and async paths"""
+        return {
+            "url": self.serper_config["url"],
+            # Get clean headers
+            "headers": self.serper_config["headers"].copy(),
+            # Serper API expects specific format - check documentation
+            "json": {"q": query, "num": 10},
+            "timeout": self.serper_config.get("timeout", 15)
+        }
     
-    def search(self, query: str, max_results: int = 10) -> List[Dict[str, str]]:
+    @staticmethod
+    def _parse_serper(response) -> List[Dict[str, str]]:
+        """Turn a Serper response (requests or httpx) into result dicts"""
+        results = []
+        if response.status_code == 200:
+            serper_results = response.json()
+            # Extract organic results
+            organic = serper_results.get("organic", [])
+            # Also get knowledge graph if available
+            knowledge_graph = serper_results.get("knowledgeGraph", {})
+            if knowledge_graph and knowledge_graph.get("websiteUrl"):
+                results.append({
+                    "title": knowledge_graph.get("title", "Knowledge Graph"),
+                    "url": knowledge_graph.get("websiteUrl", ""),
+                    "snippet": knowledge_graph.get("description", "")
+                })
+            results.extend([
+                {
+                    "title": r.get("title", "Untitled"),
+                    "url": r.get("link", ""),
+                    "snippet": r.get("snippet", "")
+                }
+                for r in organic if r.get("link")
+            ])
+        elif response.status_code == 403:
+            # 403 Unauthorized - API key issue
+            # Don't show error, just skip Serper and use Tavily only
+            # The app will work fine with just Tavily
+            pass  # Silently fail - Tavily will still work (counted in the search error metrics)
+        else:
+            report("warning", f"⚠️ Serper API error {response.status_code}: {response.text[:200]}")
+        return results
+    
+    def _fetch_serper(self, query: str) -> List[Dict[str, str]]:
+        """Google Serper - Fixed API call with proper authentication"""
+        import requests
+        try:
+            self._throttle("serper")
+            started = time.perf_counter()
+            response = (self.http or requests).post(**self._serper_request(query))
+            self._observe("serper", started, response.status_code)
+            return self._parse_serper(response)
+        except requests.exceptions.RequestException as e:
+            self._failed("serper", e)
+            report("warning", f"⚠️ Serper connection error: {str(e)}")
+        except Exception as e:
+            self._failed("serper", e)
+            report("warning", f"⚠️ Serper search error: {str(e)}")
+        return []
+    
+    async def _fetch_tavily_async(self, query: str) -> List[Dict[str, str]]:
+        """Tavily Search on the async client, or the sync one on a thread"""
+        try:
+            await self._throttle_async("tavily")
+            client = self.async_clients().get("tavily") if self.async_clients else None
+            started = time.perf_counter()
+            if client is not None:
+                response = await client.search(query=query, max_results=5)
+            else:
+                response = await run_blocking(self.tavily.search, query=query, max_results=5)
+            self._observe("tavily", started)
+            return self._parse_tavily(response)
+        except Exception as e:
+            self._failed("tavily", e)
+            report("warning", f"Tavily search error: {str(e)}")
+            return []
+    
+    async def _fetch_serper_async(self, query: str) -> List[Dict[str, str]]:
+        """Google Serper on the pooled async HTTP client"""
+        if not self.async_clients:
+            return await run_blocking(self._fetch_serper, query)
+        try:
+            await self._throttle_async("serper")
+            http = self.async_clients()["http"]
+            started = time.perf_counter()
+            response = await http.post(**self._serper_request(query))
+            self._observe("serper", started, response.status_code)
+            return self._parse_serper(response)
+        except Exception as e:
+            self._failed("serper", e)
+            report("warning", f"⚠️ Serper search error: {str(e)}")
+            return []
+    
+    async def _search_tavily_async(self, query: str) -> List[Dict[str, str]]:
+        if not self.tavily:
+            return []
+        return await self._cached_async("tavily", query, 5, lambda: self._fetch_tavily_async(query), lambda: self._fetch_tavily(query))
+    
+    async def _search_serper_async(self, query: str) -> List[Dict[str, str]]:
+        if not self.serper_config:
+            return []
+        return await self._cached_async("serper", query, 10, lambda: self._fetch_serper_async(query), lambda: self._fetch_serper(query))
+    
+    def search(self, query: str, max_results: int = 10, group: Optional[TaskGroup] = None) -> List[Dict[str, str]]:
         """Search the web for information"""
-        all_results = []
         try:
-            # Tavily Search
-            if self.tavily:
-                try:
-                    tavily_results = self.tavily.search(query=query, max_results=5)
-                    all_results.extend([
-                        {"title": r.get("title", "Untitled"), "url": r["url"], "snippet": r.get("content", "")}
-                        for r in tavily_results.get("results", []) if "url" in r
-                    ])
-                except Exception as e:
-                    st.warning(f"Tavily search error: {str(e)}")
-
-            # Google Serper - Fixed API call with proper authentication
-            if self.serper_config:
-                try:
-                    # Serper API expects specific format - check documentation
-                    payload = {
-                        "q": query,
-                        "num": 10
-                    }
-                    
-                    # Get clean headers
-                    headers = self.serper_config["headers"].copy()
-                    
-                    # Make the request
-                    response = requests.post(
-                        self.serper_config["url"],
-                        headers=headers,
-                        json=payload,
-                        timeout=self.serper_config.get("timeout", 15)
+            with span("search.web", max_results=max_results) as s:
+                # Fan out Tavily and Serper at once when a pool is available
+                group = group or (self.executor.group() if self.executor else None)
+                if group:
+                    tavily_future = group.submit("tavily", self._search_tavily, query)
+                    serper_future = group.submit("serper", self._search_serper, query)
+                    tavily_results, serper_results = tavily_future.result(), serper_future.result()
+                else:
+                    tavily_results, serper_results = self._search_tavily(query), self._search_serper(query)
+                
+                merged = self._merge(tavily_results, serper_results, max_results)
+                s.set(results=len(merged))
+                return merged
+        except Exception as e:
+            report("error", f"Search error: {str(e)}")
+            return []
+    
+    async def search_async(self, query: str, max_results: int = 10, group: Optional[TaskGroup] = None) -> List[Dict[str, str]]:
+        """Async search: Tavily and Serper run concurrently on the event loop"""
+        try:
+            with span("search.web", max_results=max_results) as s:
+                if group:
+                    tavily_results, serper_results = await asyncio.gather(
+                        group.run_async("tavily", self._search_tavily_async, query),
+                        group.run_async("serper", self._search_serper_async, query)
                     )
-                    
-                    if response.status_code == 200:
-                        serper_results = response.json()
-                        # Extract organic results
-                        organic = serper_results.get("organic", [])
-                        # Also get knowledge graph if available
-                        knowledge_graph = serper_results.get("knowledgeGraph", {})
-                        if knowledge_graph and knowledge_graph.get("websiteUrl"):
-                            all_results.append({
-                                "title": knowledge_graph.get("title", "Knowledge Graph"),
-                                "url": knowledge_graph.get("websiteUrl", ""),
-                                "snippet": knowledge_graph.get("description", "")
-                            })
-                        all_results.extend([
-                            {
-                                "title": r.get("title", "Untitled"),
-                                "url": r.get("link", ""),
-                                "snippet": r.get("snippet", "")
-                            }
-                            for r in organic if r.get("link")
-                        ])
-                    elif response.status_code == 403:
-                        # 403 Unauthorized - API key issue
-                        # Don't show error, just skip Serper and use Tavily only
-                        # The app will work fine with just Tavily
-                        pass  # Silently fail - Tavily will still work
-                    else:
-                        st.warning(f"⚠️ Serper API error {response.status_code}: {response.text[:200]}")
-                except requests.exceptions.RequestException as e:
-                    st.warning(f"⚠️ Serper connection error: {str(e)}")
-                except Exception as e:
-                    st.warning(f"⚠️ Serper search error: {str(e)}")
-
-            # Deduplicate
-            seen = set()
-            unique_results = [
-                x for x in all_results
-                if not (x["url"] in seen or seen.add(x["url"]))
-            ]
-            return unique_results[:max_results]
+                else:
+                    tavily_results, serper_results = await asyncio.gather(
+                        self._search_tavily_async(query),
+                        self._search_serper_async(query)
+                    )
+                merged = self._merge(tavily_results, serper_results, max_results)
+                s.set(results=len(merged))
+                return merged
         except Exception as e:
-            st.error(f"Search error: {str(e)}")
+            report("error", f"Search error: {str(e)}")
             return []
+    
+    def _merge(self, tavily_results: List[Dict[str, str]], serper_results: List[Dict[str, str]], max_results: int) -> List[Dict[str, str]]:
+        """Canonicalize, drop near-duplicates and rank by reciprocal-rank fusion"""
+        merged, stats = merge_results({"tavily": tavily_results, "serper": serper_results}, max_results)
+        self.merge_stats.add(stats)
+        return merged
 
 
 class VideoSearchTool:
     """Tool for video search functionality"""
     
+    def __init__(self, cache: Optional[SearchCache] = None, metrics: Optional[EngineMetrics] = None, base_url: str = ""):
+        self.cache = cache
+        self.metrics = metrics
+        # Results page origin; empty means youtube.com
+        self.base_url = base_url
+    
     def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
-        """Search YouTube for relevant videos"""
+        """Search YouTube for relevant videos (cached)"""
+        with span("search.youtube", provider="youtube") as s:
+            fetched = []
+            
+            def fetch():
+                fetched.append(True)
+                return self._fetch(query, max_results)
+            
+            videos = fetch() if self.cache is None else self.cache.get_or_fetch("youtube", query, max_results, fetch)
+            s.set(cache_hit=not fetched, results=len(videos))
+            if self.metrics:
+                self.metrics.record_search("youtube", cache_hit=not fetched)
+            return videos
+    
+    async def search_async(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        """Async search; youtube_search is blocking, so it runs on a worker thread"""
+        return await run_blocking(self.search, query, max_results)
+    
+    def _fetch(self, query: str, max_results: int) -> List[Dict[str, str]]:
         try:
-            results = YoutubeSearch(query, max_results=10).to_dict()
+            started = time.perf_counter()
+            results = youtube_search(query, max_results=10, base_url=self.base_url)
+            if self.metrics:
+                self.metrics.record_search_call("youtube", time.perf_counter() - started)
             videos = []
             for r in results:
                 if 'id' in r:
@@ -169,46 +512,68 @@ class VideoSearchTool:
             videos_sorted = sorted(videos, key=lambda x: x["views_num"], reverse=True)
             return [{"title": v["title"], "url": v["url"], "views": v["views"]} for v in videos_sorted[:max_results]]
         except Exception as e:
-            st.error(f"Video search error: {str(e)}")
+            if self.metrics:
+                self.metrics.record_search_error("youtube", e)
+            report("error", f"Video search error: {str(e)}")
             return []
 
 
 class SageLensAgenticSystem:
     """Enhanced Sage-Lens system using OpenAI Agents SDK"""
     
-    def __init__(self):
+    @staticmethod
+    def resolve_config() -> Dict[str, Any]:
+        """Resolve API keys and engine settings. The result is what the system
+        registry fingerprints to decide whether a rebuild is needed."""
+        load_env()
+        return {
+            "openai_key": get_secret("OPENAI_API_KEY"),
+            "anthropic_key": get_secret("ANTHROPIC_API_KEY"),
+            "deepseek_key": get_secret("DEEPSEEK_API_KEY"),
+            "tavily_key": get_secret("TAVILY_API_KEY"),
+            "serper_key": get_secret("SERPER_API_KEY"),
+            # Provider endpoints; overridden to point at local stand-ins (see benchmarks/stub_servers.py)
+            "openai_base_url": get_secret("OPENAI_BASE_URL"),
+            "anthropic_base_url": get_secret("ANTHROPIC_BASE_URL"),
+            "deepseek_base_url": get_secret("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+            "tavily_base_url": get_secret("TAVILY_BASE_URL"),
+            "serper_url": get_secret("SERPER_URL", "https://google.serper.dev/search"),
+            "youtube_base_url": get_secret("YOUTUBE_BASE_URL"),
+            # Every job worker runs its query's fan-out on this one pool
+            "max_workers": int(get_secret("SAGE_LENS_MAX_WORKERS") or job_workers() * QUERY_FAN_OUT),
+            "ensemble_deadline": float(get_secret("SAGE_LENS_ENSEMBLE_DEADLINE", "90") or 90),
+            "ensemble_grace": float(get_secret("SAGE_LENS_ENSEMBLE_GRACE", "5") or 5),
+            "ensemble_scorer": get_secret("SAGE_LENS_ENSEMBLE_SCORER", "length"),
+            "pool_max_connections": int(get_secret("SAGE_LENS_POOL_MAX_CONNECTIONS", "50") or 50),
+            "pool_per_host": int(get_secret("SAGE_LENS_POOL_PER_HOST", "10") or 10),
+            "pool_keepalive": float(get_secret("SAGE_LENS_POOL_KEEPALIVE", "90") or 90),
+            "http2": get_secret("SAGE_LENS_HTTP2", "false").lower() in ("1", "true", "yes"),
+            "input_budget": int(get_secret("SAGE_LENS_INPUT_BUDGET", "6000") or 6000),
+            "web_budget": int(get_secret("SAGE_LENS_WEB_BUDGET", "600") or 600),
+            "snippet_tokens": int(get_secret("SAGE_LENS_SNIPPET_TOKENS", "50") or 50)
+        }
+    
+    def __init__(self, max_workers: Optional[int] = None, ensemble_scorer: Optional[Callable[[Dict[str, Any]], float]] = None, config: Optional[Dict[str, Any]] = None):
         try:
-            # Helper function to get secrets
-            def get_secret(key: str, default: str = "") -> str:
-                """Get secret from Streamlit secrets or environment variables"""
-                try:
-                    if hasattr(st, 'secrets') and st.secrets is not None:
-                        try:
-                            value = getattr(st.secrets, key, None)
-                            if value:
-                                return str(value).strip().strip('"').strip("'")
-                        except (AttributeError, TypeError):
-                            pass
-                        
-                        try:
-                            if isinstance(st.secrets, dict) and key in st.secrets:
-                                value = st.secrets[key]
-                                if value:
-                                    return str(value).strip().strip('"').strip("'")
-                        except (KeyError, TypeError):
-                            pass
-                except Exception:
-                    pass
-                
-                value = os.getenv(key, default)
-                return str(value).strip().strip('"').strip("'")
+            config = config or self.resolve_config()
             
             # Get API keys
-            openai_key = get_secret("OPENAI_API_KEY")
-            anthropic_key = get_secret("ANTHROPIC_API_KEY")
-            deepseek_key = get_secret("DEEPSEEK_API_KEY")
-            tavily_key = get_secret("TAVILY_API_KEY")
-            serper_key = get_secret("SERPER_API_KEY")
+            openai_key = config["openai_key"]
+            anthropic_key = config["anthropic_key"]
+            deepseek_key = config["deepseek_key"]
+            tavily_key = config["tavily_key"]
+            serper_key = config["serper_key"]
+            
+            self.config = config
+            
+            # Worker limit for concurrent searches and generation
+            self.executor = ConcurrentExecutor(max_workers=max_workers or config["max_workers"])
+            
+            # Ensemble settings: shared deadline, grace period after the first
+            # good answer, and the scorer used to pick a winner
+            self.ensemble_deadline = config["ensemble_deadline"]
+            self.ensemble_grace = config["ensemble_grace"]
+            self.ensemble_scorer = ensemble_scorer or ENSEMBLE_SCORERS.get(config["ensemble_scorer"], score_by_length)
             
             # Validate required keys
             errors = []
@@ -230,24 +595,52 @@ class SageLensAgenticSystem:
                 error_msg += "   3. Restart the app\n"
                 raise ValueError(error_msg)
             
+            # Shared keep-alive connection pools for every HTTP client
+            self.transport = TransportLayer(
+                max_connections=config["pool_max_connections"],
+                per_host=config["pool_per_host"],
+                keepalive_seconds=config["pool_keepalive"],
+                http2=config["http2"]
+            )
+            
             # Initialize OpenAI client
-            self.openai_client = OpenAI(api_key=openai_key)
+            from openai import OpenAI
+            self.openai_client = OpenAI(
+                api_key=openai_key,
+                base_url=config["openai_base_url"] or None,
+                http_client=self.transport.httpx_client(OpenAI)
+            )
             
             # Initialize Anthropic if available
             if anthropic_key:
-                self.anthropic_client = anthropic.Anthropic(api_key=anthropic_key)
+                from anthropic import Anthropic
+                self.anthropic_client = Anthropic(
+                    api_key=anthropic_key,
+                    base_url=config["anthropic_base_url"] or None,
+                    http_client=self.transport.httpx_client(Anthropic)
+                )
             else:
                 self.anthropic_client = None
             
             # Initialize DeepSeek if available (uses OpenAI-compatible API)
             if deepseek_key:
-                self.deepseek_client = OpenAI(api_key=deepseek_key, base_url="https://api.deepseek.com")
+                self.deepseek_client = OpenAI(
+                    api_key=deepseek_key,
+                    base_url=config["deepseek_base_url"],
+                    http_client=self.transport.httpx_client(OpenAI)
+                )
             else:
                 self.deepseek_client = None
             
             # Initialize search tools
             if tavily_key:
-                self.tavily = TavilyClient(api_key=tavily_key)
+                from tavily import TavilyClient
+                endpoint = {"api_base_url": config["tavily_base_url"]} if config["tavily_base_url"] else {}
+                try:
+                    self.tavily = TavilyClient(api_key=tavily_key, session=self.transport.session, **endpoint)
+                except TypeError:
+                    # Older tavily-python without session support
+                    self.tavily = TavilyClient(api_key=tavily_key, **endpoint)
                 self.tavily_available = True
             else:
                 self.tavily = None
@@ -257,7 +650,7 @@ class SageLensAgenticSystem:
                 # Clean the API key (remove quotes if present)
                 serper_key_clean = serper_key.strip().strip('"').strip("'")
                 self.serper_config = {
-                    "url": "https://google.serper.dev/search",
+                    "url": config["serper_url"],
                     "headers": {
                         "X-API-KEY": serper_key_clean,
                         "Content-Type": "application/json"
@@ -270,8 +663,34 @@ class SageLensAgenticSystem:
                 self.serper_available = False
             
             # Initialize tools
-            self.web_search_tool = WebSearchTool(self.tavily, self.serper_config)
-            self.video_search_tool = VideoSearchTool()
+            self.search_cache = get_search_cache()
+            self.completion_cache = get_completion_cache()
+            self.rate_limiter = get_rate_limiter()
+            self.metrics = get_metrics()
+            # Identical queries submitted at once share one pipeline run
+            self.pipeline_flight = get_single_flight("pipeline")
+            
+            # Token budgets for prompt material and per-stage completions
+            self.context_budget = ContextBudget(
+                input_budget=config["input_budget"],
+                web_budget=config["web_budget"],
+                snippet_tokens=config["snippet_tokens"]
+            )
+            self.web_search_tool = WebSearchTool(
+                self.tavily,
+                self.serper_config,
+                executor=self.executor,
+                cache=self.search_cache,
+                # Only Serper needs the requests session; don't import requests otherwise
+                session=self.transport.session if self.serper_available else None,
+                async_clients=self.async_clients,
+                rate_limiter=self.rate_limiter,
+                metrics=self.metrics
+            )
+            self.video_search_tool = VideoSearchTool(cache=self.search_cache, metrics=self.metrics, base_url=config["youtube_base_url"])
+            
+            # Async SDK clients, built lazily per event loop (see async_clients)
+            self._async_client_sets: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
             
             # Initialize agents if SDK is available
             self.agents_initialized = False
@@ -287,11 +706,63 @@ class SageLensAgenticSystem:
             st.error(error_msg)
             st.stop()
     
+    def close(self):
+        """Release the worker pool and connection pools when the registry retires this system"""
+        self.executor.shutdown(wait=False)
+        self.transport.close()
+    
+    def async_clients(self) -> Dict[str, Any]:
+        """AsyncOpenAI, AsyncAnthropic, DeepSeek, Tavily and Serper clients for
+        the running event loop, sharing that loop's connection pool"""
+        loop = asyncio.get_running_loop()
+        clients = self._async_client_sets.get(loop)
+        if clients is None:
+            from openai import AsyncOpenAI
+            http = self.transport.async_httpx_client(AsyncOpenAI)
+            clients = {
+                "http": http,
+                "openai": AsyncOpenAI(api_key=self.config["openai_key"], base_url=self.config["openai_base_url"] or None, http_client=http),
+                "anthropic": self._async_anthropic() if self.anthropic_client else None,
+                "deepseek": AsyncOpenAI(
+                    api_key=self.config["deepseek_key"],
+                    base_url=self.config["deepseek_base_url"],
+                    http_client=http
+                ) if self.deepseek_client else None,
+                "tavily": self._async_tavily() if self.tavily else None
+            }
+            self._async_client_sets[loop] = clients
+        return clients
+    
+    def _async_anthropic(self) -> Any:
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(
+            api_key=self.config["anthropic_key"],
+            base_url=self.config["anthropic_base_url"] or None,
+            http_client=self.transport.async_httpx_client(AsyncAnthropic)
+        )
+    
+    def _async_tavily(self) -> Any:
+        try:
+            from tavily import AsyncTavilyClient
+        except ImportError:
+            # Older tavily-python: async searches fall back to the sync client on a thread
+            return None
+        endpoint = {"api_base_url": self.config["tavily_base_url"]} if self.config["tavily_base_url"] else {}
+        return AsyncTavilyClient(api_key=self.config["tavily_key"], **endpoint)
+    
+    async def aclose(self):
+        """Close the async clients of the running event loop. Headless callers
+        should await this before their loop ends."""
+        self._async_client_sets.pop(asyncio.get_running_loop(), None)
+        await self.transport.aclose()
+    
     def _initialize_agents(self):
         """Initialize OpenAI Agents"""
-        if not AGENTS_SDK_AVAILABLE or Agent is None:
+        sdk = load_agents_sdk() if AGENTS_SDK_AVAILABLE else None
+        if sdk is None:
             self.agents_initialized = False
             return
+        Agent = sdk[0]
         
         try:
             # Research Agent - conducts deep research
@@ -347,9 +818,9 @@ class SageLensAgenticSystem:
             # Silently fall back to standard mode if agents can't be initialized
             self.agents_initialized = False
             if hasattr(st, 'warning'):
-                st.warning(f"Could not initialize agents: {str(e)}. Falling back to standard mode.")
+                report("warning", f"Could not initialize agents: {str(e)}. Falling back to standard mode.")
     
-    def _generate_with_agent(self, agent: Agent, prompt: str, context: str = "") -> Optional[Dict[str, Any]]:
+    def _generate_with_agent(self, agent: Any, prompt: str, context: str = "", on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True) -> Optional[Dict[str, Any]]:
         """Generate content using an agent - simplified approach using OpenAI directly with agent instructions"""
         if not AGENTS_SDK_AVAILABLE or agent is None:
             return None
@@ -360,12 +831,12 @@ class SageLensAgenticSystem:
             
             # Instead of using Runner (which has async issues), use OpenAI directly
             # but incorporate the agent's instructions for better results
-            agent_instructions = getattr(agent, 'instructions', '')
             agent_name = getattr(agent, 'name', 'unknown')
-            enhanced_prompt = f"{agent_instructions}\n\nUser request: {full_prompt}\n\nPlease provide a comprehensive response following your role and instructions."
+            enhanced_prompt = self._agent_prompt(agent, full_prompt)
             
             # Use standard OpenAI generation with agent-enhanced prompt
-            result = self._generate_with_openai(enhanced_prompt, model=getattr(agent, 'model', 'gpt-4-turbo'))
+            with span(f"agent.{agent_name}", agent=agent_name, model=getattr(agent, 'model', 'gpt-4-turbo')):
+                result = self._generate_with_openai(enhanced_prompt, model=getattr(agent, 'model', 'gpt-4-turbo'), on_delta=on_delta, use_cache=use_cache, stage=agent_name.replace("_agent", ""))
             
             # Update provider name to reflect agent usage
             if result:
@@ -376,114 +847,506 @@ class SageLensAgenticSystem:
             
         except Exception as e:
             if hasattr(st, 'warning'):
-                st.warning(f"Agent-enhanced generation failed, using standard mode: {str(e)}")
+                report("warning", f"Agent-enhanced generation failed, using standard mode: {str(e)}")
             # Fallback to standard OpenAI generation
             try:
                 full_prompt = f"{context}\n\n{prompt}" if context else prompt
-                return self._generate_with_openai(full_prompt)
+                return self._generate_with_openai(full_prompt, on_delta=on_delta, use_cache=use_cache)
             except:
                 return None
     
-    def _generate_with_openai(self, prompt: str, model: str = "gpt-4-turbo") -> Optional[Dict[str, Any]]:
-        """Generate content using OpenAI directly"""
-        try:
+    def _build_request(self, provider: str, prompt: str, model: Optional[str] = None, stage: str = "standard") -> Dict[str, Any]:
+        """Provider request parameters, also used as completion cache key material.
+        max_tokens is sized for the stage's expected output."""
+        messages = [{"role": "user", "content": prompt}]
+        if provider == "anthropic":
+            model = "claude-3-5-sonnet-20241022"
+            return {"model": model, "max_tokens": self.context_budget.max_tokens(stage, model, prompt), "messages": messages}
+        if provider == "deepseek":
+            model = "deepseek-chat"
+            return {"model": model, "messages": messages, "temperature": 0.3, "max_tokens": self.context_budget.max_tokens(stage, model, prompt)}
+        model = model or "gpt-4-turbo"
+        return {"model": model, "messages": messages, "temperature": 0.3, "max_tokens": self.context_budget.max_tokens(stage, model, prompt)}
+    
+    def stream_generation(self, provider: str, prompt: str, model: Optional[str] = None, stage: str = "standard", request: Optional[Dict[str, Any]] = None) -> GenerationStream:
+        """Start a streaming generation; iterate it for token deltas, then read `.result`"""
+        request = request or self._build_request(provider, prompt, model, stage)
+        if provider == "anthropic":
+            if not self.anthropic_client:
+                raise ValueError("Anthropic is not configured")
+            return stream_anthropic_messages(self.anthropic_client, "Claude-3.5-Sonnet", **request)
+        if provider == "deepseek":
+            if not self.deepseek_client:
+                raise ValueError("DeepSeek is not configured")
+            return stream_openai_chat(self.deepseek_client, "DeepSeek-Chat", **request)
+        return stream_openai_chat(self.openai_client, f"OpenAI-{request['model']}", **request)
+    
+    def _complete(self, provider: str, request: Dict[str, Any], call: Callable[[], Dict[str, Any]], on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard") -> Optional[Dict[str, Any]]:
+        """Run call() behind the completion cache and the provider's rate limits;
+        a hit is replayed to on_delta in one piece and costs no quota"""
+        def limited():
+            reservation = self.rate_limiter.reserve(provider, estimate_request_tokens(request))
+            started = time.perf_counter()
+            try:
+                result = call()
+            except StreamCancelled:
+                # The request was sent: keep the estimate charged
+                reservation.settle()
+                raise
+            except BaseException:
+                reservation.refund()
+                raise
+            self.metrics.record_call(provider, request["model"], time.perf_counter() - started, reservation.waited, result)
+            return self._settle(reservation, result)
+        
+        with span(f"llm.{provider}", provider=provider, model=request["model"], stage=stage, streamed=on_delta is not None) as s:
+            try:
+                result = self.completion_cache.complete(
+                    provider,
+                    request,
+                    limited,
+                    use_cache=use_cache,
+                    on_hit=(lambda hit: on_delta(hit["content"])) if on_delta else None
+                )
+            except StreamCancelled:
+                s.set(cancelled=True)
+                raise
+            except Exception as e:
+                self.metrics.record_provider_error(provider, stage, e)
+                raise
+            s.set(**self._generation_attributes(result))
+            self.metrics.record_generation(provider, stage, result)
+            return result
+    
+    @staticmethod
+    def _generation_attributes(result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Span attributes describing a finished provider call"""
+        if not result:
+            return {"empty": True}
+        usage = result.get("usage") or {}
+        attributes = {
+            "cache_hit": bool(result.get("cached")),
+            "coalesced": bool(result.get("coalesced")),
+            "input_tokens": usage.get("input_tokens"),
+            "output_tokens": usage.get("output_tokens"),
+            "ttft": result.get("ttft"),
+            "rate_limit_wait": result.get("rate_limit_wait")
+        }
+        return {key: value for key, value in attributes.items() if value is not None}
+    
+    @staticmethod
+    def _settle(reservation, result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Correct the token estimate from reported usage and note any queueing"""
+        reservation.settle((result or {}).get("usage"))
+        if result and reservation.waited > 0:
+            result["rate_limit_wait"] = reservation.waited
+        return result
+    
+    def _generate_with_openai(self, prompt: str, model: str = "gpt-4-turbo", on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard", cancelled: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """Generate content using OpenAI directly (streamed when on_delta is given;
+        setting `cancelled` stops the stream and returns None)"""
+        request = self._build_request("openai", prompt, model, stage)
+        
+        def call():
+            if on_delta:
+                return self.stream_generation("openai", prompt, model=model, request=request).consume(on_delta, cancelled)
             start_time = time.time()
-            response = self.openai_client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=4000
-            )
+            response = self.openai_client.chat.completions.create(**request)
             return {
                 "content": response.choices[0].message.content,
                 "provider": f"OpenAI-{model}",
-                "latency": time.time() - start_time
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
             }
+        
+        try:
+            return self._complete("openai", request, call, on_delta, use_cache, stage)
+        except StreamCancelled:
+            return None
         except Exception as e:
-            st.error(f"OpenAI generation error: {str(e)}")
+            report("error", f"OpenAI generation error: {str(e)}")
             return None
     
-    def _generate_with_anthropic(self, prompt: str) -> Optional[Dict[str, Any]]:
-        """Generate content using Anthropic"""
+    def _generate_with_anthropic(self, prompt: str, on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard", cancelled: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """Generate content using Anthropic (streamed when on_delta is given;
+        setting `cancelled` stops the stream and returns None)"""
         if not self.anthropic_client:
             return None
-        try:
+        request = self._build_request("anthropic", prompt, stage=stage)
+        
+        def call():
+            if on_delta:
+                return self.stream_generation("anthropic", prompt, request=request).consume(on_delta, cancelled)
             start_time = time.time()
-            response = self.anthropic_client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=4000,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            response = self.anthropic_client.messages.create(**request)
             content_text = response.content[0].text if response.content else ""
             return {
                 "content": content_text,
                 "provider": "Claude-3.5-Sonnet",
-                "latency": time.time() - start_time
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
             }
+        
+        try:
+            return self._complete("anthropic", request, call, on_delta, use_cache, stage)
+        except StreamCancelled:
+            return None
         except Exception as e:
-            st.error(f"Anthropic generation error: {str(e)}")
+            report("error", f"Anthropic generation error: {str(e)}")
             return None
     
-    def _generate_with_deepseek(self, prompt: str) -> Optional[Dict[str, Any]]:
-        """Generate content using DeepSeek"""
+    def _generate_with_deepseek(self, prompt: str, on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard", cancelled: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """Generate content using DeepSeek (streamed when on_delta is given;
+        setting `cancelled` stops the stream and returns None)"""
         if not self.deepseek_client:
             return None
-        try:
+        request = self._build_request("deepseek", prompt, stage=stage)
+        
+        def call():
+            if on_delta:
+                return self.stream_generation("deepseek", prompt, request=request).consume(on_delta, cancelled)
             start_time = time.time()
-            response = self.deepseek_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=4000
-            )
+            response = self.deepseek_client.chat.completions.create(**request)
             return {
                 "content": response.choices[0].message.content,
                 "provider": "DeepSeek-Chat",
-                "latency": time.time() - start_time
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
             }
+        
+        try:
+            return self._complete("deepseek", request, call, on_delta, use_cache, stage)
+        except StreamCancelled:
+            return None
         except Exception as e:
-            st.error(f"DeepSeek generation error: {str(e)}")
+            report("error", f"DeepSeek generation error: {str(e)}")
             return None
     
-    def process_query_agentic(self, topic: str, use_agents: bool = True) -> Dict[str, Any]:
-        """Process query using agentic approach"""
-        result = {
-            "content": None,
-            "references": {"web": [], "videos": []},
-            "analysis": None,
-            "metadata": {
-                "timestamp": datetime.now().isoformat(),
-                "topic": topic,
-                "method": "agentic" if use_agents and self.agents_initialized else "standard"
+    def _generate_ensemble(self, prompt: str, group: Optional[TaskGroup] = None, on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True) -> tuple:
+        """Generate with every configured provider in parallel and keep the best
+        answer that finished in time. Returns (winner, ensemble report).
+        on_delta, if given, receives (provider name, text delta) from every stream
+        until the ensemble returns; streams still running then are stopped."""
+        group = group or self.executor.group()
+        providers = {"openai": self._generate_with_openai}
+        if self.anthropic_client:
+            providers["anthropic"] = self._generate_with_anthropic
+        if self.deepseek_client:
+            providers["deepseek"] = self._generate_with_deepseek
+        
+        # Stragglers that already started cannot be cancelled through their
+        # futures: they check this event per chunk and close their streams
+        cancelled = threading.Event()
+        delta_lock = threading.Lock()
+        
+        def forward(name: str, delta: str):
+            with delta_lock:
+                if not cancelled.is_set():
+                    on_delta(name, delta)
+        
+        with span("ensemble", providers=list(providers)) as s:
+            futures = {
+                name: group.submit(
+                    name, generate, prompt, on_delta=partial(forward, name) if on_delta else None, use_cache=use_cache, cancelled=cancelled
+                )
+                for name, generate in providers.items()
             }
+            try:
+                outcome = gather_within(
+                    futures,
+                    deadline=self.ensemble_deadline,
+                    grace=self.ensemble_grace,
+                    accept=lambda r: bool(r and r.get("content"))
+                )
+            finally:
+                with delta_lock:
+                    cancelled.set()
+            winner, ensemble_report = self._pick_ensemble_winner(list(providers), outcome)
+            s.set(winner=ensemble_report["winner"], stragglers=ensemble_report["stragglers"])
+            return winner, ensemble_report
+    
+    def _pick_ensemble_winner(self, providers: List[str], outcome: Dict[str, Any]) -> tuple:
+        """Score the answers that arrived in time; returns (winner, ensemble report)"""
+        candidates = outcome["results"]
+        scores = {name: self.ensemble_scorer(candidate) for name, candidate in candidates.items()}
+        winner = max(scores, key=scores.get) if scores else None
+        ensemble_report = {
+            "providers": providers,
+            "winner": winner,
+            "scores": scores,
+            "latencies": {name: candidate["latency"] for name, candidate in candidates.items()},
+            "stragglers": outcome["stragglers"],
+            "elapsed": outcome["elapsed"],
+            "deadline": self.ensemble_deadline,
+            "grace": self.ensemble_grace
         }
+        return (candidates[winner] if winner else None), ensemble_report
+    
+    def stream_generation_async(self, provider: str, prompt: str, model: Optional[str] = None, stage: str = "standard", request: Optional[Dict[str, Any]] = None) -> AsyncGenerationStream:
+        """Async counterpart of stream_generation on the running loop's clients"""
+        clients = self.async_clients()
+        request = request or self._build_request(provider, prompt, model, stage)
+        if provider == "anthropic":
+            if not clients["anthropic"]:
+                raise ValueError("Anthropic is not configured")
+            return stream_anthropic_messages_async(clients["anthropic"], "Claude-3.5-Sonnet", **request)
+        if provider == "deepseek":
+            if not clients["deepseek"]:
+                raise ValueError("DeepSeek is not configured")
+            return stream_openai_chat_async(clients["deepseek"], "DeepSeek-Chat", **request)
+        return stream_openai_chat_async(clients["openai"], f"OpenAI-{request['model']}", **request)
+    
+    async def _complete_async(self, provider: str, request: Dict[str, Any], call: Callable[[], Any], on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard") -> Optional[Dict[str, Any]]:
+        async def limited():
+            reservation = await self.rate_limiter.reserve_async(provider, estimate_request_tokens(request))
+            started = time.perf_counter()
+            try:
+                result = await call()
+            except BaseException:
+                reservation.refund()
+                raise
+            self.metrics.record_call(provider, request["model"], time.perf_counter() - started, reservation.waited, result)
+            return self._settle(reservation, result)
+        
+        with span(f"llm.{provider}", provider=provider, model=request["model"], stage=stage, streamed=on_delta is not None) as s:
+            try:
+                result = await self.completion_cache.complete_async(
+                    provider,
+                    request,
+                    limited,
+                    use_cache=use_cache,
+                    on_hit=(lambda hit: on_delta(hit["content"])) if on_delta else None
+                )
+            except Exception as e:
+                self.metrics.record_provider_error(provider, stage, e)
+                raise
+            s.set(**self._generation_attributes(result))
+            self.metrics.record_generation(provider, stage, result)
+            return result
+    
+    async def _generate_with_openai_async(self, prompt: str, model: str = "gpt-4-turbo", on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard") -> Optional[Dict[str, Any]]:
+        """Generate content with AsyncOpenAI (streamed when on_delta is given)"""
+        request = self._build_request("openai", prompt, model, stage)
+        
+        async def call():
+            if on_delta:
+                return await self.stream_generation_async("openai", prompt, model=model, request=request).consume(on_delta)
+            start_time = time.time()
+            response = await self.async_clients()["openai"].chat.completions.create(**request)
+            return {
+                "content": response.choices[0].message.content,
+                "provider": f"OpenAI-{model}",
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
+            }
         
         try:
-            # Step 1: Search for web resources (Tavily + Serper)
-            with st.spinner("🔍 Searching web resources with Tavily & Serper..."):
-                web_results = self.web_search_tool.search(topic, max_results=10)
-                result["references"]["web"] = web_results
-                # Track which search engines were used
-                result["metadata"]["tavily_used"] = self.tavily_available
-                result["metadata"]["serper_used"] = self.serper_available
-            
-            # Step 2: Search for videos
-            with st.spinner("🎥 Searching video resources..."):
-                result["references"]["videos"] = self.video_search_tool.search(topic, max_results=5)
-            
-            # Step 3: Generate content using agents or standard approach
-            if use_agents and self.agents_initialized:
-                # Agentic approach
-                with st.spinner("🤖 Research Agent analyzing..."):
-                    # Create context from web search results
-                    web_context = "\n".join([
-                        f"- {r['title']}: {r.get('snippet', '')[:200]}"
-                        for r in result["references"]["web"][:5]
-                    ])
-                    
-                    research_prompt = f"""
+            return await self._complete_async("openai", request, call, on_delta, use_cache, stage)
+        except Exception as e:
+            report("error", f"OpenAI generation error: {str(e)}")
+            return None
+    
+    async def _generate_with_anthropic_async(self, prompt: str, on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard") -> Optional[Dict[str, Any]]:
+        """Generate content with AsyncAnthropic (streamed when on_delta is given)"""
+        if not self.anthropic_client:
+            return None
+        request = self._build_request("anthropic", prompt, stage=stage)
+        
+        async def call():
+            if on_delta:
+                return await self.stream_generation_async("anthropic", prompt, request=request).consume(on_delta)
+            start_time = time.time()
+            response = await self.async_clients()["anthropic"].messages.create(**request)
+            content_text = response.content[0].text if response.content else ""
+            return {
+                "content": content_text,
+                "provider": "Claude-3.5-Sonnet",
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
+            }
+        
+        try:
+            return await self._complete_async("anthropic", request, call, on_delta, use_cache, stage)
+        except Exception as e:
+            report("error", f"Anthropic generation error: {str(e)}")
+            return None
+    
+    async def _generate_with_deepseek_async(self, prompt: str, on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True, stage: str = "standard") -> Optional[Dict[str, Any]]:
+        """Generate content with DeepSeek on AsyncOpenAI (streamed when on_delta is given)"""
+        if not self.deepseek_client:
+            return None
+        request = self._build_request("deepseek", prompt, stage=stage)
+        
+        async def call():
+            if on_delta:
+                return await self.stream_generation_async("deepseek", prompt, request=request).consume(on_delta)
+            start_time = time.time()
+            response = await self.async_clients()["deepseek"].chat.completions.create(**request)
+            return {
+                "content": response.choices[0].message.content,
+                "provider": "DeepSeek-Chat",
+                "latency": time.time() - start_time,
+                "usage": response_usage(response)
+            }
+        
+        try:
+            return await self._complete_async("deepseek", request, call, on_delta, use_cache, stage)
+        except Exception as e:
+            report("error", f"DeepSeek generation error: {str(e)}")
+            return None
+    
+    async def _generate_with_agent_async(self, agent: Any, prompt: str, context: str = "", on_delta: Optional[Callable[[str], None]] = None, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Async counterpart of _generate_with_agent"""
+        if not AGENTS_SDK_AVAILABLE or agent is None:
+            return None
+        
+        full_prompt = f"{context}\n\n{prompt}" if context else prompt
+        agent_name = getattr(agent, 'name', 'unknown')
+        enhanced_prompt = self._agent_prompt(agent, full_prompt)
+        with span(f"agent.{agent_name}", agent=agent_name, model=getattr(agent, 'model', 'gpt-4-turbo')):
+            result = await self._generate_with_openai_async(enhanced_prompt, model=getattr(agent, 'model', 'gpt-4-turbo'), on_delta=on_delta, use_cache=use_cache, stage=agent_name.replace("_agent", ""))
+        if result:
+            result["provider"] = f"Agent-{agent_name}"
+            result["agent_name"] = agent_name
+        return result
+    
+    async def _generate_ensemble_async(self, prompt: str, group: TaskGroup, on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True) -> tuple:
+        """Async counterpart of _generate_ensemble. Stragglers are cancelled,
+        closing their streams instead of leaving them to finish."""
+        providers = {"openai": self._generate_with_openai_async}
+        if self.anthropic_client:
+            providers["anthropic"] = self._generate_with_anthropic_async
+        if self.deepseek_client:
+            providers["deepseek"] = self._generate_with_deepseek_async
+        
+        with span("ensemble", providers=list(providers)) as s:
+            tasks = {
+                name: asyncio.create_task(group.run_async(
+                    name, generate, prompt, on_delta=partial(on_delta, name) if on_delta else None, use_cache=use_cache
+                ))
+                for name, generate in providers.items()
+            }
+            outcome = await gather_within_async(
+                tasks,
+                deadline=self.ensemble_deadline,
+                grace=self.ensemble_grace,
+                accept=lambda r: bool(r and r.get("content"))
+            )
+            winner, ensemble_report = self._pick_ensemble_winner(list(providers), outcome)
+            s.set(winner=ensemble_report["winner"], stragglers=ensemble_report["stragglers"])
+            return winner, ensemble_report
+    
+    def _agent_graph(self, topic: str, web_results: List[Dict[str, str]], generate: Callable, on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True) -> StageGraph:
+        """The agent chain as a stage DAG. The research agent writes a structured
+        brief; content polishing and analysis both read only that brief, so
+        they run side by side. generate is _generate_with_agent or
+        _generate_with_agent_async."""
+        graph = StageGraph()
+        
+        def stage(name: str, agent: Any, prompt: Callable[..., str], inputs: tuple = ()):
+            def run(**upstream):
+                with span(f"prompt.{name}", stage=name) as s:
+                    text = prompt(**upstream)
+                    s.set(chars=len(text))
+                return generate(
+                    agent, text,
+                    on_delta=partial(on_delta, name) if on_delta else None,
+                    use_cache=use_cache
+                )
+            graph.add(name, run, inputs)
+        
+        stage("research_agent", self.research_agent, lambda: self._brief_prompt(topic, web_results))
+        stage("content_agent", self.content_agent, lambda research_agent: self._content_prompt(self._handoff(research_agent, web_results)), ("research_agent",))
+        stage("analysis_agent", self.analysis_agent, lambda research_agent: self._analysis_prompt(self._handoff(research_agent, web_results)), ("research_agent",))
+        return graph
+    
+    def _fused_prompt(self, topic: str, web_results: List[Dict[str, str]]) -> str:
+        """All three agent roles in one request. The model writes the research
+        once and derives the content and analysis from it in the same reply,
+        instead of each later stage re-reading the previous document."""
+        roles = "\n".join(
+            f"<<<{section.upper()}>>> - {getattr(getattr(self, agent), 'instructions', '').strip()}"
+            for section, agent in FUSED_SECTIONS.items()
+        )
+        return f"""{self._research_prompt(topic, web_results)}
+        
+        Answer in three sections, each playing one role:
+        {roles}
+        
+        Start each section with its marker alone on a line, exactly <<<RESEARCH>>>, <<<CONTENT>>> and <<<ANALYSIS>>>, in that order.
+        The CONTENT section transforms the research into polished, publication-ready content.
+        The ANALYSIS section covers key takeaways, important implications, critical considerations and potential applications."""
+    
+    @staticmethod
+    def _fused_outputs(generation: Optional[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Split a fused generation into per-stage results shaped like the chain's"""
+        if not generation:
+            return {stage: None for stage in FUSED_SECTIONS.values()}
+        sections = split_fused_sections(generation["content"])
+        outputs = {}
+        for section, stage in FUSED_SECTIONS.items():
+            outputs[stage] = {
+                **generation,
+                "content": sections[section],
+                "provider": "Agent-fused",
+                "agent_name": stage
+            } if sections.get(section) else None
+        return outputs
+    
+    def _generate_fused(self, topic: str, web_results: List[Dict[str, str]], on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True) -> tuple:
+        """Fused agent mode: one OpenAI call for research, content and analysis.
+        Returns ({stage: result}, token usage)."""
+        route, flush = make_section_router(on_delta) if on_delta else (None, None)
+        with span("prompt.fused", stage="fused") as s:
+            prompt = self._fused_prompt(topic, web_results)
+            s.set(chars=len(prompt))
+        generation = self._generate_with_openai(
+            prompt,
+            model=getattr(self.research_agent, 'model', 'gpt-4-turbo'),
+            on_delta=route,
+            use_cache=use_cache,
+            stage="fused"
+        )
+        if flush:
+            flush()
+        return self._fused_outputs(generation), self._total_usage(generation)
+    
+    async def _generate_fused_async(self, topic: str, web_results: List[Dict[str, str]], on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True) -> tuple:
+        """Async counterpart of _generate_fused"""
+        route, flush = make_section_router(on_delta) if on_delta else (None, None)
+        with span("prompt.fused", stage="fused") as s:
+            prompt = self._fused_prompt(topic, web_results)
+            s.set(chars=len(prompt))
+        generation = await self._generate_with_openai_async(
+            prompt,
+            model=getattr(self.research_agent, 'model', 'gpt-4-turbo'),
+            on_delta=route,
+            use_cache=use_cache,
+            stage="fused"
+        )
+        if flush:
+            flush()
+        return self._fused_outputs(generation), self._total_usage(generation)
+    
+    @staticmethod
+    def _total_usage(*generations: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        """Summed token usage of the provider calls behind a result"""
+        total = {"input_tokens": 0, "output_tokens": 0}
+        for generation in generations:
+            for key in total:
+                total[key] += ((generation or {}).get("usage") or {}).get(key, 0)
+        return total
+    
+    @staticmethod
+    def _agent_prompt(agent: Any, full_prompt: str) -> str:
+        """Fold an agent's instructions into a plain chat prompt"""
+        agent_instructions = getattr(agent, 'instructions', '')
+        return f"{agent_instructions}\n\nUser request: {full_prompt}\n\nPlease provide a comprehensive response following your role and instructions."
+    
+    def _research_prompt(self, topic: str, web_results: List[Dict[str, str]]) -> str:
+        # Create context from web search results, within the web token budget
+        web_context = self.context_budget.web_context(web_results)
+        return f"""
                     Conduct comprehensive research on: {topic}
                     
                     Available resources:
@@ -496,28 +1359,73 @@ class SageLensAgenticSystem:
                     4. Applications and use cases
                     5. Future trends and considerations
                     """
+    
+    def _brief_prompt(self, topic: str, web_results: List[Dict[str, str]]) -> str:
+        """Research prompt for the agent chain: a structured brief whose
+        citations are the numbers of the listed resources"""
+        web_context = self.context_budget.web_context(web_results, numbered=True)
+        return f"""
+                    Conduct comprehensive research on: {topic}
                     
-                    research_result = self._generate_with_agent(self.research_agent, research_prompt)
+                    Available resources:
+                    {web_context}
                     
-                    if research_result:
-                        # Generate polished content
-                        with st.spinner("✍️ Content Agent refining..."):
-                            content_prompt = f"""
+                    Reply with a research brief as a single JSON object, no other text:
+                    {BRIEF_FORMAT}
+                    
+                    The outline should cover:
+                    1. Overview and key concepts
+                    2. Current state and developments
+                    3. Important findings and insights
+                    4. Applications and use cases
+                    5. Future trends and considerations
+                    
+                    Source numbers refer to the numbered resources above.
+                    """
+    
+    def _research_brief(self, research: Optional[Dict[str, Any]], web_results: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+        if not research:
+            return None
+        # Only the sources _brief_prompt listed can be cited
+        shown = self.context_budget.web_sources(web_results, numbered=True)
+        try:
+            return parse_brief(research["content"], shown)
+        except Exception:
+            # A brief that cannot be read is handed on as the raw reply
+            return None
+    
+    def _handoff(self, research: Dict[str, Any], web_results: List[Dict[str, str]]) -> str:
+        """What later stages read: the rendered brief, or the raw research
+        reply if it was not a valid brief"""
+        brief = self._research_brief(research, web_results)
+        return render_brief(brief, web_results) if brief else research["content"]
+    
+    def _chain_content(self, outputs: Dict[str, Any], web_results: List[Dict[str, str]], metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The chain's content result; records the brief in metadata and falls
+        back to the rendered brief if the content agent failed"""
+        research = outputs["research_agent"]
+        brief = self._research_brief(research, web_results)
+        if brief:
+            metadata["brief"] = brief
+        if outputs["content_agent"] or not research:
+            return outputs["content_agent"]
+        return {**research, "content": render_brief(brief, web_results)} if brief else research
+    
+    def _content_prompt(self, research: str) -> str:
+        return f"""
                             Transform this research into polished, publication-ready content:
                             
-                            {research_result['content']}
+                            {self.context_budget.fit_document(research)}
                             
                             Make it engaging, well-formatted, and comprehensive.
+                            Keep the [n] source references where facts are used.
                             """
-                            content_result = self._generate_with_agent(self.content_agent, content_prompt)
-                            result["content"] = content_result or research_result
-                        
-                        # Generate analysis
-                        with st.spinner("📊 Analysis Agent providing insights..."):
-                            analysis_prompt = f"""
+    
+    def _analysis_prompt(self, content: str) -> str:
+        return f"""
                             Analyze this research and provide key insights:
                             
-                            {result["content"]["content"]}
+                            {self.context_budget.fit_document(content)}
                             
                             Focus on:
                             - Key takeaways
@@ -525,48 +1433,954 @@ class SageLensAgenticSystem:
                             - Critical considerations
                             - Potential applications
                             """
-                            analysis_result = self._generate_with_agent(self.analysis_agent, analysis_prompt)
-                            result["analysis"] = analysis_result
-            else:
-                # Standard approach - use all available AI providers with web context
-                with st.spinner("🤖 Generating content with multiple AI providers..."):
-                    versions = []
-                    
-                    # Use web search results to enhance prompts (Tavily + Serper results)
-                    web_context = "\n".join([
-                        f"- {r['title']}: {r.get('snippet', '')[:150]}"
-                        for r in result["references"]["web"][:5]
-                    ]) if result["references"]["web"] else ""
-                    
-                    enhanced_prompt = f"Create a comprehensive, well-structured research document about: {topic}"
-                    if web_context:
-                        enhanced_prompt += f"\n\nRelevant information from web search (Tavily & Serper):\n{web_context}"
-                    
-                    # Try OpenAI
-                    openai_result = self._generate_with_openai(enhanced_prompt)
-                    if openai_result:
-                        versions.append(openai_result)
-                    
-                    # Try Anthropic
-                    anthropic_result = self._generate_with_anthropic(enhanced_prompt)
-                    if anthropic_result:
-                        versions.append(anthropic_result)
-                    
-                    # Try DeepSeek
-                    deepseek_result = self._generate_with_deepseek(enhanced_prompt)
-                    if deepseek_result:
-                        versions.append(deepseek_result)
-                    
-                    if versions:
-                        # Select the most comprehensive result
-                        result["content"] = max(versions, key=lambda x: len(x.get("content", "")))
-        
-        except Exception as e:
-            st.error(f"Processing error: {str(e)}")
+    
+    def _standard_prompt(self, topic: str, web_results: List[Dict[str, str]]) -> str:
+        with span("prompt.standard", stage="standard") as s:
+            # Use web search results to enhance prompts (Tavily + Serper results)
+            web_context = self.context_budget.web_context(web_results) if web_results else ""
+            
+            enhanced_prompt = f"Create a comprehensive, well-structured research document about: {topic}"
+            if web_context:
+                enhanced_prompt += f"\n\nRelevant information from web search (Tavily & Serper):\n{web_context}"
+            s.set(chars=len(enhanced_prompt))
+            return enhanced_prompt
+    
+    def _new_result(self, topic: str, use_agents: bool, fused: bool = False) -> Dict[str, Any]:
+        agentic = use_agents and self.agents_initialized
+        return {
+            "content": None,
+            "references": {"web": [], "videos": []},
+            "analysis": None,
+            "metadata": {
+                "id": uuid.uuid4().hex[:12],
+                "timestamp": datetime.now().isoformat(),
+                "topic": topic,
+                "method": "agentic" if agentic else "standard",
+                "agent_mode": ("fused" if fused else "chain") if agentic else None
+            }
+        }
+    
+    def _flight_key(self, topic: str, use_agents: bool, use_cache: bool, fused: bool) -> tuple:
+        """Queries with this key produce the same result, so concurrent ones
+        can share a run. The system's id keeps reconfigured systems apart."""
+        agentic = bool(use_agents and self.agents_initialized)
+        return (id(self), normalize_query(topic), agentic, agentic and fused, use_cache)
+    
+    @staticmethod
+    def _joined(result: Dict[str, Any], shared: bool) -> Dict[str, Any]:
+        """Flag a result that was shared from another caller's run"""
+        if shared:
+            result["metadata"]["coalesced"] = True
+        return result
+    
+    async def process_query_async(self, topic: str, use_agents: bool = True, on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True, fused: bool = False) -> Dict[str, Any]:
+        """Async counterpart of process_query_agentic, returning the same result dict.
+
+        All provider I/O runs on the event loop, so many queries can be
+        awaited concurrently from one thread, e.g. with asyncio.gather.
+        Works from Streamlit (via run_query_async) and headless; headless
+        callers should await aclose() when done.
+        """
+        result, shared = await self.pipeline_flight.do_async(
+            self._flight_key(topic, use_agents, use_cache, fused),
+            self._process_query_async, topic, use_agents, on_delta, use_cache, fused
+        )
+        return self._joined(result, shared)
+    
+    async def _process_query_async(self, topic: str, use_agents: bool, on_delta: Optional[Callable[[str, str], None]], use_cache: bool, fused: bool) -> Dict[str, Any]:
+        result = self._new_result(topic, use_agents, fused)
+        metadata = result["metadata"]
+        with trace("query", topic=topic, engine="async", method=metadata["method"], agent_mode=metadata["agent_mode"]) as query_trace:
+            result["metadata"]["engine"] = "async"
+            group = self.executor.group()
+            video_task = None
+            
+            try:
+                # Step 1: Search for videos in the background - nothing in generation depends on it
+                video_task = asyncio.create_task(group.run_async("youtube", self.video_search_tool.search_async, topic, 5))
+                
+                # Step 2: Search for web resources (Tavily + Serper concurrently)
+                with progress("🔍 Searching web resources with Tavily & Serper..."):
+                    result["references"]["web"] = await group.run_async("web_search", self.web_search_tool.search_async, topic, 10, group)
+                    result["metadata"]["tavily_used"] = self.tavily_available
+                    result["metadata"]["serper_used"] = self.serper_available
+                
+                # Step 3: Generate content using agents or standard approach
+                if use_agents and self.agents_initialized and fused:
+                    with progress("🤖 Research, Content & Analysis Agents in one fused call..."):
+                        outputs, usage = await group.run_async("fused_agent", self._generate_fused_async, topic, result["references"]["web"], on_delta, use_cache)
+                        result["content"] = outputs["content_agent"] or outputs["research_agent"]
+                        result["analysis"] = outputs["analysis_agent"]
+                        result["metadata"]["usage"] = usage
+                elif use_agents and self.agents_initialized:
+                    with progress("🤖 Research Agent analyzing, then Content & Analysis Agents in parallel..."):
+                        graph = self._agent_graph(topic, result["references"]["web"], self._generate_with_agent_async, on_delta, use_cache)
+                        outputs = await graph.run_async(group)
+                        result["content"] = self._chain_content(outputs, result["references"]["web"], result["metadata"])
+                        result["analysis"] = outputs["analysis_agent"]
+                        result["metadata"]["pipeline"] = graph.report()
+                        result["metadata"]["usage"] = self._total_usage(*outputs.values())
+                else:
+                    with progress("🤖 Generating content with multiple AI providers..."):
+                        winner, ensemble = await self._generate_ensemble_async(
+                            self._standard_prompt(topic, result["references"]["web"]), group, on_delta=on_delta, use_cache=use_cache
+                        )
+                        result["content"] = winner
+                        result["metadata"]["ensemble"] = ensemble
+                
+                # Step 4: Collect the video search that overlapped with generation
+                with progress("🎥 Collecting video resources..."):
+                    result["references"]["videos"] = await video_task
+            
+            except Exception as e:
+                if video_task is not None:
+                    video_task.cancel()
+                result["metadata"]["error"] = str(e)
+                report("error", f"Processing error: {str(e)}")
+            
+            result["metadata"]["timings"] = group.summary()
+        metadata["trace"] = query_trace.record
+        self.metrics.record_query(result, query_trace.record["duration"])
+        return result
+    
+    def run_query_async(self, topic: str, use_agents: bool = True, on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True, fused: bool = False) -> Dict[str, Any]:
+        """Drive process_query_async from synchronous code such as a Streamlit
+        script run. on_delta is called on the calling thread."""
+        async def run():
+            try:
+                return await self.process_query_async(topic, use_agents=use_agents, on_delta=on_delta, use_cache=use_cache, fused=fused)
+            finally:
+                await self.aclose()
         
+        return asyncio.run(run())
+    
+    def process_query_agentic(self, topic: str, use_agents: bool = True, on_delta: Optional[Callable[[str, str], None]] = None, use_cache: bool = True, fused: bool = False) -> Dict[str, Any]:
+        """Process query using agentic approach.
+
+        on_delta, if given, receives (stage or provider name, text delta) as
+        tokens stream in, so the UI can render generation incrementally.
+        use_cache=False bypasses completion cache lookups for this query.
+        fused=True asks a single call for all three agent outputs instead of
+        running the agent chain.
+
+        A call identical to one already running (same normalized topic and
+        mode) waits for that run and gets a copy of its result, flagged with
+        metadata["coalesced"]; only the first caller sees streamed tokens.
+        """
+        result, shared = self.pipeline_flight.do(
+            self._flight_key(topic, use_agents, use_cache, fused),
+            self._process_query_agentic, topic, use_agents, on_delta, use_cache, fused
+        )
+        return self._joined(result, shared)
+    
+    def _process_query_agentic(self, topic: str, use_agents: bool, on_delta: Optional[Callable[[str, str], None]], use_cache: bool, fused: bool) -> Dict[str, Any]:
+        result = self._new_result(topic, use_agents, fused)
+        metadata = result["metadata"]
+        with trace("query", topic=topic, engine="sync", method=metadata["method"], agent_mode=metadata["agent_mode"]) as query_trace:
+            group = self.executor.group()
+            video_future = None
+            
+            try:
+                # Step 1: Search for videos in the background - nothing in generation depends on it
+                video_future = group.submit("youtube", self.video_search_tool.search, topic, max_results=5)
+                
+                # Step 2: Search for web resources (Tavily + Serper fan out in parallel)
+                with progress("🔍 Searching web resources with Tavily & Serper..."):
+                    web_results = group.run("web_search", self.web_search_tool.search, topic, 10, group)
+                    result["references"]["web"] = web_results
+                    # Track which search engines were used
+                    result["metadata"]["tavily_used"] = self.tavily_available
+                    result["metadata"]["serper_used"] = self.serper_available
+                
+                # Step 3: Generate content using agents or standard approach
+                if use_agents and self.agents_initialized and fused:
+                    # Fused approach: one call writes research, content and analysis sections
+                    with progress("🤖 Research, Content & Analysis Agents in one fused call..."):
+                        outputs, usage = group.run("fused_agent", self._generate_fused, topic, result["references"]["web"], on_delta, use_cache)
+                        result["content"] = outputs["content_agent"] or outputs["research_agent"]
+                        result["analysis"] = outputs["analysis_agent"]
+                        result["metadata"]["usage"] = usage
+                elif use_agents and self.agents_initialized:
+                    # Agentic approach: research first, then content polishing and
+                    # analysis over the research at the same time
+                    with progress("🤖 Research Agent analyzing, then Content & Analysis Agents in parallel..."):
+                        graph = self._agent_graph(topic, result["references"]["web"], self._generate_with_agent, on_delta, use_cache)
+                        outputs = graph.run(group)
+                        result["content"] = self._chain_content(outputs, result["references"]["web"], result["metadata"])
+                        result["analysis"] = outputs["analysis_agent"]
+                        result["metadata"]["pipeline"] = graph.report()
+                        result["metadata"]["usage"] = self._total_usage(*outputs.values())
+                else:
+                    # Standard approach - use all available AI providers with web context
+                    with progress("🤖 Generating content with multiple AI providers..."):
+                        enhanced_prompt = self._standard_prompt(topic, result["references"]["web"])
+                        
+                        # Run OpenAI, Anthropic and DeepSeek at once under a shared deadline
+                        winner, ensemble = self._generate_ensemble(enhanced_prompt, group, on_delta=on_delta, use_cache=use_cache)
+                        result["content"] = winner
+                        result["metadata"]["ensemble"] = ensemble
+                
+                # Step 4: Collect the video search that overlapped with generation
+                with progress("🎥 Collecting video resources..."):
+                    result["references"]["videos"] = video_future.result()
+            
+            except Exception as e:
+                result["metadata"]["error"] = str(e)
+                report("error", f"Processing error: {str(e)}")
+            
+            result["metadata"]["timings"] = group.summary()
+        metadata["trace"] = query_trace.record
+        self.metrics.record_query(result, query_trace.record["duration"])
         return result
 
 
+def get_agentic_system(acquire: bool = False) -> SageLensAgenticSystem:
+    """Shared SageLensAgenticSystem for every session and rerun.
+    Clients, agents and HTTP pools are built once and rebuilt only when
+    keys or engine settings change. With acquire=True the system stays open
+    until get_registry().release(system), even if it is rebuilt meanwhile."""
+    config = SageLensAgenticSystem.resolve_config()
+    # This one system serves every job worker: a pool narrower than their
+    # combined fan-out would leave jobs waiting on each other's tasks
+    config["max_workers"] = max(config["max_workers"], job_workers() * QUERY_FAN_OUT)
+    return get_registry().get("agentic", config, lambda cfg: SageLensAgenticSystem(config=cfg), acquire=acquire)
+
+
+# Seconds between polls of a running background job
+JOB_POLL_INTERVAL = 0.5
+
+
+def describe_cache_status(generation: Dict[str, Any]) -> str:
+    """Short label saying whether a generation came from the completion cache"""
+    if generation.get("coalesced"):
+        return "🪢 Shared call"
+    if not generation.get("cached"):
+        return "Fresh"
+    age_minutes = generation.get("cache_age", 0) / 60
+    return f"♻️ {generation['cache_tier'].title()} hit ({age_minutes:.0f}m old)"
+
+
+def streamed_texts(texts: Dict[str, str], sticky: bool = False) -> Tuple[Optional[str], Optional[str]]:
+    """Pick the streams to show from a job's text per stage or provider.
+
+    Returns (label, text) of the content stream: the newest stage of the
+    agent chain, or, when sticky, the first provider to emit a token. The
+    analysis agent's text is returned separately.
+    """
+    labels = [label for label in texts if label != "analysis_agent"]
+    label = (labels[0] if sticky else labels[-1]) if labels else None
+    return label, texts.get("analysis_agent")
+
+
+def job_messages(snapshot: Dict[str, Any]):
+    """Warnings and errors the job's pipeline reported so far"""
+    for message in snapshot["messages"]:
+        getattr(st, message["level"])(message["message"])
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def job_monitor(job_id: str, stream_tokens: bool, sticky: bool):
+    """Poll a running job: stages finished so far, the current one and,
+    when streaming, the text generated so far. Hands over to a full rerun
+    once the job is finished so the page can collect its result."""
+    job = get_job_queue().get(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    snapshot = job.snapshot()
+    
+    st.markdown("---")
+    for stage in snapshot["stages"][:-1]:
+        st.caption(f"✅ {stage['stage']} ({stage['end'] - stage['start']:.1f}s)")
+    job_messages(snapshot)
+    elapsed = time.time() - snapshot["submitted_at"]
+    if snapshot["status"] == "queued":
+        st.info(f"⏳ Waiting for a free worker... ({elapsed:.0f}s)")
+    else:
+        st.info(f"🔬 {snapshot['stage'] or 'Processing your research query...'} ({elapsed:.0f}s)")
+    
+    if stream_tokens and snapshot["texts"]:
+        label, analysis = streamed_texts(snapshot["texts"], sticky)
+        live_content_tab, live_analysis_tab = st.tabs(["📝 Content", "📊 Analysis"])
+        with live_content_tab:
+            if label:
+                st.markdown(f"*Streaming from {label}...*\n\n{snapshot['texts'][label]} ▌")
+        with live_analysis_tab:
+            if analysis:
+                st.markdown(f"*Streaming from analysis_agent...*\n\n{analysis} ▌")
+
+
+def result_id(result: Dict[str, Any]) -> str:
+    """Stable id of a result for render caches; results from before ids
+    were assigned fall back to their timestamp"""
+    return result["metadata"].get("id") or result["metadata"]["timestamp"]
+
+
+def escape_markdown(text: str) -> str:
+    """Neutralize characters that would end a :color[...] span or start markup"""
+    return re.sub(r"([\\`*_\[\]<>#|])", r"\\\1", text)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def references_markdown(result_key: str, _result: Dict[str, Any]) -> List[str]:
+    """Markdown of each web reference of a result, built once per result"""
+    cited = cited_sources(_result["metadata"].get("brief"))
+    items = []
+    for i, item in enumerate(_result["references"]["web"], 1):
+        lines = [f"**{i}. [{item['title']}]({item['url']})**" + (" 📌" if i in cited else "")]
+        if item.get("snippet"):
+            lines.append(f":gray[{escape_markdown(item['snippet'][:250])}...]")
+        if item.get("sources"):
+            lines.append(f":gray[Found by {' & '.join(source.title() for source in item['sources'])}]")
+        items.append("  \n".join(lines))
+    return items
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def videos_markdown(result_key: str, _videos: List[Dict[str, Any]]) -> List[str]:
+    """Markdown of each ranked video of a result, built once per result"""
+    items = []
+    for idx, vid in enumerate(_videos, 1):
+        # Video title with ranking badge
+        badge = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"#{idx}"
+        items.append(f"{badge} **[{vid['title']}]({vid['url']})**  \n:gray[👁️ {vid.get('views', 'N/A')} views]")
+    return items
+
+
+def render_content_tab(result: Dict[str, Any]):
+    """Generated documentation with provider and timing details"""
+    st.markdown("### Generated Documentation")
+    st.markdown(result["content"]["content"], unsafe_allow_html=True)
+
+    # Content metadata
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Provider", result["content"]["provider"])
+    with col2:
+        st.metric("Processing Time", f"{result['content']['latency']:.2f}s")
+        if result["content"].get("cached"):
+            st.caption(f"♻️ Served from cache (originally {result['content']['original_latency']:.2f}s)")
+        elif result["content"].get("rate_limit_wait"):
+            st.caption(f"🚦 Queued {result['content']['rate_limit_wait']:.1f}s for provider quota")
+    with col3:
+        word_count = len(result["content"]["content"].split())
+        st.metric("Word Count", f"{word_count:,}")
+    if result["content"].get("ttft") is not None:
+        col1, col2, _ = st.columns(3)
+        col1.metric("Time to First Token", f"{result['content']['ttft']:.2f}s")
+        col2.metric("Tokens/sec", f"{result['content']['tokens_per_sec']:.1f}")
+
+
+def render_references_tab(result: Dict[str, Any]):
+    """Merged web results, marking those the research brief cites"""
+    st.markdown("### 🔗 Curated Web Resources")
+    st.caption("Powered by Tavily AI Search & Google Serper")
+
+    # Show search sources status
+    search_sources = []
+    if result.get("metadata", {}).get("tavily_used"):
+        search_sources.append("🔍 Tavily")
+    if result.get("metadata", {}).get("serper_used"):
+        search_sources.append("🌐 Serper")
+    if search_sources:
+        st.success(f"✅ Active search sources: {', '.join(search_sources)}")
+    else:
+        st.warning("⚠️ No search sources active. Add Tavily or Serper API keys.")
+
+    # Web references
+    if result["references"]["web"]:
+        st.markdown(f"#### Found {len(result['references']['web'])} web resources")
+        cited = cited_sources(result["metadata"].get("brief"))
+        if cited:
+            st.caption(f"📌 {len(cited)} resources cited in the research brief - numbers match the [n] references in the content")
+        for text, item in zip(references_markdown(result_id(result), result), result["references"]["web"]):
+            col1, col2 = st.columns([4, 1])
+            col1.markdown(text)
+            col2.link_button("🔗 Open", item["url"])
+    else:
+        st.warning("⚠️ No web resources found. Check Tavily and Serper API keys.")
+
+
+def render_videos_tab(result: Dict[str, Any]):
+    """YouTube results ranked by views"""
+    st.markdown("### 🎬 Top Hit Videos")
+    st.caption("Most viewed YouTube videos related to your research topic")
+
+    if result["references"]["videos"]:
+        # Sort by views and show top videos
+        sorted_videos = sorted(
+            result["references"]["videos"],
+            key=lambda x: x.get('views_num', 0),
+            reverse=True
+        )
+    
+        st.markdown(f"#### 🏆 Top {len(sorted_videos)} Videos")
+    
+        for text, vid in zip(videos_markdown(result_id(result), sorted_videos), sorted_videos):
+            col1, col2 = st.columns([3, 1])
+            col1.markdown(text)
+            col2.link_button("▶️ Watch", vid["url"], use_container_width=True)
+    
+        # Summary stats
+        total_views = sum(v.get('views_num', 0) for v in sorted_videos)
+        avg_views = total_views / len(sorted_videos) if sorted_videos else 0
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Total Videos", len(sorted_videos))
+        with col2:
+            st.metric("Avg Views", f"{avg_views/1000000:.1f}M" if avg_views > 1000000 else f"{avg_views/1000:.1f}K")
+    else:
+        st.warning("⚠️ No videos found. YouTube search may be unavailable.")
+
+
+def render_analysis_tab(result: Dict[str, Any]):
+    """Analysis agent output"""
+    st.markdown("### 📊 Deep Analysis & Insights")
+    if result.get("analysis") and isinstance(result["analysis"], dict):
+        st.markdown(result["analysis"]["content"], unsafe_allow_html=True)
+        st.caption(f"Analysis by: {result['analysis']['provider']}")
+    else:
+        st.info("Analysis not available. Enable Agentic AI mode for advanced analysis.")
+
+
+def render_workflow_tab(result: Dict[str, Any]):
+    """Static explanation of the research workflow"""
+    st.markdown("### ⚙️ Complete Workflow Explanation")
+    st.markdown("""
+    #### 🔄 Multi-Agent Orchestration Process
+
+    **Phase 1: Information Gathering**
+    • **Orchestrator Agent** receives your research query
+    • **Web Crawler Agents** simultaneously search:
+      - Tavily AI Search (semantic web search)
+      - Serper Google Search (comprehensive results)
+      - YouTube Search (video content discovery)
+    • All agents crawl and collect information in parallel
+
+    **Phase 2: Content Generation**
+    • **Research Agent** analyzes gathered information
+    • Synthesizes findings from multiple sources
+    • Creates comprehensive research document
+    • **Content Agent** refines and polishes content
+    • Ensures publication-ready quality
+
+    **Phase 3: Analysis & Refinement**
+    • **Analysis Agent** works from the research document, in parallel with the Content Agent
+    • Provides deep insights
+    • Identifies key patterns and trends
+    • Highlights critical considerations
+    • Suggests applications and implications
+
+    **Phase 4: Multi-Provider Intelligence**
+    • **OpenAI GPT-4 Turbo** generates content
+    • **Anthropic Claude 3.5 Sonnet** provides alternative perspective
+    • **DeepSeek** adds additional insights
+    • Best result automatically selected
+
+    **Phase 5: Curation & Presentation**
+    • Web resources deduplicated and ranked
+    • Top videos sorted by popularity
+    • All sources verified and linked
+    • Comprehensive metrics provided
+
+    #### 🎯 Agent Specializations
+
+    **Research Agent**
+    - Conducts deep research on topics
+    - Synthesizes information from multiple sources
+    - Generates well-structured documentation
+    - Cites sources appropriately
+
+    **Content Agent**
+    - Transforms research into polished content
+    - Ensures clarity and readability
+    - Maintains accuracy while improving presentation
+    - Creates publication-ready output
+
+    **Analysis Agent**
+    - Analyzes research for key insights
+    - Identifies patterns and trends
+    - Provides critical evaluation
+    - Suggests implications and applications
+
+    #### 🔍 Search Integration
+
+    **Tavily AI Search**
+    - Semantic understanding of queries
+    - AI-powered result ranking
+    - Context-aware search results
+
+    **Serper Google Search**
+    - Comprehensive web coverage
+    - Knowledge graph integration
+    - Real-time search results
+
+    **YouTube Search**
+    - Video content discovery
+    - View count analysis
+    - Popularity-based ranking
+
+    #### 📊 Output Generation
+
+    The system produces:
+    • Comprehensive research documents
+    • Curated web references with snippets
+    • Top-ranked video recommendations
+    • Deep analysis and insights
+    • Performance metrics and statistics
+    • Version history for comparison
+
+    #### ⚡ Performance Features
+
+    • **Parallel Processing**: All agents work simultaneously
+    • **Intelligent Caching**: Reduces redundant API calls
+    • **Error Resilience**: Graceful fallbacks if services fail
+    • **Multi-Provider**: Uses best available AI models
+    • **Real-time Updates**: Live progress indicators
+    """)
+
+
+# Waterfall bar colour per span kind (the part of the name before the dot)
+SPAN_COLORS = {
+    "query": "#667eea",
+    "search": "#2ecc71",
+    "prompt": "#95a5a6",
+    "agent": "#9b59b6",
+    "llm": "#e67e22",
+    "ensemble": "#3498db"
+}
+
+
+def trace_waterfall(record: Dict[str, Any]):
+    """Waterfall chart of a trace: one bar per span, nested spans indented
+    under their parent, failed or cut-off spans in red"""
+    import plotly.graph_objects as go
+    
+    spans = record["spans"]
+    depth: Dict[Optional[str], int] = {None: -1}
+    for s in spans:
+        # Sorted by start, so a parent is always seen before its children
+        depth[s["id"]] = depth.get(s["parent_id"], -1) + 1
+    hover = [
+        f"<b>{s['name']}</b> {s['duration']:.2f}s ({s['status']})<br>"
+        + "<br>".join(f"{key}: {value}" for key, value in s["attributes"].items())
+        for s in spans
+    ]
+    fig = go.Figure(go.Bar(
+        y=list(range(len(spans))),
+        x=[s["duration"] for s in spans],
+        base=[s["start"] for s in spans],
+        orientation="h",
+        marker_color=[
+            SPAN_COLORS.get(s["name"].split(".")[0], "#7f8c8d") if s["status"] == "ok" else "#e74c3c"
+            for s in spans
+        ],
+        hovertext=hover,
+        hoverinfo="text"
+    ))
+    fig.update_yaxes(
+        tickvals=list(range(len(spans))),
+        ticktext=["\u00a0" * 3 * depth[s["id"]] + s["name"] for s in spans],
+        autorange="reversed"
+    )
+    fig.update_layout(
+        height=120 + 22 * len(spans),
+        margin=dict(l=10, r=10, t=10, b=10),
+        xaxis_title="seconds since the query started",
+        showlegend=False
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_metrics_tab(result: Dict[str, Any]):
+    """Per-result metrics followed by process-wide engine statistics"""
+    st.markdown("### ⚙️ Generation Metrics")
+
+    metrics_col1, metrics_col2 = st.columns(2)
+
+    with metrics_col1:
+        method = result["metadata"]["method"].title()
+        if result["metadata"].get("agent_mode"):
+            method += f" ({result['metadata']['agent_mode']})"
+        st.metric("Method", method)
+        if result["metadata"].get("coalesced"):
+            st.caption("🪢 Shared an identical query already in progress")
+        st.metric("Timestamp", result["metadata"]["timestamp"][:19])
+        st.metric("Web Resources", len(result["references"]["web"]))
+        st.metric("Video Resources", len(result["references"]["videos"]))
+        usage = result["metadata"].get("usage")
+        if usage:
+            st.metric("Agent Tokens", f"{usage['input_tokens'] + usage['output_tokens']:,}")
+            st.caption(f"{usage['input_tokens']:,} in / {usage['output_tokens']:,} out")
+
+    with metrics_col2:
+        if result["content"]:
+            st.metric("Content Provider", result["content"]["provider"])
+            st.metric("Latency", f"{result['content']['latency']:.2f}s")
+            if result["content"].get("ttft") is not None:
+                st.metric("Time to First Token", f"{result['content']['ttft']:.2f}s")
+                st.metric("Tokens/sec", f"{result['content']['tokens_per_sec']:.1f}")
+            st.metric("Content Cache", describe_cache_status(result["content"]))
+            if result.get("analysis"):
+                st.metric("Analysis Provider", result["analysis"]["provider"])
+                st.metric("Analysis Latency", f"{result['analysis']['latency']:.2f}s")
+                st.metric("Analysis Cache", describe_cache_status(result["analysis"]))
+
+    # Ensemble outcome for standard mode
+    ensemble = result["metadata"].get("ensemble")
+    if ensemble:
+        st.markdown("#### 🏁 Provider Ensemble")
+        st.caption(
+            f"Winner: **{ensemble['winner'] or 'none'}** after {ensemble['elapsed']:.2f}s "
+            f"(deadline {ensemble['deadline']:.0f}s, grace {ensemble['grace']:.0f}s)"
+        )
+        st.dataframe(
+            [
+                {
+                    "Provider": name,
+                    "Score": round(ensemble["scores"][name], 1) if name in ensemble["scores"] else None,
+                    "Latency (s)": round(ensemble["latencies"][name], 2) if name in ensemble["latencies"] else None,
+                    "Status": "winner" if name == ensemble["winner"] else (
+                        "straggler" if name in ensemble["stragglers"] else (
+                            "finished" if name in ensemble["scores"] else "failed"
+                        )
+                    )
+                }
+                for name in ensemble["providers"]
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # Agent chain DAG: how much overlapping stages saved
+    pipeline = result["metadata"].get("pipeline")
+    if pipeline:
+        st.markdown("#### 🧬 Agent Pipeline")
+        cols = st.columns(3)
+        cols[0].metric("Serial Time", f"{pipeline['serial_time']:.2f}s")
+        cols[1].metric("Critical Path", f"{pipeline['critical_time']:.2f}s")
+        cols[2].metric("Saved", f"{pipeline['saved']:.2f}s")
+        st.caption("Critical path: " + " → ".join(pipeline["critical_path"]))
+        st.dataframe(
+            [
+                {
+                    "Stage": name,
+                    "Inputs": ", ".join(stage["inputs"]) or "-",
+                    "Start (s)": round(stage["start"], 2) if stage["start"] is not None else None,
+                    "Duration (s)": round(stage["duration"], 2),
+                    "Status": stage["status"]
+                }
+                for name, stage in pipeline["stages"].items()
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # Per-task timing from the concurrent execution engine
+    timings = result["metadata"].get("timings")
+    if timings and timings.get("tasks"):
+        st.markdown("#### ⏱️ Task Timings")
+        engine_label = (
+            "asyncio event loop" if result["metadata"].get("engine") == "async"
+            else f"{timings['max_workers']} workers"
+        )
+        st.caption(
+            f"Wall time {timings['wall_time']:.2f}s with {engine_label} | "
+            f"Critical path: **{timings['critical_task']}**"
+        )
+        st.dataframe(
+            [
+                {
+                    "Task": t["task"],
+                    "Start (s)": round(t["start"], 2),
+                    "Duration (s)": round(t["duration"], 2),
+                    "Queued (s)": round(t["queued"], 2),
+                    "Status": t["status"]
+                }
+                for t in timings["tasks"]
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # Nested spans for every stage of this query
+    query_trace = result["metadata"].get("trace")
+    if query_trace:
+        st.markdown("#### 🌊 Trace")
+        trace_waterfall(query_trace)
+        exporter = get_tracer().stats()
+        st.caption(
+            f"Trace {query_trace['trace_id']}: {len(query_trace['spans'])} spans over {query_trace['duration']:.2f}s"
+            + (f" | {exporter['traces']} traces written to `{exporter['path']}`" if exporter["path"] else "")
+        )
+    render_seconds = st.session_state.get("render_seconds")
+    if render_seconds is not None:
+        st.caption(f"🖼️ Previous render of the results view took {render_seconds * 1000:.0f} ms")
+    
+    # Shared engine reuse (process-wide registry)
+    engine = get_registry().stats().get("agentic")
+    if engine:
+        st.caption(
+            f"🔁 Shared engine built in {engine['build_time']:.2f}s, reused {engine['hits']} times "
+            f"({engine['builds']} build{'s' if engine['builds'] != 1 else ''} since startup)"
+        )
+
+    # Connection pool statistics for the shared engine
+    engine_system = get_registry().peek("agentic")
+    if engine_system is not None and hasattr(engine_system, "transport"):
+        pool_stats = engine_system.transport.stats()
+        st.markdown("#### 🔌 Connection Pools")
+        st.caption(
+            f"{'HTTP/2' if pool_stats['http2'] else 'HTTP/1.1 keep-alive'} | "
+            f"max {pool_stats['max_connections']} connections, {pool_stats['per_host']} per host, "
+            f"{pool_stats['keepalive_seconds']:.0f}s keep-alive"
+        )
+        st.dataframe(
+            [
+                {
+                    "Pool": name,
+                    "Host": host,
+                    "Requests": counts["requests"],
+                    "New Connections": counts["new_connections"],
+                    "In Flight": counts["in_flight"],
+                    "Reuse Ratio": f"{1 - counts['new_connections'] / counts['requests']:.0%}" if counts["requests"] else "-"
+                }
+                for name, pool in pool_stats["pools"].items()
+                for host, counts in pool["hosts"].items()
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+        st.caption(" | ".join(
+            f"{name}: {pool['open_connections']} open, {pool['idle_connections']} idle"
+            for name, pool in pool_stats["pools"].items()
+        ))
+
+    # Rate limiter queues (process-wide, shared by every session)
+    limiter_stats = get_rate_limiter().stats()
+    if any(stats["requests"] for stats in limiter_stats.values()):
+        st.markdown("#### 🚦 Rate Limits")
+        st.dataframe(
+            [
+                {
+                    "Provider": provider,
+                    "RPM": int(stats["rpm"]) or "∞",
+                    "TPM": int(stats["tpm"]) or "∞",
+                    "Requests": stats["requests"],
+                    "Queued": stats["queued"],
+                    "Queue Depth": stats["queue_depth"],
+                    "Peak Depth": stats["max_queue_depth"],
+                    "Avg Wait (s)": round(stats["avg_wait"], 2),
+                    "Max Wait (s)": round(stats["max_wait"], 2),
+                    "Timeouts": stats["timeouts"],
+                    "Tokens (est/actual)": f"{stats['estimated_tokens']:,} / {stats['actual_tokens']:,}"
+                }
+                for provider, stats in sorted(limiter_stats.items())
+                if stats["requests"]
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # Provider and search errors (process-wide), e.g. Serper 403s the search tool skips silently
+    metrics = get_metrics()
+    error_rows = [
+        {"Provider": labels["provider"], "Kind": kind, "Error": labels.get("error") or labels.get("reason"), "Count": int(count)}
+        for kind, counter in (("LLM", metrics.provider_errors), ("Search", metrics.search_errors))
+        for _, labels, count in counter.samples()
+    ]
+    exporter = metrics.stats()
+    if error_rows or exporter["endpoint"] or exporter["file"]:
+        st.markdown("#### 🚨 Provider Errors")
+        if error_rows:
+            st.dataframe(sorted(error_rows, key=lambda row: -row["Count"]), use_container_width=True, hide_index=True)
+        else:
+            st.caption("No provider or search errors since the server started")
+        targets = [f"`{target}`" for target in (exporter["endpoint"], exporter["file"]) if target]
+        if targets:
+            st.caption(f"Prometheus metrics: {' and '.join(targets)}")
+        if exporter["error"]:
+            st.caption(f"⚠️ {exporter['error']}")
+
+    # Token budgets: prompt sizes, completion budgets and trimming
+    budget_stats = engine_system.context_budget.stats() if engine_system else None
+    if budget_stats and budget_stats["requests"]:
+        st.markdown("#### ✂️ Context Budget")
+        cols = st.columns(4)
+        cols[0].metric("Avg Prompt Tokens", f"{budget_stats['avg_prompt_tokens']:,.0f}")
+        cols[1].metric("Avg max_tokens", f"{budget_stats['avg_max_tokens']:,.0f}")
+        cols[2].metric("Documents Trimmed", budget_stats["documents_trimmed"])
+        cols[3].metric("Tokens Trimmed", f"{budget_stats['tokens_trimmed']:,}")
+        st.caption(
+            f"Input budget {budget_stats['input_budget']:,} tokens per call | "
+            f"{budget_stats['web_results_dropped']} web results over budget | "
+            f"counted with {budget_stats['tokenizer']}"
+        )
+
+    # Web result merging across Tavily and Serper
+    merge_stats = engine_system.web_search_tool.merge_stats.stats() if engine_system else None
+    if merge_stats and merge_stats["queries"]:
+        st.markdown("#### 🔀 Result Merging")
+        cols = st.columns(4)
+        cols[0].metric("Candidates", merge_stats["candidates"])
+        cols[1].metric("URL Duplicates", merge_stats["url_duplicates"])
+        cols[2].metric("Near Duplicates", merge_stats["near_duplicates"])
+        cols[3].metric("Kept", merge_stats["returned"])
+        st.caption(f"Across {merge_stats['queries']} searches, ranked by reciprocal-rank fusion")
+
+    # Completion cache counters (process-wide)
+    completion_stats = get_completion_cache().stats()
+    if any(completion_stats.values()):
+        st.markdown("#### ♻️ Completion Cache")
+        disk = get_completion_cache().cache.disk_usage()
+        cols = st.columns(4)
+        cols[0].metric("Memory Hits", completion_stats["memory_hits"])
+        cols[1].metric("Disk Hits", completion_stats["disk_hits"])
+        cols[2].metric("Misses", completion_stats["misses"])
+        cols[3].metric("Bypassed", completion_stats["bypassed"])
+        st.caption(f"Disk tier: {disk['entries']} entries, {disk['bytes'] / 1024:.0f} KB compressed")
+
+    # Search result cache counters (process-wide)
+    cache_stats = get_search_cache().stats()
+    if cache_stats:
+        st.markdown("#### 🗄️ Search Cache")
+        disk = get_search_cache().cache.disk_usage()
+        refresh = get_search_cache().refresher.stats()
+        st.caption(
+            f"Disk tier: {disk['entries']} entries, {disk['bytes'] / 1024:.0f} KB | "
+            f"Background refresh: {refresh['refreshed']} done, {refresh['pending']} pending, "
+            f"{refresh['failed']} failed, {refresh['dropped']} dropped"
+        )
+        st.dataframe(
+            [
+                {
+                    "Provider": provider,
+                    "Memory Hits": counters["memory_hits"],
+                    "Disk Hits": counters["disk_hits"],
+                    "Stale Hits": counters["stale_hits"],
+                    "Misses": counters["misses"],
+                    "Hit Rate": f"{(counters['memory_hits'] + counters['disk_hits'] + counters['stale_hits']) / max(1, counters['memory_hits'] + counters['disk_hits'] + counters['stale_hits'] + counters['misses']):.0%}",
+                    "Refreshes": counters["refreshes"],
+                    "Avg Stale Age (min)": round(counters["total_stale_age"] / counters["stale_hits"] / 60, 1) if counters["stale_hits"] else 0.0,
+                    "Max Stale Age (min)": round(counters["max_stale_age"] / 60, 1)
+                }
+                for provider, counters in sorted(cache_stats.items())
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # Single-flight coalescing of identical concurrent calls (process-wide)
+    flight_stats = single_flight_stats()
+    if any(stats["calls"] for stats in flight_stats.values()):
+        st.markdown("#### 🪢 Request Coalescing")
+        st.dataframe(
+            [
+                {
+                    "Level": level.title(),
+                    "Calls": stats["calls"],
+                    "Executed": stats["executions"],
+                    "Coalesced": stats["coalesced"],
+                    "In Flight": stats["in_flight"]
+                }
+                for level, stats in sorted(flight_stats.items())
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+        st.caption("Identical calls made while one is already running wait for it instead of repeating it")
+
+
+RESULT_TABS = {
+    "📝 Content": render_content_tab,
+    "🔗 References": render_references_tab,
+    "🎬 Top Videos": render_videos_tab,
+    "📊 Analysis": render_analysis_tab,
+    "⚙️ Workflow": render_workflow_tab,
+    "📈 Metrics": render_metrics_tab
+}
+
+# Tabs that report which one is open (and rerun on switch) arrived in a
+# recent Streamlit; older releases build every tab on each render
+LAZY_TABS = "on_change" in inspect.signature(st.tabs).parameters
+
+
+@st.fragment
+def results_view(result: Dict[str, Any]):
+    """The result tabs. Only the selected tab runs: switching tabs reruns
+    this fragment, not the whole page, and hidden tabs are not built
+    (on Streamlit releases without LAZY_TABS every tab is built)."""
+    st.markdown("---")
+    st.markdown("## 📄 Research Results")
+    
+    # Every rerun and tab switch lands here, so render timing goes to the
+    # metrics histogram rather than to an exported trace per rerun
+    metrics = get_metrics()
+    started = time.perf_counter()
+    if LAZY_TABS:
+        tabs = st.tabs(list(RESULT_TABS), key="result_tab", on_change="rerun")
+    else:
+        tabs = st.tabs(list(RESULT_TABS))
+    for (label, render), tab in zip(RESULT_TABS.items(), tabs):
+        if getattr(tab, "open", None) is False:
+            continue
+        tab_started = time.perf_counter()
+        with tab:
+            render(result)
+        metrics.record_render(label, time.perf_counter() - tab_started)
+    # The Metrics tab shows how long the previous render took
+    st.session_state.render_seconds = time.perf_counter() - started
+
+
+@st.fragment
+def version_history():
+    """Version list and diff view; its widgets rerun only this fragment"""
+    st.markdown("---")
+    st.markdown("## 🕰️ Version History")
+    
+    if len(st.session_state.history) > 1:
+        for i, rev in enumerate(reversed(st.session_state.history[-5:]), 1):
+            with st.expander(f"Version {len(st.session_state.history) - i + 1} - {rev['timestamp'][:19]}"):
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Provider", rev["provider"])
+                col2.metric("Time", f"{rev['latency']:.2f}s")
+                col3.metric("Method", rev["method"].title())
+            
+                if st.button(f"Load Version {len(st.session_state.history) - i + 1}", key=f"load_{i}"):
+                    # Full results are read back from disk only when asked for
+                    loaded = get_history_store().load(st.session_state.history_session, rev["id"])
+                    if loaded is not None:
+                        st.session_state.current_result = loaded
+                        st.rerun()
+                    st.session_state.history = get_history_store().entries(st.session_state.history_session)
+                    st.warning("This version was evicted from the history store")
+    
+        if st.checkbox("🔀 Compare versions", key="compare_versions"):
+            labels = {rev["id"]: f"Version {n} - {rev['timestamp'][:19]}" for n, rev in enumerate(st.session_state.history, 1)}
+            version_ids = list(labels)
+            col1, col2 = st.columns(2)
+            old_id = col1.selectbox("From", version_ids, index=len(version_ids) - 2, format_func=labels.get)
+            new_id = col2.selectbox("To", version_ids, index=len(version_ids) - 1, format_func=labels.get)
+            old = get_history_store().load(st.session_state.history_session, old_id)
+            new = get_history_store().load(st.session_state.history_session, new_id)
+            if old is None or new is None:
+                st.warning("One of these versions was evicted from the history store")
+            else:
+                diff = content_diff(old, new)
+                added = sum(1 for line in diff if line.startswith("+") and not line.startswith("+++"))
+                removed = sum(1 for line in diff if line.startswith("-") and not line.startswith("---"))
+                st.caption(f"Generated documentation: +{added} / -{removed} lines")
+                st.code("\n".join(diff) or "No differences", language="diff")
+    
+        history_stats = get_history_store().stats()
+        st.caption(
+            f"History store: {history_stats['versions']} versions across {history_stats['sessions']} sessions "
+            f"({history_stats['delta_versions']} stored as deltas), "
+            f"{history_stats['bytes'] / 1024:.0f} KB compressed ({history_stats['raw_bytes'] / 1024:.0f} KB raw)"
+        )
+    else:
+        st.info("No previous versions available")
+
+
 def main():
     """Main Streamlit application"""
     st.set_page_config(
@@ -580,6 +2394,9 @@ def main():
             'About': "Sage-Lens Enhanced: Advanced Agentic AI Research Engine"
         }
     )
+    load_env()
+    if not AGENTS_SDK_AVAILABLE:
+        st.warning("⚠️ OpenAI Agents SDK not installed. Install with: pip install openai-agents")
     
     # Enhanced custom styling
     st.markdown("""
@@ -638,13 +2455,19 @@ def main():
     
     st.markdown("---")
     
-    # Initialize session state
+    # Initialize session state; history holds version summaries, the full
+    # results live in the on-disk history store
     if 'history' not in st.session_state:
         st.session_state.history = []
+        st.session_state.history_session = uuid.uuid4().hex
     if 'current_result' not in st.session_state:
         st.session_state.current_result = None
     if 'query_count' not in st.session_state:
         st.session_state.query_count = 0
+    if 'job_id' not in st.session_state:
+        # A job id in the URL is a job this browser started before a reload
+        st.session_state.job_id = st.query_params.get("job")
+        st.session_state.collected_job = None
     
     # Sidebar configuration
     with st.sidebar:
@@ -672,12 +2495,41 @@ def main():
         if not AGENTS_SDK_AVAILABLE:
             st.info("💡 Install OpenAI Agents SDK: `pip install openai-agents`")
         
+        agent_mode = st.radio(
+            "🧩 Agent mode",
+            ["Three-agent chain", "Fused single call"],
+            disabled=not (use_agents and AGENTS_SDK_AVAILABLE),
+            help="The fused mode asks one model call for the research, content and analysis sections - faster and fewer tokens, usually less thorough"
+        )
+        fused = agent_mode == "Fused single call"
+        
+        use_cache = st.checkbox(
+            "♻️ Use completion cache",
+            value=True,
+            help="Reuse stored answers for identical prompts. Untick to force fresh generations."
+        )
+        
+        stream_tokens = st.checkbox(
+            "⚡ Stream tokens live",
+            value=True,
+            help="Render generated text as it arrives instead of waiting for the full response"
+        )
+        
+        use_async = st.checkbox(
+            "🔀 Async engine",
+            value=False,
+            help="Run searches and generation on asyncio with the async provider SDKs instead of worker threads"
+        )
+        
         st.markdown("---")
         
         if st.button("🗑️ Clear History", use_container_width=True):
+            get_history_store().clear(st.session_state.history_session)
             st.session_state.history = []
             st.session_state.current_result = None
             st.session_state.query_count = 0
+            st.session_state.job_id = None
+            st.query_params.pop("job", None)
             st.rerun()
     
     # Main input section
@@ -697,262 +2549,59 @@ def main():
         st.write("")
         generate_btn = st.button("🚀 Generate", use_container_width=True, type="primary")
     
-    # Process query
+    # Process query in the background; the page polls the job until it finishes
     if generate_btn and topic.strip():
-        with st.spinner("🔬 Processing your research query..."):
-            system = SageLensAgenticSystem()
-            result = system.process_query_agentic(topic, use_agents=use_agents)
-            
-            if result.get("content"):
-                st.session_state.current_result = result
-                st.session_state.history.append(result)
-                st.session_state.query_count += 1
-                st.rerun()
-            else:
-                st.error("❌ Failed to generate content. Please check your API keys and try again.")
+        # The job holds a lease on the system: if another session's new keys
+        # rebuild it meanwhile, the old one is closed only after the job ends
+        system = get_agentic_system(acquire=True)
+        run_query = system.run_query_async if use_async else system.process_query_agentic
+        
+        def run_job(job):
+            try:
+                return run_query(
+                    topic,
+                    use_agents=use_agents,
+                    on_delta=job.on_delta if stream_tokens else None,
+                    use_cache=use_cache,
+                    fused=fused
+                )
+            finally:
+                get_registry().release(system)
+        
+        st.session_state.job_id = get_job_queue().submit(topic, run_job)
+        st.query_params["job"] = st.session_state.job_id
+    
+    job = get_job_queue().get(st.session_state.job_id)
+    if job is not None and job.active:
+        job_monitor(job.id, stream_tokens, sticky=not (use_agents and AGENTS_SDK_AVAILABLE))
+    elif job is not None and st.session_state.collected_job != job.id:
+        st.session_state.collected_job = job.id
+        snapshot = job.snapshot()
+        result = snapshot["result"]
+        job_messages(snapshot)
+        if result and result.get("content"):
+            st.session_state.current_result = result
+            history_store = get_history_store()
+            history_store.add(st.session_state.history_session, result)
+            st.session_state.history = history_store.entries(st.session_state.history_session)
+            st.session_state.query_count += 1
+        elif snapshot["error"]:
+            st.error(f"❌ Research job failed: {snapshot['error']}")
+        elif result and result.get("metadata", {}).get("error"):
+            st.error(f"❌ Failed to generate content: {result['metadata']['error']}")
+        else:
+            st.error("❌ Failed to generate content. Please check your API keys and try again.")
     
     # Display results
     if st.session_state.current_result:
         result = st.session_state.current_result
         
         if result.get("content") and isinstance(result["content"], dict):
-            # Main content area
-            st.markdown("---")
-            st.markdown("## 📄 Research Results")
-            
-            # Create tabs for better organization - Added Top Videos tab
-            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📝 Content", "🔗 References", "🎬 Top Videos", "📊 Analysis", "⚙️ Workflow", "📈 Metrics"])
-            
-            with tab1:
-                st.markdown("### Generated Documentation")
-                st.markdown(result["content"]["content"], unsafe_allow_html=True)
-                
-                # Content metadata
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Provider", result["content"]["provider"])
-                with col2:
-                    st.metric("Processing Time", f"{result['content']['latency']:.2f}s")
-                with col3:
-                    word_count = len(result["content"]["content"].split())
-                    st.metric("Word Count", f"{word_count:,}")
-            
-            with tab2:
-                st.markdown("### 🔗 Curated Web Resources")
-                st.caption("Powered by Tavily AI Search & Google Serper")
-                
-                # Show search sources status
-                search_sources = []
-                if result.get("metadata", {}).get("tavily_used"):
-                    search_sources.append("🔍 Tavily")
-                if result.get("metadata", {}).get("serper_used"):
-                    search_sources.append("🌐 Serper")
-                if search_sources:
-                    st.success(f"✅ Active search sources: {', '.join(search_sources)}")
-                else:
-                    st.warning("⚠️ No search sources active. Add Tavily or Serper API keys.")
-                
-                # Web references
-                if result["references"]["web"]:
-                    st.markdown(f"#### Found {len(result['references']['web'])} web resources")
-                    for i, item in enumerate(result["references"]["web"], 1):
-                        with st.container():
-                            col1, col2 = st.columns([4, 1])
-                            with col1:
-                                st.markdown(f"**{i}. [{item['title']}]({item['url']})**")
-                                if item.get('snippet'):
-                                    st.caption(item['snippet'][:250] + "...")
-                            with col2:
-                                st.link_button("🔗 Open", item['url'])
-                            st.markdown("---")
-                else:
-                    st.warning("⚠️ No web resources found. Check Tavily and Serper API keys.")
-            
-            with tab3:
-                st.markdown("### 🎬 Top Hit Videos")
-                st.caption("Most viewed YouTube videos related to your research topic")
-                
-                if result["references"]["videos"]:
-                    # Sort by views and show top videos
-                    sorted_videos = sorted(
-                        result["references"]["videos"],
-                        key=lambda x: x.get('views_num', 0),
-                        reverse=True
-                    )
-                    
-                    st.markdown(f"#### 🏆 Top {len(sorted_videos)} Videos")
-                    
-                    for idx, vid in enumerate(sorted_videos, 1):
-                        with st.container():
-                            col1, col2 = st.columns([3, 1])
-                            with col1:
-                                # Video title with ranking badge
-                                badge = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"#{idx}"
-                                st.markdown(f"{badge} **[{vid['title']}]({vid['url']})**")
-                                st.caption(f"👁️ {vid.get('views', 'N/A')} views")
-                            with col2:
-                                st.link_button("▶️ Watch", vid['url'], use_container_width=True)
-                            
-                            # Video embed preview (optional - can be enabled)
-                            # video_id = vid['url'].split('v=')[-1].split('&')[0]
-                            # st.video(f"https://www.youtube.com/watch?v={video_id}")
-                            
-                            st.markdown("---")
-                    
-                    # Summary stats
-                    total_views = sum(v.get('views_num', 0) for v in sorted_videos)
-                    avg_views = total_views / len(sorted_videos) if sorted_videos else 0
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("Total Videos", len(sorted_videos))
-                    with col2:
-                        st.metric("Avg Views", f"{avg_views/1000000:.1f}M" if avg_views > 1000000 else f"{avg_views/1000:.1f}K")
-                else:
-                    st.warning("⚠️ No videos found. YouTube search may be unavailable.")
-            
-            with tab4:
-                st.markdown("### 📊 Deep Analysis & Insights")
-                if result.get("analysis") and isinstance(result["analysis"], dict):
-                    st.markdown(result["analysis"]["content"], unsafe_allow_html=True)
-                    st.caption(f"Analysis by: {result['analysis']['provider']}")
-                else:
-                    st.info("Analysis not available. Enable Agentic AI mode for advanced analysis.")
-            
-            with tab5:
-                st.markdown("### ⚙️ Complete Workflow Explanation")
-                st.markdown("""
-                #### 🔄 Multi-Agent Orchestration Process
-                
-                **Phase 1: Information Gathering**
-                • **Orchestrator Agent** receives your research query
-                • **Web Crawler Agents** simultaneously search:
-                  - Tavily AI Search (semantic web search)
-                  - Serper Google Search (comprehensive results)
-                  - YouTube Search (video content discovery)
-                • All agents crawl and collect information in parallel
-                
-                **Phase 2: Content Generation**
-                • **Research Agent** analyzes gathered information
-                • Synthesizes findings from multiple sources
-                • Creates comprehensive research document
-                • **Content Agent** refines and polishes content
-                • Ensures publication-ready quality
-                
-                **Phase 3: Analysis & Refinement**
-                • **Analysis Agent** provides deep insights
-                • Identifies key patterns and trends
-                • Highlights critical considerations
-                • Suggests applications and implications
-                
-                **Phase 4: Multi-Provider Intelligence**
-                • **OpenAI GPT-4 Turbo** generates content
-                • **Anthropic Claude 3.5 Sonnet** provides alternative perspective
-                • **DeepSeek** adds additional insights
-                • Best result automatically selected
-                
-                **Phase 5: Curation & Presentation**
-                • Web resources deduplicated and ranked
-                • Top videos sorted by popularity
-                • All sources verified and linked
-                • Comprehensive metrics provided
-                
-                #### 🎯 Agent Specializations
-                
-                **Research Agent**
-                - Conducts deep research on topics
-                - Synthesizes information from multiple sources
-                - Generates well-structured documentation
-                - Cites sources appropriately
-                
-                **Content Agent**
-                - Transforms research into polished content
-                - Ensures clarity and readability
-                - Maintains accuracy while improving presentation
-                - Creates publication-ready output
-                
-                **Analysis Agent**
-                - Analyzes research for key insights
-                - Identifies patterns and trends
-                - Provides critical evaluation
-                - Suggests implications and applications
-                
-                #### 🔍 Search Integration
-                
-                **Tavily AI Search**
-                - Semantic understanding of queries
-                - AI-powered result ranking
-                - Context-aware search results
-                
-                **Serper Google Search**
-                - Comprehensive web coverage
-                - Knowledge graph integration
-                - Real-time search results
-                
-                **YouTube Search**
-                - Video content discovery
-                - View count analysis
-                - Popularity-based ranking
-                
-                #### 📊 Output Generation
-                
-                The system produces:
-                • Comprehensive research documents
-                • Curated web references with snippets
-                • Top-ranked video recommendations
-                • Deep analysis and insights
-                • Performance metrics and statistics
-                • Version history for comparison
-                
-                #### ⚡ Performance Features
-                
-                • **Parallel Processing**: All agents work simultaneously
-                • **Intelligent Caching**: Reduces redundant API calls
-                • **Error Resilience**: Graceful fallbacks if services fail
-                • **Multi-Provider**: Uses best available AI models
-                • **Real-time Updates**: Live progress indicators
-                """)
-            
-            with tab6:
-                st.markdown("### ⚙️ Generation Metrics")
-                
-                metrics_col1, metrics_col2 = st.columns(2)
-                
-                with metrics_col1:
-                    st.metric("Method", result["metadata"]["method"].title())
-                    st.metric("Timestamp", result["metadata"]["timestamp"][:19])
-                    st.metric("Web Resources", len(result["references"]["web"]))
-                    st.metric("Video Resources", len(result["references"]["videos"]))
-                
-                with metrics_col2:
-                    if result["content"]:
-                        st.metric("Content Provider", result["content"]["provider"])
-                        st.metric("Latency", f"{result['content']['latency']:.2f}s")
-                        if result.get("analysis"):
-                            st.metric("Analysis Provider", result["analysis"]["provider"])
-                            st.metric("Analysis Latency", f"{result['analysis']['latency']:.2f}s")
-            
-            # Version history section
-            st.markdown("---")
-            st.markdown("## 🕰️ Version History")
-            
-            if len(st.session_state.history) > 1:
-                for i, rev in enumerate(reversed(st.session_state.history[-5:]), 1):
-                    if rev.get("content") and isinstance(rev["content"], dict):
-                        with st.expander(f"Version {len(st.session_state.history) - i + 1} - {rev['metadata']['timestamp'][:19]}"):
-                            col1, col2, col3 = st.columns(3)
-                            col1.metric("Provider", rev["content"]["provider"])
-                            col2.metric("Time", f"{rev['content']['latency']:.2f}s")
-                            col3.metric("Method", rev["metadata"]["method"].title())
-                            
-                            if st.button(f"Load Version {len(st.session_state.history) - i + 1}", key=f"load_{i}"):
-                                st.session_state.current_result = rev
-                                st.rerun()
-            else:
-                st.info("No previous versions available")
+            results_view(result)
+            version_history()
         else:
             st.error("❌ Failed to generate content. Please check your API keys and try again.")
 
-
 if __name__ == "__main__":
     main()
 
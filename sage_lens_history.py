@@ -0,0 +1,254 @@
+"""
+Sage-Lens History: compressed on-disk store for past research results
+
+Session state keeps only a short summary per version; the full result
+(content, analysis, references, metadata) is zlib-compressed into SQLite
+and read back when a version is loaded. Each session keeps its newest
+`max_per_session` versions and the whole store stays under `max_bytes`,
+evicting the oldest versions first.
+
+Regenerating a topic mostly repeats the previous version, so a version
+is stored as a delta against the session's previous version of the same
+topic. Every `keyframe_every`-th version of a topic is stored in full,
+which bounds reconstruction to that many delta applications.
+"""
+
+import os
+import json
+import zlib
+import time
+import sqlite3
+import difflib
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from sage_lens_cache import cache_dir, normalize_query
+
+KEYFRAME_EVERY = 10
+
+# A delta is a list of ops: [start, end] copies that range of base units,
+# a string is inserted text
+Delta = List[Union[List[int], str]]
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The lightweight fields the version list shows"""
+    content = result.get("content") or {}
+    return {
+        "timestamp": result["metadata"]["timestamp"],
+        "topic": result["metadata"].get("topic", ""),
+        "method": result["metadata"]["method"],
+        "provider": content.get("provider"),
+        "latency": content.get("latency", 0.0)
+    }
+
+
+def _serialize(result: Dict[str, Any]) -> str:
+    return json.dumps(result, indent=1)
+
+
+def _units(text: str) -> List[str]:
+    """Split serialized JSON into diffable units: structural lines, and the
+    lines inside long strings (cut after each escaped newline).
+    "".join(_units(text)) == text whatever the content, and splitting a
+    run of whole units gives back the same units."""
+    units: List[str] = []
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        parts = line.split("\\n")
+        units += [part + "\\n" for part in parts[:-1]]
+        tail = parts[-1] + ("\n" if i < len(lines) - 1 else "")
+        if tail:
+            units.append(tail)
+    return units
+
+
+def make_delta(base: str, target: str) -> Delta:
+    """Ops rebuilding target from base"""
+    a, b = _units(base), _units(target)
+    ops: Delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(base: List[str], ops: Delta) -> List[str]:
+    """Units of the target, from the units of the base"""
+    units: List[str] = []
+    for op in ops:
+        if isinstance(op, list):
+            units += base[op[0]:op[1]]
+        else:
+            units += _units(op)
+    return units
+
+
+def content_diff(old: Dict[str, Any], new: Dict[str, Any], context: int = 2) -> List[str]:
+    """Unified diff of the generated documentation of two results"""
+    old_text = ((old.get("content") or {}).get("content") or "").splitlines()
+    new_text = ((new.get("content") or {}).get("content") or "").splitlines()
+    return list(difflib.unified_diff(
+        old_text, new_text,
+        fromfile=old["metadata"]["timestamp"][:19], tofile=new["metadata"]["timestamp"][:19],
+        n=context, lineterm=""
+    ))
+
+
+class HistoryStore:
+    """Per-session version history backed by one SQLite table shared by
+    every session. keyframe_every=1 stores every version in full."""
+
+    def __init__(self, path: str, max_per_session: int = 20, max_bytes: int = 100 * 1024 * 1024, keyframe_every: int = KEYFRAME_EVERY):
+        self.max_per_session = max_per_session
+        self.max_bytes = max_bytes
+        self.keyframe_every = max(1, keyframe_every)
+        self._lock = threading.Lock()
+        self._evicted = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(versions)")}
+        if columns and "base_id" not in columns:
+            # Full-copy layout from before delta storage; history is disposable
+            self._db.execute("DROP TABLE versions")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS versions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT, topic_key TEXT, created_at REAL, "
+            "summary TEXT, value BLOB, base_id INTEGER, depth INTEGER, size INTEGER, raw_size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS versions_session ON versions (session, topic_key, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS versions_base ON versions (base_id)")
+        self._db.commit()
+
+    def add(self, session_id: str, result: Dict[str, Any]) -> int:
+        """Store a result as the session's newest version and return its id"""
+        text = _serialize(result)
+        blob, base_id, depth = zlib.compress(text.encode("utf-8"), 6), None, 0
+        topic_key = normalize_query(result["metadata"].get("topic", ""))
+        with self._lock:
+            previous = self._db.execute(
+                "SELECT id, depth FROM versions WHERE session = ? AND topic_key = ? ORDER BY id DESC LIMIT 1",
+                (session_id, topic_key)
+            ).fetchone()
+            if previous is not None and previous[1] + 1 < self.keyframe_every:
+                delta = zlib.compress(json.dumps(make_delta(self._text(previous[0]), text)).encode("utf-8"), 6)
+                # A rewrite can make the delta bigger than a fresh copy
+                if len(delta) < len(blob):
+                    blob, base_id, depth = delta, previous[0], previous[1] + 1
+            cursor = self._db.execute(
+                "INSERT INTO versions (session, topic_key, created_at, summary, value, base_id, depth, size, raw_size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, topic_key, time.time(), json.dumps(summarize(result)), blob, base_id, depth, len(blob), len(text))
+            )
+            self._evict(session_id, cursor.lastrowid)
+            self._db.commit()
+            return cursor.lastrowid
+
+    def _text(self, version_id: int) -> Optional[str]:
+        """Serialized result of a version: its keyframe with the chain of
+        deltas up to it applied"""
+        chain = []
+        while version_id is not None:
+            row = self._db.execute("SELECT value, base_id FROM versions WHERE id = ?", (version_id,)).fetchone()
+            if row is None:
+                return None
+            chain.append(zlib.decompress(row[0]).decode("utf-8"))
+            version_id = row[1]
+        if len(chain) == 1:
+            return chain[0]
+        units = _units(chain.pop())
+        for delta in reversed(chain):
+            units = apply_delta(units, json.loads(delta))
+        return "".join(units)
+
+    def _drop(self, version_id: int):
+        """Delete a version, first storing the version based on it in full"""
+        child = self._db.execute("SELECT id FROM versions WHERE base_id = ?", (version_id,)).fetchone()
+        if child is not None:
+            blob = zlib.compress(self._text(child[0]).encode("utf-8"), 6)
+            self._db.execute(
+                "UPDATE versions SET value = ?, base_id = NULL, depth = 0, size = ? WHERE id = ?",
+                (blob, len(blob), child[0])
+            )
+        self._db.execute("DELETE FROM versions WHERE id = ?", (version_id,))
+        self._evicted += 1
+
+    def _evict(self, session_id: str, newest_id: int):
+        """Drop the session's versions beyond max_per_session, then the
+        oldest versions of any session until under the byte budget. Oldest
+        first, so a dropped version never has a stored base."""
+        rows = self._db.execute(
+            "SELECT id FROM versions WHERE session = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (session_id, self.max_per_session)
+        ).fetchall()
+        for (version_id,) in reversed(rows):
+            self._drop(version_id)
+        while self._db.execute("SELECT COALESCE(SUM(size), 0) FROM versions").fetchone()[0] > self.max_bytes:
+            oldest = self._db.execute("SELECT MIN(id) FROM versions").fetchone()[0]
+            # Never evict the version just added
+            if oldest == newest_id:
+                break
+            self._drop(oldest)
+
+    def entries(self, session_id: str) -> List[Dict[str, Any]]:
+        """Summaries of the session's stored versions, oldest first, each
+        with its version "id" """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, summary FROM versions WHERE session = ? ORDER BY id ASC", (session_id,)
+            ).fetchall()
+        return [dict(json.loads(summary), id=version_id) for version_id, summary in rows]
+
+    def load(self, session_id: str, version_id: int) -> Optional[Dict[str, Any]]:
+        """The full result of a version, or None once it has been evicted"""
+        with self._lock:
+            owned = self._db.execute(
+                "SELECT 1 FROM versions WHERE id = ? AND session = ?", (version_id, session_id)
+            ).fetchone()
+            text = self._text(version_id) if owned else None
+        return json.loads(text) if text is not None else None
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM versions WHERE session = ?", (session_id,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions, versions, deltas, size, raw_size = self._db.execute(
+                "SELECT COUNT(DISTINCT session), COUNT(*), COUNT(base_id), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM versions"
+            ).fetchone()
+            return {
+                "sessions": sessions,
+                "versions": versions,
+                "delta_versions": deltas,
+                "bytes": size,
+                "raw_bytes": raw_size,
+                "evicted": self._evicted
+            }
+
+
+_history_store: Optional[HistoryStore] = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide history store shared by every session.
+
+    SAGE_LENS_HISTORY_PER_SESSION caps the versions kept per session,
+    SAGE_LENS_HISTORY_MB the compressed size of the whole store and
+    SAGE_LENS_HISTORY_KEYFRAME_EVERY how often a topic's version is stored
+    in full (1 disables deltas).
+    """
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = HistoryStore(
+                os.path.join(cache_dir(), "history.sqlite3"),
+                max_per_session=int(os.getenv("SAGE_LENS_HISTORY_PER_SESSION", "20")),
+                max_bytes=int(float(os.getenv("SAGE_LENS_HISTORY_MB", "100")) * 1024 * 1024),
+                keyframe_every=int(os.getenv("SAGE_LENS_HISTORY_KEYFRAME_EVERY", str(KEYFRAME_EVERY)))
+            )
+        return _history_store
@@ -0,0 +1,181 @@
+"""
+Sage-Lens Jobs: research runs on a background worker pool
+
+Generate submits a job and gets its id back immediately. The pipeline runs
+on a worker thread, off the Streamlit script run, so widget interactions
+and reruns no longer block or discard it. The page polls the job for its
+current stage and streamed text, and the id is kept in the URL so a
+reloaded or reconnected browser picks the same job back up.
+"""
+
+import os
+import time
+import uuid
+import threading
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_current_job: ContextVar[Optional["Job"]] = ContextVar("sage_lens_job", default=None)
+
+
+def current_job() -> Optional["Job"]:
+    """The job whose pipeline is running in this context, if any"""
+    return _current_job.get()
+
+
+class Job:
+    """One background research run. Workers update it; readers take
+    snapshot()s, so the UI never sees a half-applied update."""
+
+    def __init__(self, job_id: str, topic: str):
+        self.id = job_id
+        self.topic = topic
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {
+            "id": job_id,
+            "topic": topic,
+            "status": "queued",
+            "stage": None,
+            "stages": [],
+            "texts": {},
+            "messages": [],
+            "result": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+
+    def set_stage(self, message: str):
+        """Record that the pipeline moved on to a new stage"""
+        with self._lock:
+            now = time.time()
+            if self._state["stages"]:
+                self._state["stages"][-1]["end"] = now
+            self._state["stages"].append({"stage": message, "start": now, "end": None})
+            self._state["stage"] = message
+
+    def on_delta(self, label: str, delta: str):
+        """on_delta for the pipeline: accumulates streamed text per stage or provider"""
+        with self._lock:
+            texts = self._state["texts"]
+            texts[label] = texts.get(label, "") + delta
+
+    def report(self, level: str, message: str):
+        """Keep a warning or error raised by the pipeline for the page to
+        show; Streamlit calls made on a worker thread are not displayed"""
+        with self._lock:
+            self._state["messages"].append({"level": level, "message": message})
+
+    def _update(self, **fields: Any):
+        with self._lock:
+            self._state.update(fields)
+            if fields.get("finished_at") and self._state["stages"]:
+                last = self._state["stages"][-1]
+                if last["end"] is None:
+                    last["end"] = fields["finished_at"]
+
+    @property
+    def active(self) -> bool:
+        with self._lock:
+            return self._state["status"] in ACTIVE_STATUSES
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = dict(self._state)
+            state["stages"] = [dict(stage) for stage in self._state["stages"]]
+            state["texts"] = dict(self._state["texts"])
+            state["messages"] = list(self._state["messages"])
+        return state
+
+
+class JobQueue:
+    """Runs jobs on a bounded worker pool and keeps finished jobs around
+    for `ttl` seconds (at most `max_finished` of them) so a reconnecting
+    browser can still collect the result."""
+
+    def __init__(self, workers: int = 4, ttl: float = 3600, max_finished: int = 100):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sage-lens-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0}
+
+    def submit(self, topic: str, run: Callable[[Job], Dict[str, Any]]) -> str:
+        """Queue run(job), which returns the research result, and return the job id"""
+        job = Job(uuid.uuid4().hex[:12], topic)
+        with self._lock:
+            self._prune(time.time())
+            self._jobs[job.id] = job
+            self._stats["submitted"] += 1
+        self._pool.submit(self._run, job, run)
+        return job.id
+
+    def _run(self, job: Job, run: Callable[[Job], Dict[str, Any]]):
+        token = _current_job.set(job)
+        job._update(status="running", started_at=time.time())
+        try:
+            result = run(job)
+        except Exception as e:
+            job._update(status="failed", error=str(e), finished_at=time.time())
+            outcome = "failed"
+        else:
+            job._update(status="done", result=result, finished_at=time.time())
+            outcome = "completed"
+        finally:
+            _current_job.reset(token)
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def _prune(self, now: float):
+        """Forget expired finished jobs, oldest first past max_finished"""
+        finished = sorted(
+            (job.snapshot()["finished_at"], job_id)
+            for job_id, job in self._jobs.items() if not job.active
+        )
+        for i, (finished_at, job_id) in enumerate(finished):
+            if now - finished_at > self.ttl or len(finished) - i > self.max_finished:
+                del self._jobs[job_id]
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs: List[Job] = list(self._jobs.values())
+            stats = dict(self._stats)
+        statuses = [job.snapshot()["status"] for job in jobs]
+        stats.update({status: statuses.count(status) for status in ACTIVE_STATUSES})
+        return stats
+
+
+def job_workers() -> int:
+    """Research runs executed at once (SAGE_LENS_JOB_WORKERS)"""
+    return max(1, int(os.getenv("SAGE_LENS_JOB_WORKERS", "4")))
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue shared by every session.
+
+    SAGE_LENS_JOB_WORKERS sets how many research runs execute at once and
+    SAGE_LENS_JOB_TTL how long (seconds) finished jobs stay collectable.
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                workers=job_workers(),
+                ttl=float(os.getenv("SAGE_LENS_JOB_TTL", "3600"))
+            )
+        return _job_queue
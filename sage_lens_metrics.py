@@ -0,0 +1,376 @@
+"""
+Sage-Lens Metrics: in-process counters, gauges and latency histograms in
+Prometheus text format
+
+The research engine records queries, provider calls, searches, errors
+(including Serper 403s, which the UI deliberately stays quiet about),
+latencies and token usage here. Rate limiter queues, background jobs and
+the completion cache are read when the metrics are rendered.
+
+The text can be scraped from a local HTTP endpoint (SAGE_LENS_METRICS_PORT)
+or picked up from a file rewritten on an interval (SAGE_LENS_METRICS_FILE),
+e.g. by node_exporter's textfile collector.
+"""
+
+import os
+import math
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sage_lens_cache import get_completion_cache
+from sage_lens_jobs import ACTIVE_STATUSES, get_job_queue
+from sage_lens_ratelimit import get_rate_limiter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds in seconds
+LLM_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 45, 60, 90, 120)
+SEARCH_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 15)
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30)
+QUERY_BUCKETS = (1, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 2, 5, 10, 30)
+RENDER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2)
+
+# (metric name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+# (name, type, help, samples) as produced by a collector at render time
+Collected = Tuple[str, str, str, List[Sample]]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metric:
+    """A metric family: one value per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = dict(self._values)
+        return [("", dict(zip(self.labels, key)), value) for key, value in values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(Metric):
+    """Cumulative buckets plus sum and count, so p95 is
+    histogram_quantile(0.95, rate(<name>_bucket[5m])) on the scraping side"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LLM_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples: List[Sample] = []
+        for key, (counts, total) in values.items():
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(self.buckets, counts):
+                samples.append(("_bucket", dict(labels, le=_format_value(bound)), count))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, counts[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """Metric families by name, plus collectors called at render time for
+    values other components already keep"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], List[Collected]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, help: str, labels: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif type(metric) is not cls or metric.labels != tuple(labels):
+                raise ValueError(f"{name} is already registered as a different metric")
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LLM_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def collector(self, collect: Callable[[], List[Collected]]):
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self) -> str:
+        """Every family in Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            families: List[Collected] = [(m.name, m.kind, m.help, m.samples()) for m in self._metrics.values()]
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                families.extend(collect())
+            except Exception:
+                # A failing collector must not take the whole endpoint down
+                continue
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}" for suffix, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+def _rate_limiter_metrics() -> List[Collected]:
+    stats = get_rate_limiter().stats()
+    return [
+        ("sage_lens_rate_limit_queue_depth", "gauge", "Calls currently queued for provider quota",
+         [("", {"provider": p}, s["queue_depth"]) for p, s in stats.items()]),
+        ("sage_lens_rate_limit_queued_total", "counter", "Calls that had to queue for provider quota",
+         [("", {"provider": p}, s["queued"]) for p, s in stats.items()]),
+        ("sage_lens_rate_limit_timeouts_total", "counter", "Calls sent after the longest allowed queue wait",
+         [("", {"provider": p}, s["timeouts"]) for p, s in stats.items()])
+    ]
+
+
+def _job_metrics() -> List[Collected]:
+    stats = get_job_queue().stats()
+    return [
+        ("sage_lens_jobs", "gauge", "Background research jobs by status",
+         [("", {"status": status}, stats.get(status, 0)) for status in ACTIVE_STATUSES]),
+        ("sage_lens_jobs_total", "counter", "Background research jobs by outcome",
+         [("", {"outcome": outcome}, stats[outcome]) for outcome in ("submitted", "completed", "failed")])
+    ]
+
+
+def _completion_cache_metrics() -> List[Collected]:
+    stats = get_completion_cache().stats()
+    return [
+        ("sage_lens_completion_cache_lookups_total", "counter", "Completion cache lookups by outcome",
+         [("", {"outcome": outcome}, count) for outcome, count in stats.items()])
+    ]
+
+
+class EngineMetrics:
+    """The research engine's metric families on one registry"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.queries = r.counter("sage_lens_queries_total", "Research queries run", ("engine", "method", "outcome"))
+        self.query_seconds = r.histogram("sage_lens_query_duration_seconds", "Research query wall time", ("engine", "method"), QUERY_BUCKETS)
+        self.generations = r.counter("sage_lens_generations_total", "LLM generations by outcome, including cache hits", ("provider", "stage", "outcome"))
+        self.provider_errors = r.counter("sage_lens_provider_errors_total", "LLM provider calls that raised", ("provider", "error"))
+        self.provider_seconds = r.histogram("sage_lens_provider_request_duration_seconds", "LLM provider call time, excluding rate-limit queueing", ("provider", "model"), LLM_BUCKETS)
+        self.provider_ttft = r.histogram("sage_lens_provider_ttft_seconds", "Time to first streamed token", ("provider", "model"), TTFT_BUCKETS)
+        self.tokens = r.counter("sage_lens_tokens_total", "Tokens reported by providers", ("provider", "kind"))
+        self.rate_limit_wait = r.histogram("sage_lens_rate_limit_wait_seconds", "Time spent queued for provider quota", ("provider",), WAIT_BUCKETS)
+        self.searches = r.counter("sage_lens_searches_total", "Search lookups by cache outcome", ("provider", "cache"))
+        self.search_seconds = r.histogram("sage_lens_search_request_duration_seconds", "Search provider call time, excluding rate-limit queueing", ("provider",), SEARCH_BUCKETS)
+        self.search_errors = r.counter("sage_lens_search_errors_total", "Failed search calls by reason (http_<status> or exception type)", ("provider", "reason"))
+        self.render_seconds = r.histogram("sage_lens_render_duration_seconds", "Time to build a result tab in the UI", ("tab",), RENDER_BUCKETS)
+        r.collector(_rate_limiter_metrics)
+        r.collector(_job_metrics)
+        r.collector(_completion_cache_metrics)
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.file_path: Optional[str] = None
+        self.export_error: Optional[str] = None
+
+    def record_query(self, result: Dict[str, Any], seconds: float):
+        metadata = result["metadata"]
+        outcome = "error" if metadata.get("error") else ("ok" if result.get("content") else "empty")
+        labels = {"engine": metadata.get("engine", "sync"), "method": metadata["method"]}
+        self.queries.inc(outcome=outcome, **labels)
+        self.query_seconds.observe(seconds, **labels)
+
+    def record_generation(self, provider: str, stage: str, result: Optional[Dict[str, Any]]):
+        if not result or not result.get("content"):
+            outcome = "empty"
+        elif result.get("cached"):
+            outcome = "cache_hit"
+        elif result.get("coalesced"):
+            outcome = "coalesced"
+        else:
+            outcome = "ok"
+        self.generations.inc(provider=provider, stage=stage, outcome=outcome)
+
+    def record_provider_error(self, provider: str, stage: str, error: BaseException):
+        self.generations.inc(provider=provider, stage=stage, outcome="error")
+        self.provider_errors.inc(provider=provider, error=type(error).__name__)
+
+    def record_call(self, provider: str, model: str, seconds: float, waited: float, result: Optional[Dict[str, Any]]):
+        """A call that actually reached the provider"""
+        self.provider_seconds.observe(seconds, provider=provider, model=model)
+        self.rate_limit_wait.observe(waited, provider=provider)
+        if result and result.get("ttft") is not None:
+            self.provider_ttft.observe(result["ttft"], provider=provider, model=model)
+        for kind in ("input", "output"):
+            tokens = ((result or {}).get("usage") or {}).get(f"{kind}_tokens")
+            if tokens:
+                self.tokens.inc(tokens, provider=provider, kind=kind)
+
+    def record_search(self, provider: str, cache_hit: bool):
+        self.searches.inc(provider=provider, cache="hit" if cache_hit else "miss")
+
+    def record_search_call(self, provider: str, seconds: float, status: int = 200):
+        self.search_seconds.observe(seconds, provider=provider)
+        if status != 200:
+            self.search_errors.inc(provider=provider, reason=f"http_{status}")
+
+    def record_search_error(self, provider: str, error: BaseException):
+        self.search_errors.inc(provider=provider, reason=type(error).__name__)
+
+    def record_render(self, tab: str, seconds: float):
+        self.render_seconds.observe(seconds, tab=tab)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve the text format at http://host:port/metrics from a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="sage-lens-metrics", daemon=True).start()
+
+    def write_file(self, path: str):
+        """Replace `path` with the current text in one rename, so a reader
+        never sees a half-written file"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def write_every(self, path: str, interval: float):
+        """Rewrite `path` every `interval` seconds from a daemon thread"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file_path = path
+
+        def loop():
+            while True:
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    self.export_error = str(e)
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name="sage-lens-metrics-file", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint": f"http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics" if self.server else None,
+            "file": self.file_path,
+            "error": self.export_error
+        }
+
+
+_metrics: Optional[EngineMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> EngineMetrics:
+    """Process-wide metrics shared by every session.
+
+    SAGE_LENS_METRICS_PORT serves them at /metrics on SAGE_LENS_METRICS_HOST
+    (default 127.0.0.1); SAGE_LENS_METRICS_FILE has them written to a file
+    every SAGE_LENS_METRICS_INTERVAL seconds. Both are off by default.
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = EngineMetrics()
+            port = int(os.getenv("SAGE_LENS_METRICS_PORT", "0") or 0)
+            if port:
+                try:
+                    _metrics.serve(port, host=os.getenv("SAGE_LENS_METRICS_HOST", "127.0.0.1"))
+                except OSError as e:
+                    # Port taken, e.g. by a second process; keep recording in memory
+                    _metrics.export_error = f"Could not serve metrics on port {port}: {e}"
+            path = os.getenv("SAGE_LENS_METRICS_FILE")
+            if path:
+                _metrics.write_every(path, float(os.getenv("SAGE_LENS_METRICS_INTERVAL", "15")))
+        return _metrics
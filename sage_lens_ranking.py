@@ -0,0 +1,154 @@
+"""
+Sage-Lens Ranking: merge web results from several search engines
+
+URLs are canonicalized so scheme, www/mobile/AMP mirrors, tracking
+parameters and trailing slashes do not produce separate references;
+results whose title and snippet are near-identical (SimHash) are merged;
+the survivors are ordered by reciprocal-rank fusion across engines.
+"""
+
+import re
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query parameters that only track the click, never select content
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "spm", "_ga", "_gl", "amp", "outputtype", "cmpid"
+}
+# Host prefixes of mirrors serving the same page
+MIRROR_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+RRF_K = 60
+SIMHASH_BITS = 64
+# Max differing bits for two results to count as the same page, and the
+# fewest words a text needs before SimHash is trusted (short titles collide).
+# Titles plus snippets are short, so one changed word flips far more bits
+# than in full documents; unrelated texts still sit around 32 bits apart.
+NEAR_DUPLICATE_DISTANCE = 10
+MIN_SIMHASH_WORDS = 8
+
+
+def canonical_url(url: str) -> str:
+    """Normalized form of a URL used as its identity when merging"""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    host = (parts.hostname or "").lower()
+    for prefix in MIRROR_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if host.endswith(".cdn.ampproject.org"):
+        # Google AMP cache: https://example-com.cdn.ampproject.org/c/s/example.com/page
+        match = re.match(r"/[a-z]/(?:s/)?(.+)", parts.path)
+        if match:
+            return canonical_url("https://" + match.group(1))
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/+", "/", parts.path)
+    path = re.sub(r"/amp/?$|\.amp$", "", path)
+    path = re.sub(r"/index\.html?$", "/", path)
+    path = path.rstrip("/")
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    query_string = urlencode(query)
+    # Scheme is dropped: http and https copies are the same reference
+    return host + path + ("?" + query_string if query_string else "")
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def simhash(text: str, bits: int = SIMHASH_BITS) -> Optional[int]:
+    """SimHash fingerprint over word unigrams and bigrams; None for texts
+    too short to fingerprint reliably"""
+    words = _words(text)
+    if len(words) < MIN_SIMHASH_WORDS:
+        return None
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    weights = [0] * bits
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=bits // 8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def merge_results(rankings: Dict[str, List[Dict[str, str]]], max_results: int = 10, k: int = RRF_K, weights: Optional[Dict[str, float]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Fuse per-engine result lists (each in the engine's rank order) into one
+    ranked, de-duplicated list.
+
+    Every result joins a cluster by canonical URL, or failing that by a
+    near-identical title + snippet. A cluster scores the sum over engines of
+    weight / (k + rank) for its best rank in each engine, and is represented
+    by its best-ranked result. Returns (results, merge counts).
+    """
+    clusters: List[Dict[str, Any]] = []
+    by_url: Dict[str, Dict[str, Any]] = {}
+    stats = {"candidates": 0, "url_duplicates": 0, "near_duplicates": 0}
+    for engine, results in rankings.items():
+        weight = (weights or {}).get(engine, 1.0)
+        for rank, result in enumerate(results, 1):
+            if not result.get("url"):
+                continue
+            stats["candidates"] += 1
+            key = canonical_url(result["url"])
+            fingerprint = simhash(f"{result.get('title', '')} {result.get('snippet', '')}")
+            cluster = by_url.get(key)
+            if cluster is not None:
+                stats["url_duplicates"] += 1
+            elif fingerprint is not None:
+                cluster = next((
+                    c for c in clusters
+                    if c["fingerprint"] is not None and hamming(c["fingerprint"], fingerprint) <= NEAR_DUPLICATE_DISTANCE
+                ), None)
+                if cluster is not None:
+                    stats["near_duplicates"] += 1
+            if cluster is None:
+                cluster = {"result": result, "best_rank": rank, "fingerprint": fingerprint, "ranks": {}}
+                clusters.append(cluster)
+            elif rank < cluster["best_rank"]:
+                cluster["result"], cluster["best_rank"] = result, rank
+            by_url.setdefault(key, cluster)
+            if engine not in cluster["ranks"] or rank < cluster["ranks"][engine][0]:
+                cluster["ranks"][engine] = (rank, weight)
+
+    for cluster in clusters:
+        cluster["score"] = sum(weight / (k + rank) for rank, weight in cluster["ranks"].values())
+    # Stable sort: ties keep first-seen order
+    clusters.sort(key=lambda c: -c["score"])
+    merged = [
+        {**cluster["result"], "sources": sorted(cluster["ranks"]), "rrf_score": round(cluster["score"], 5)}
+        for cluster in clusters[:max_results]
+    ]
+    stats["returned"] = len(merged)
+    return merged, stats
+
+
+class MergeStats:
+    """Running totals of merge_results counts, shared across queries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {"queries": 0, "candidates": 0, "url_duplicates": 0, "near_duplicates": 0, "returned": 0}
+
+    def add(self, stats: Dict[str, int]):
+        with self._lock:
+            self._totals["queries"] += 1
+            for key, value in stats.items():
+                self._totals[key] += value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
@@ -0,0 +1,240 @@
+"""
+Sage-Lens Rate Limiting: per-provider request and token buckets
+"""
+
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from sage_lens_tokens import count_tokens
+
+# Requests and tokens per minute per provider; 0 means unlimited. Token
+# limits only apply to LLM providers. Defaults sit at the lower usage tiers
+# and can be raised with SAGE_LENS_RPM_<PROVIDER> / SAGE_LENS_TPM_<PROVIDER>.
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 30000},
+    "anthropic": {"rpm": 50, "tpm": 40000},
+    "deepseek": {"rpm": 0, "tpm": 0},
+    "tavily": {"rpm": 100, "tpm": 0},
+    "serper": {"rpm": 300, "tpm": 0}
+}
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Token cost of a chat request before it is sent: prompt tokens plus
+    the completion budget, which is how providers count a request against
+    TPM up front"""
+    model = request.get("model") or "gpt-4-turbo"
+    prompt_tokens = sum(count_tokens(str(m.get("content", "")), model) for m in request.get("messages", []))
+    return prompt_tokens + int(request.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of quota.
+    The level may go negative when an estimate turns out too low; later
+    callers then wait for the debt to refill."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken. Requests larger than the
+        whole bucket wait for a full bucket rather than forever."""
+        self._refill(now)
+        shortfall = min(amount, self.per_minute) - self.level
+        return max(0.0, shortfall / self.rate)
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.per_minute, self.level + amount)
+
+
+class Reservation:
+    """Quota taken for one call; settle() corrects the token estimate"""
+
+    def __init__(self, limiter: "ProviderLimiter", estimated_tokens: int, waited: float):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.waited = waited
+        self._settled = False
+
+    def settle(self, usage: Optional[Dict[str, int]] = None):
+        """Replace the estimate with the provider's reported usage, if any"""
+        if self._settled:
+            return
+        self._settled = True
+        if usage:
+            self.limiter._settle(self.estimated_tokens, usage.get("input_tokens", 0) + usage.get("output_tokens", 0))
+
+    def refund(self):
+        """Give the token estimate back after a failed call, so errors do
+        not keep throttling the calls that follow"""
+        if self._settled:
+            return
+        self._settled = True
+        self.limiter._settle(self.estimated_tokens, 0)
+
+
+class ProviderLimiter:
+    """RPM and TPM buckets for one provider. Callers that would exceed
+    either bucket queue until quota refills, for at most `max_wait`
+    seconds; after that they proceed and the provider has the final say."""
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, max_wait: float = 30):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "queued": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "timeouts": 0,
+            "estimated_tokens": 0,
+            "actual_tokens": 0
+        }
+
+    def _attempt(self, tokens: int, started: float, queued: bool) -> Tuple[Optional[Reservation], float]:
+        """Take quota if available (or if the caller has waited long enough);
+        otherwise return how long to sleep before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self._requests.wait_time(1, now) if self._requests else 0.0,
+                self._tokens.wait_time(tokens, now) if self._tokens and tokens else 0.0
+            )
+            waited = now - started
+            if wait > 0 and waited < self.max_wait:
+                if not queued:
+                    self._stats["queued"] += 1
+                    self._stats["queue_depth"] += 1
+                    self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+                return None, min(wait, self.max_wait - waited)
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens and tokens:
+                self._tokens.take(tokens)
+            stats = self._stats
+            stats["requests"] += 1
+            stats["estimated_tokens"] += tokens
+            if queued:
+                stats["queue_depth"] -= 1
+                stats["total_wait"] += waited
+                stats["max_wait"] = max(stats["max_wait"], waited)
+            if wait > 0:
+                stats["timeouts"] += 1
+            return Reservation(self, tokens, waited), 0.0
+
+    def reserve(self, tokens: int = 0) -> Reservation:
+        """Block until a request of `tokens` estimated tokens may be sent"""
+        started = time.monotonic()
+        queued = False
+        while True:
+            reservation, wait = self._attempt(tokens, started, queued)
+            if reservation:
+                return reservation
+            queued = True
+            time.sleep(wait)
+
+    async def reserve_async(self, tokens: int = 0) -> Reservation:
+        """reserve() for the async engine: waits without blocking the loop"""
+        started = time.monotonic()
+        queued = False
+        while True:
+            reservation, wait = self._attempt(tokens, started, queued)
+            if reservation:
+                return reservation
+            queued = True
+            await asyncio.sleep(wait)
+
+    def _settle(self, estimated: int, actual: int):
+        with self._lock:
+            self._stats["actual_tokens"] += actual
+            if self._tokens:
+                delta = actual - estimated
+                if delta > 0:
+                    self._tokens.take(delta)
+                else:
+                    self._tokens.give_back(-delta)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "avg_wait": stats["total_wait"] / stats["queued"] if stats["queued"] else 0.0
+        })
+        return stats
+
+
+class RateLimiter:
+    """Central scheduler holding one ProviderLimiter per provider"""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None, max_wait: float = 30):
+        self.max_wait = max_wait
+        self._limiters: Dict[str, ProviderLimiter] = {
+            name: ProviderLimiter(name, rpm=limit.get("rpm", 0), tpm=limit.get("tpm", 0), max_wait=max_wait)
+            for name, limit in (limits or DEFAULT_LIMITS).items()
+        }
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        with self._lock:
+            if provider not in self._limiters:
+                # Unknown providers are tracked but not limited
+                self._limiters[provider] = ProviderLimiter(provider, max_wait=self.max_wait)
+            return self._limiters[provider]
+
+    def reserve(self, provider: str, tokens: int = 0) -> Reservation:
+        return self.limiter(provider).reserve(tokens)
+
+    async def reserve_async(self, provider: str, tokens: int = 0) -> Reservation:
+        return await self.limiter(provider).reserve_async(tokens)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide rate limiter; quotas belong to the API key, so every
+    session and batch worker draws from the same buckets.
+
+    Limits can be overridden with SAGE_LENS_RPM_<PROVIDER> and
+    SAGE_LENS_TPM_<PROVIDER>, and the longest a call queues with
+    SAGE_LENS_RATE_LIMIT_MAX_WAIT (seconds).
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            limits = {}
+            for provider, defaults in DEFAULT_LIMITS.items():
+                limits[provider] = {
+                    "rpm": float(os.getenv(f"SAGE_LENS_RPM_{provider.upper()}", defaults["rpm"])),
+                    "tpm": float(os.getenv(f"SAGE_LENS_TPM_{provider.upper()}", defaults["tpm"]))
+                }
+            _rate_limiter = RateLimiter(limits, max_wait=float(os.getenv("SAGE_LENS_RATE_LIMIT_MAX_WAIT", "30")))
+        return _rate_limiter
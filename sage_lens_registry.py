@@ -0,0 +1,119 @@
+"""
+Sage-Lens Registry: process-wide, thread-safe cache of built research systems
+"""
+
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """Stable hash of a resolved config; secrets never leave this function"""
+    material = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _close(system: Any):
+    close = getattr(system, "close", None)
+    if callable(close):
+        close()
+
+
+class SystemRegistry:
+    """Builds each named system once and hands the same instance to every
+    session and rerun, so API clients and their HTTP pools stay warm.
+    A system is rebuilt only when its resolved config changes.
+
+    Callers that keep using a system beyond the current script run (a
+    background job, say) take it with acquire=True and release() it when
+    done; a retired system is closed once its last such lease is released.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, config: Dict[str, Any], build: Callable[[Dict[str, Any]], Any], acquire: bool = False) -> Any:
+        fingerprint = config_fingerprint(config)
+        retired = None
+        # Build under the lock so concurrent sessions wait for a single build
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                entry["hits"] += 1
+                if acquire:
+                    self._acquire(entry["system"])
+                return entry["system"]
+            started = time.perf_counter()
+            system = build(config)
+            self._entries[name] = {
+                "system": system,
+                "fingerprint": fingerprint,
+                "built_at": time.time(),
+                "build_time": time.perf_counter() - started,
+                "builds": (entry["builds"] + 1) if entry else 1,
+                "hits": 0
+            }
+            if acquire:
+                self._acquire(system)
+            if entry is not None:
+                retired = self._retire(entry["system"])
+        if retired is not None:
+            _close(retired)
+        return system
+
+    def _acquire(self, system: Any):
+        self._leases[id(system)] = self._leases.get(id(system), 0) + 1
+
+    def _retire(self, system: Any) -> Optional[Any]:
+        """The system if it can be closed now; otherwise it is parked until
+        its last lease is released. Called with the lock held."""
+        if self._leases.get(id(system)):
+            self._retired[id(system)] = system
+            return None
+        return system
+
+    def release(self, system: Any):
+        """End a lease taken with get(acquire=True)"""
+        with self._lock:
+            remaining = self._leases.get(id(system), 0) - 1
+            if remaining > 0:
+                self._leases[id(system)] = remaining
+                return
+            self._leases.pop(id(system), None)
+            retired = self._retired.pop(id(system), None)
+        if retired is not None:
+            _close(retired)
+
+    def peek(self, name: str) -> Optional[Any]:
+        """The currently built system, without building or counting a hit"""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry["system"] if entry else None
+
+    def clear(self, name: Optional[str] = None):
+        with self._lock:
+            names = [name] if name else list(self._entries)
+            retired = [self._retire(self._entries.pop(n)["system"]) for n in names if n in self._entries]
+        for system in retired:
+            if system is not None:
+                _close(system)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: dict({k: v for k, v in entry.items() if k != "system"}, leases=self._leases.get(id(entry["system"]), 0))
+                for name, entry in self._entries.items()
+            }
+
+
+_registry = SystemRegistry()
+
+
+def get_registry() -> SystemRegistry:
+    """The process-wide registry shared by every Streamlit session"""
+    return _registry
@@ -0,0 +1,123 @@
+"""
+Sage-Lens Single-flight: collapse identical concurrent calls into one
+"""
+
+import copy
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from sage_lens_streaming import StreamCancelled
+
+
+class _Abandoned(Exception):
+    """The leader was cancelled before finishing; followers retry"""
+
+
+class SingleFlight:
+    """While a call for a key is running, later callers with the same key
+    wait for it and share its result (or exception) instead of repeating
+    the work. Works across threads and event loops: the in-flight slot is
+    a concurrent.futures.Future that both kinds of caller can wait on.
+
+    Followers get a deep copy of a snapshot taken when the leader finished,
+    so every caller, the leader included, may mutate its result freely.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """The in-flight future for key and whether the caller leads it"""
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["executions"] += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Run fn(*args, **kwargs) unless an identical call is in flight.
+        Returns (value, shared); shared is True for callers that waited.
+        If the leader's stream is cancelled, its followers start over."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return copy.deepcopy(future.result()), True
+                except _Abandoned:
+                    continue
+            try:
+                value = fn(*args, **kwargs)
+            except StreamCancelled:
+                self._finish(key, future)
+                future.set_exception(_Abandoned())
+                raise
+            except BaseException as e:
+                self._finish(key, future)
+                future.set_exception(e)
+                raise
+            self._finish(key, future)
+            # Followers copy from a snapshot: the leader's own value may be
+            # mutated as soon as it is returned
+            future.set_result(copy.deepcopy(value))
+            return value, False
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs) -> Tuple[Any, bool]:
+        """do() for coroutine functions. If the leader is cancelled, its
+        followers start over instead of inheriting the cancellation."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return copy.deepcopy(await asyncio.wrap_future(future)), True
+                except _Abandoned:
+                    continue
+            try:
+                value = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                self._finish(key, future)
+                future.set_exception(_Abandoned())
+                raise
+            except BaseException as e:
+                self._finish(key, future)
+                future.set_exception(e)
+                raise
+            self._finish(key, future)
+            future.set_result(copy.deepcopy(value))
+            return value, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Process-wide single-flight group, so callers from every session
+    coalesce with each other"""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight()
+        return _flights[name]
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in flights.items()}
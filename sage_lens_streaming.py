@@ -0,0 +1,178 @@
+"""
+Sage-Lens Streaming: token-delta streams from every provider backend
+"""
+
+import time
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+
+class StreamCancelled(Exception):
+    """Raised by consume() when its stream is stopped before it finished"""
+
+
+class GenerationStream:
+    """Iterable of text deltas from one provider call.
+
+    Timing starts when the stream is created, so time-to-first-token
+    includes the request round-trip. Once the stream is exhausted,
+    `result` holds the usual {"content", "provider", "latency"} dict plus
+    streaming metrics.
+    """
+
+    def __init__(self, provider: str, deltas: Callable[[Dict[str, int]], Iterator[str]]):
+        self.provider = provider
+        self.usage: Dict[str, int] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self._deltas = deltas
+        self._start = time.time()
+        self._first_token: Optional[float] = None
+        self._chunks: List[str] = []
+
+    def __iter__(self) -> Iterator[str]:
+        for delta in self._deltas(self.usage):
+            if self._first_token is None:
+                self._first_token = time.time()
+            self._chunks.append(delta)
+            yield delta
+        self.result = self._finish()
+
+    def _finish(self) -> Dict[str, Any]:
+        end = time.time()
+        first_token = self._first_token or end
+        # Prefer the provider's own token count, fall back to chunk count
+        output_tokens = self.usage.get("output_tokens") or len(self._chunks)
+        generation_time = end - first_token
+        return {
+            "content": "".join(self._chunks),
+            "provider": self.provider,
+            "latency": end - self._start,
+            "ttft": first_token - self._start,
+            "tokens_per_sec": output_tokens / generation_time if generation_time > 0 else 0.0,
+            "usage": dict(self.usage)
+        }
+
+    def consume(self, on_delta: Optional[Callable[[str], None]] = None, cancelled: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Drain the stream, forwarding each delta, and return the final result.
+
+        `cancelled` is checked before every delta; once it is set the stream
+        is closed and StreamCancelled raised instead of reading on.
+        """
+        deltas = iter(self)
+        for delta in deltas:
+            if cancelled is not None and cancelled.is_set():
+                deltas.close()
+                raise StreamCancelled(f"{self.provider} stream cancelled")
+            if on_delta:
+                on_delta(delta)
+        return self.result
+
+
+class AsyncGenerationStream(GenerationStream):
+    """Async-iterable counterpart of GenerationStream for the async SDK clients"""
+
+    def __init__(self, provider: str, deltas: Callable[[Dict[str, int]], AsyncIterator[str]]):
+        super().__init__(provider, deltas)
+
+    def __iter__(self):
+        raise TypeError("AsyncGenerationStream must be consumed with 'async for'")
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for delta in self._deltas(self.usage):
+            if self._first_token is None:
+                self._first_token = time.time()
+            self._chunks.append(delta)
+            yield delta
+        self.result = self._finish()
+
+    async def consume(self, on_delta: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Drain the stream, forwarding each delta, and return the final result"""
+        async for delta in self:
+            if on_delta:
+                on_delta(delta)
+        return self.result
+
+
+def response_usage(response) -> Dict[str, int]:
+    """Token usage from a non-streamed OpenAI or Anthropic response"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    if hasattr(usage, "input_tokens"):
+        return {"input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens}
+    return {"input_tokens": usage.prompt_tokens, "output_tokens": usage.completion_tokens}
+
+
+def stream_openai_chat(client, provider: str, **create_kwargs) -> GenerationStream:
+    """Stream a chat completion from OpenAI or any OpenAI-compatible API (DeepSeek)"""
+
+    def deltas(usage: Dict[str, int]) -> Iterator[str]:
+        # Closing the stream drops the connection if we stop reading early
+        with client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            **create_kwargs
+        ) as stream:
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage["input_tokens"] = chunk.usage.prompt_tokens
+                    usage["output_tokens"] = chunk.usage.completion_tokens
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+
+    return GenerationStream(provider, deltas)
+
+
+def stream_anthropic_messages(client, provider: str, **create_kwargs) -> GenerationStream:
+    """Stream a message from Anthropic"""
+
+    def deltas(usage: Dict[str, int]) -> Iterator[str]:
+        with client.messages.stream(**create_kwargs) as stream:
+            for delta in stream.text_stream:
+                if delta:
+                    yield delta
+            final = stream.get_final_message()
+            if getattr(final, "usage", None):
+                usage["input_tokens"] = final.usage.input_tokens
+                usage["output_tokens"] = final.usage.output_tokens
+
+    return GenerationStream(provider, deltas)
+
+
+def stream_openai_chat_async(client, provider: str, **create_kwargs) -> AsyncGenerationStream:
+    """Stream a chat completion from an AsyncOpenAI client (OpenAI or DeepSeek)"""
+
+    async def deltas(usage: Dict[str, int]) -> AsyncIterator[str]:
+        stream = await client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            **create_kwargs
+        )
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage["input_tokens"] = chunk.usage.prompt_tokens
+                usage["output_tokens"] = chunk.usage.completion_tokens
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+    return AsyncGenerationStream(provider, deltas)
+
+
+def stream_anthropic_messages_async(client, provider: str, **create_kwargs) -> AsyncGenerationStream:
+    """Stream a message from an AsyncAnthropic client"""
+
+    async def deltas(usage: Dict[str, int]) -> AsyncIterator[str]:
+        async with client.messages.stream(**create_kwargs) as stream:
+            async for delta in stream.text_stream:
+                if delta:
+                    yield delta
+            final = await stream.get_final_message()
+            if getattr(final, "usage", None):
+                usage["input_tokens"] = final.usage.input_tokens
+                usage["output_tokens"] = final.usage.output_tokens
+
+    return AsyncGenerationStream(provider, deltas)
@@ -0,0 +1,184 @@
+"""
+Sage-Lens Tokens: local token counting and per-stage context budgets
+"""
+
+import threading
+import importlib.util
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# tiktoken is imported on the first count, not at startup (see _encoding)
+TIKTOKEN_AVAILABLE = importlib.util.find_spec("tiktoken") is not None
+
+# Context window (prompt + completion) and completion limit per model
+MODEL_LIMITS = {
+    "gpt-4-turbo": {"context": 128000, "output": 4096},
+    "gpt-4o": {"context": 128000, "output": 16384},
+    "gpt-4o-mini": {"context": 128000, "output": 16384},
+    "claude-3-5-sonnet-20241022": {"context": 200000, "output": 8192},
+    "deepseek-chat": {"context": 64000, "output": 8192}
+}
+DEFAULT_LIMITS = {"context": 8192, "output": 4096}
+
+# Expected completion length per stage: a fixed allowance plus, for stages
+# that expand their input, a share of the prompt. "research" is the JSON
+# brief, "standard" the provider ensemble, "summary" the legacy app.
+STAGE_OUTPUT = {
+    "research": {"base": 1500, "ratio": 0.0},
+    "content": {"base": 2000, "ratio": 0.5},
+    "analysis": {"base": 1200, "ratio": 0.0},
+    "fused": {"base": 4000, "ratio": 0.0},
+    "standard": {"base": 3000, "ratio": 0.0},
+    "summary": {"base": 1500, "ratio": 0.0}
+}
+MIN_OUTPUT_TOKENS = 256
+# Room left in the input budget for agent instructions and the prompt template
+PROMPT_OVERHEAD = 400
+TRUNCATION_NOTE = "\n\n[... truncated to fit the context budget]"
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """tiktoken encoding for a model; cl100k_base approximates non-OpenAI
+    models. None (chars / 4 heuristic) if tiktoken or its BPE files are
+    unavailable, e.g. offline on first use."""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4-turbo") -> int:
+    """Token count of text for the given model"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, limit: int, model: str = "gpt-4-turbo") -> str:
+    """The longest prefix of text within `limit` tokens"""
+    if limit <= 0 or not text:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:limit * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= limit:
+        return text
+    return encoding.decode(tokens[:limit])
+
+
+def model_limits(model: Optional[str]) -> Dict[str, int]:
+    return MODEL_LIMITS.get(model or "", DEFAULT_LIMITS)
+
+
+class ContextBudget:
+    """Fits prompt material into a per-call input budget and sizes
+    max_tokens per stage, so prompts stop growing with upstream output and
+    prompt + completion always fit the model's context window."""
+
+    def __init__(self, input_budget: int = 6000, web_budget: int = 600, snippet_tokens: int = 50, max_results: int = 5):
+        self.input_budget = input_budget
+        self.web_budget = web_budget
+        self.snippet_tokens = snippet_tokens
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "max_tokens": 0,
+            "documents_trimmed": 0,
+            "tokens_trimmed": 0,
+            "web_results_dropped": 0
+        }
+
+    def _count(self, **deltas: int):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def _web_lines(self, web_results: List[Dict[str, str]], model: str, numbered: bool) -> List[str]:
+        lines, used = [], 0
+        for i, r in enumerate(web_results[:self.max_results], 1):
+            prefix = f"[{i}]" if numbered else "-"
+            line = f"{prefix} {r['title']}: {truncate_tokens(r.get('snippet', ''), self.snippet_tokens, model)}"
+            tokens = count_tokens(line, model) + 1
+            if lines and used + tokens > self.web_budget:
+                break
+            lines.append(line)
+            used += tokens
+        return lines
+
+    def web_context(self, web_results: List[Dict[str, str]], model: str = "gpt-4-turbo", numbered: bool = False) -> str:
+        """'- title: snippet' lines in rank order, each snippet cut to
+        snippet_tokens, stopping before the web budget is exceeded.
+        numbered lines start with the result's 1-based position instead."""
+        lines = self._web_lines(web_results, model, numbered)
+        dropped = min(len(web_results), self.max_results) - len(lines)
+        if dropped:
+            self._count(web_results_dropped=dropped)
+        return "\n".join(lines)
+
+    def web_sources(self, web_results: List[Dict[str, str]], model: str = "gpt-4-turbo", numbered: bool = False) -> List[Dict[str, str]]:
+        """The leading results that web_context() with the same arguments
+        puts in the prompt"""
+        return web_results[:len(self._web_lines(web_results, model, numbered))]
+
+    def fit_document(self, text: str, reserve: int = PROMPT_OVERHEAD, model: str = "gpt-4-turbo") -> str:
+        """Keep whole paragraphs of an upstream document while they fit the
+        input budget minus `reserve` tokens for the surrounding prompt"""
+        limit = max(self.input_budget - reserve, 0)
+        total = count_tokens(text, model)
+        if total <= limit:
+            return text
+        kept, used = [], 0
+        for paragraph in text.split("\n\n"):
+            tokens = count_tokens(paragraph, model) + 1
+            if used + tokens > limit:
+                if not kept:
+                    kept.append(truncate_tokens(paragraph, limit, model))
+                break
+            kept.append(paragraph)
+            used += tokens
+        fitted = "\n\n".join(kept)
+        self._count(documents_trimmed=1, tokens_trimmed=total - count_tokens(fitted, model))
+        return fitted + TRUNCATION_NOTE
+
+    def max_tokens(self, stage: str, model: Optional[str], prompt: str) -> int:
+        """Completion budget for a stage: its expected output length, capped by
+        the model's completion limit and by what is left of the context window"""
+        limits = model_limits(model)
+        prompt_tokens = count_tokens(prompt, model or "gpt-4-turbo")
+        shape = STAGE_OUTPUT.get(stage, STAGE_OUTPUT["standard"])
+        expected = int(shape["base"] + shape["ratio"] * prompt_tokens)
+        room = limits["context"] - prompt_tokens
+        max_tokens = max(MIN_OUTPUT_TOKENS, min(expected, limits["output"], room))
+        self._count(requests=1, prompt_tokens=prompt_tokens, max_tokens=max_tokens)
+        return max_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        stats.update({
+            "input_budget": self.input_budget,
+            "avg_prompt_tokens": stats["prompt_tokens"] / requests if requests else 0.0,
+            "avg_max_tokens": stats["max_tokens"] / requests if requests else 0.0,
+            "tokenizer": "tiktoken" if _encoding("gpt-4-turbo") is not None else "chars/4"
+        })
+        return stats
@@ -0,0 +1,204 @@
+"""
+Sage-Lens Tracing: nested timing spans for every stage of a query
+
+A trace covers one query. Code inside it opens spans with
+`with span(name, **attributes)`; each span nests under the span that was
+current where it was opened. Threads submitted through
+ConcurrentExecutor and asyncio tasks both inherit the current span, so
+fanned-out searches and parallel agents land under the right parent.
+Outside a trace, span() records nothing.
+
+Finished traces are returned to the caller (the pipeline keeps one in the
+result metadata for the Metrics tab) and appended as JSON lines to a
+size-rotated file.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+from sage_lens_cache import cache_dir
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("sage_lens_span", default=None)
+
+
+class Span:
+    """One timed stage. Attributes are plain JSON values: provider, model,
+    cache hit, token counts and the like."""
+
+    def __init__(self, trace: Optional["Trace"], name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def to_dict(self, origin: float, closed_at: float) -> Dict[str, Any]:
+        """Times in seconds from the start of the trace. A span still open
+        when the trace closed (an ensemble straggler) is cut off there."""
+        end = self.end if self.end is not None else closed_at
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start - origin,
+            "end": end - origin,
+            "duration": end - self.start,
+            "status": self.status if self.end is not None else "unfinished",
+            "attributes": dict(self.attributes)
+        }
+
+
+class Trace:
+    """The spans of one query, recorded from any thread"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.timestamp = time.time()
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = Span(self, name, None, attributes)
+        self._spans.append(self.root)
+        self.record: Optional[Dict[str, Any]] = None
+
+    def add(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        closed_at = self.root.end if self.root.end is not None else time.perf_counter()
+        with self._lock:
+            spans = [s.to_dict(self.root.start, closed_at) for s in self._spans]
+        return {
+            "trace_id": self.id,
+            "name": self.root.name,
+            "timestamp": self.timestamp,
+            "duration": closed_at - self.root.start,
+            "attributes": dict(self.root.attributes),
+            "spans": sorted(spans, key=lambda s: s["start"])
+        }
+
+
+def _close(s: Span, error: Optional[BaseException]):
+    if isinstance(error, asyncio.CancelledError):
+        s.status = "cancelled"
+    elif error is not None:
+        s.status = "error"
+        s.attributes["error"] = str(error)[:200]
+    s.end = time.perf_counter()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Time the block as a child of the current span"""
+    parent = _current_span.get()
+    trace = parent.trace if parent is not None else None
+    s = Span(trace, name, parent.id if parent is not None else None, attributes)
+    if trace is None:
+        yield s
+        return
+    trace.add(s)
+    token = _current_span.set(s)
+    error: Optional[BaseException] = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        _close(s, error)
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """Record a new trace rooted at the block; when it ends the trace is
+    exported and its dict left on `.record`"""
+    t = Trace(name, attributes)
+    token = _current_span.set(t.root)
+    error: Optional[BaseException] = None
+    try:
+        yield t
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        _close(t.root, error)
+        t.record = t.to_dict()
+        get_tracer().export(t.record)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class TraceExporter:
+    """Appends traces as JSON lines to `path`, rolling over to path.1,
+    path.2, ... once the file reaches max_bytes and keeping `backups` of
+    them. max_bytes=0 keeps traces in memory only."""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self._handler: Optional[RotatingFileHandler] = None
+        if max_bytes > 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._lock = threading.Lock()
+        self._stats = {"traces": 0, "spans": 0, "failed": 0}
+
+    def export(self, record: Dict[str, Any]):
+        ok = True
+        if self._handler is not None:
+            try:
+                # The handler's lock serializes writers and rollovers
+                self._handler.handle(logging.makeLogRecord({"msg": json.dumps(record, default=str)}))
+            except Exception:
+                ok = False
+        with self._lock:
+            self._stats["traces"] += 1
+            self._stats["spans"] += len(record["spans"])
+            self._stats["failed"] += 0 if ok else 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, path=self.path if self._handler else None)
+
+
+_tracer: Optional[TraceExporter] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> TraceExporter:
+    """Process-wide trace exporter shared by every session.
+
+    Traces go to traces.jsonl under SAGE_LENS_TRACE_DIR (default: traces/
+    in the cache directory). SAGE_LENS_TRACE_FILE_MB caps each file (0
+    disables the file) and SAGE_LENS_TRACE_FILES sets how many rotated
+    files are kept.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            directory = os.getenv("SAGE_LENS_TRACE_DIR") or os.path.join(cache_dir(), "traces")
+            _tracer = TraceExporter(
+                os.path.join(directory, "traces.jsonl"),
+                max_bytes=int(float(os.getenv("SAGE_LENS_TRACE_FILE_MB", "10")) * 1024 * 1024),
+                backups=int(os.getenv("SAGE_LENS_TRACE_FILES", "5"))
+            )
+        return _tracer
@@ -0,0 +1,412 @@
+"""
+Sage-Lens Transport: shared keep-alive connection pools for every HTTP client
+"""
+
+import sys
+import asyncio
+import weakref
+import importlib
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def httpx_module(sdk_client_class) -> Any:
+    """The httpx package a provider SDK is built on. Older SDKs use httpx,
+    newer ones the httpx2 fork, and http_client must match."""
+    for cls in sdk_client_class.__mro__:
+        namespace = vars(sys.modules.get(cls.__module__, object))
+        for name in ("httpx", "httpx2"):
+            module = namespace.get(name)
+            if module is not None and hasattr(module, "Client"):
+                return module
+    return importlib.import_module("httpx")
+
+
+def http2_available() -> bool:
+    try:
+        importlib.import_module("h2")
+        return True
+    except ImportError:
+        return False
+
+
+class _HostCounters:
+    """Per-host requests, new connections and in-flight counts, readable
+    from any thread"""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def host(self, host: str) -> Dict[str, int]:
+        with self._lock:
+            return self._counts.setdefault(host, {"requests": 0, "new_connections": 0, "in_flight": 0})
+
+    def bump(self, counts: Dict[str, int], field: str, delta: int = 1):
+        with self._lock:
+            counts[field] += delta
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {host: dict(counts) for host, counts in self._counts.items()}
+
+
+def _pool_stats(inner, counters: _HostCounters) -> Dict[str, Any]:
+    pool = getattr(inner, "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+    return {"open_connections": len(connections), "idle_connections": idle, "hosts": counters.snapshot()}
+
+
+# httpcore reports connection setup through the trace extension; a request
+# that never emits this event was served on a pooled connection
+NEW_CONNECTION_EVENT = "connection.connect_tcp.complete"
+
+
+def _pooled_transport_class(httpx):
+    """Build a transport class for the given httpx flavour that enforces
+    per-host concurrency limits and counts new vs reused connections"""
+
+    class ReleasingStream(httpx.SyncByteStream):
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        def __iter__(self):
+            for chunk in self._stream:
+                yield chunk
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                self._release()
+
+    class PooledTransport(httpx.BaseTransport):
+        def __init__(self, limits, per_host: int, http2: bool, acquire_timeout: float):
+            self._inner = httpx.HTTPTransport(limits=limits, http2=http2)
+            self.per_host = per_host
+            self.acquire_timeout = acquire_timeout
+            self._slots: Dict[str, threading.BoundedSemaphore] = {}
+            self._slots_lock = threading.Lock()
+            self.counters = _HostCounters()
+
+        def _slot(self, host: str) -> threading.BoundedSemaphore:
+            with self._slots_lock:
+                if host not in self._slots:
+                    self._slots[host] = threading.BoundedSemaphore(self.per_host)
+                return self._slots[host]
+
+        def handle_request(self, request):
+            host = request.url.host
+            slot = self._slot(host)
+            if not slot.acquire(timeout=self.acquire_timeout):
+                raise httpx.PoolTimeout(f"Per-host limit of {self.per_host} reached for {host}", request=request)
+            counts = self.counters.host(host)
+            self.counters.bump(counts, "requests")
+            self.counters.bump(counts, "in_flight")
+            released = threading.Event()
+
+            def release():
+                if not released.is_set():
+                    released.set()
+                    self.counters.bump(counts, "in_flight", -1)
+                    slot.release()
+
+            caller_trace = request.extensions.get("trace")
+
+            def trace(event_name, info):
+                if event_name == NEW_CONNECTION_EVENT:
+                    self.counters.bump(counts, "new_connections")
+                if caller_trace:
+                    caller_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+            try:
+                response = self._inner.handle_request(request)
+            except Exception:
+                release()
+                raise
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=ReleasingStream(response.stream, release),
+                extensions=response.extensions
+            )
+
+        def close(self):
+            self._inner.close()
+
+        def stats(self) -> Dict[str, Any]:
+            return _pool_stats(self._inner, self.counters)
+
+    return PooledTransport
+
+
+def _pooled_async_transport_class(httpx):
+    """Async counterpart of _pooled_transport_class. An instance belongs to
+    the event loop that first uses it."""
+
+    class ReleasingAsyncStream(httpx.AsyncByteStream):
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                self._release()
+
+    class PooledAsyncTransport(httpx.AsyncBaseTransport):
+        def __init__(self, limits, per_host: int, http2: bool, acquire_timeout: float):
+            self._inner = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+            self.per_host = per_host
+            self.acquire_timeout = acquire_timeout
+            self._slots: Dict[str, asyncio.Semaphore] = {}
+            self.counters = _HostCounters()
+
+        async def handle_async_request(self, request):
+            host = request.url.host
+            slot = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+            try:
+                await asyncio.wait_for(slot.acquire(), timeout=self.acquire_timeout)
+            except asyncio.TimeoutError:
+                raise httpx.PoolTimeout(f"Per-host limit of {self.per_host} reached for {host}", request=request)
+            counts = self.counters.host(host)
+            self.counters.bump(counts, "requests")
+            self.counters.bump(counts, "in_flight")
+            released = False
+
+            def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    self.counters.bump(counts, "in_flight", -1)
+                    slot.release()
+
+            caller_trace = request.extensions.get("trace")
+
+            async def trace(event_name, info):
+                if event_name == NEW_CONNECTION_EVENT:
+                    self.counters.bump(counts, "new_connections")
+                if caller_trace:
+                    await caller_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+            try:
+                response = await self._inner.handle_async_request(request)
+            except BaseException:
+                release()
+                raise
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=ReleasingAsyncStream(response.stream, release),
+                extensions=response.extensions
+            )
+
+        async def aclose(self):
+            await self._inner.aclose()
+
+        def stats(self) -> Dict[str, Any]:
+            return _pool_stats(self._inner, self.counters)
+
+    return PooledAsyncTransport
+
+
+class TransportLayer:
+    """Owns the connection pools shared by Serper (requests) and the
+    OpenAI, DeepSeek and Anthropic SDKs (httpx)."""
+
+    def __init__(
+        self,
+        max_connections: int = 50,
+        per_host: int = 10,
+        keepalive_seconds: float = 90,
+        http2: bool = False,
+        acquire_timeout: float = 30
+    ):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.keepalive_seconds = keepalive_seconds
+        # HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive
+        self.http2 = bool(http2 and http2_available())
+        self.acquire_timeout = acquire_timeout
+        self._httpx_clients: Dict[str, Any] = {}
+        # Event loop -> {httpx flavour: AsyncClient}; pools go away with their loop
+        self._async_clients: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+
+    @property
+    def session(self) -> Any:
+        """Pooled requests session for Serper (and Tavily, where supported),
+        created on first use so requests is only imported when needed.
+        pool_block caps concurrent connections per host."""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._adapter = HTTPAdapter(
+                    pool_connections=max(1, self.max_connections // max(1, self.per_host)),
+                    pool_maxsize=self.per_host,
+                    pool_block=True
+                )
+                self._session = requests.Session()
+                self._session.mount("https://", self._adapter)
+                self._session.mount("http://", self._adapter)
+            return self._session
+
+    def httpx_client(self, sdk_client_class) -> Any:
+        """Pooled httpx client to pass as http_client= to an OpenAI or
+        Anthropic client. SDKs on the same httpx flavour share one pool."""
+        httpx = httpx_module(sdk_client_class)
+        with self._lock:
+            client = self._httpx_clients.get(httpx.__name__)
+            if client is None:
+                transport = _pooled_transport_class(httpx)(
+                    self._limits(httpx), self.per_host, self.http2, self.acquire_timeout
+                )
+                # Same timeouts the SDKs use by default
+                client = httpx.Client(transport=transport, timeout=httpx.Timeout(600.0, connect=5.0))
+                self._httpx_clients[httpx.__name__] = client
+            return client
+
+    def _limits(self, httpx) -> Any:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_seconds
+        )
+
+    def async_httpx_client(self, sdk_client_class) -> Any:
+        """Pooled httpx AsyncClient for AsyncOpenAI/AsyncAnthropic and async
+        Serper calls. Async connections are bound to an event loop, so each
+        running loop gets its own pool, shared by every SDK on it."""
+        httpx = httpx_module(sdk_client_class)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(httpx.__name__)
+            if client is None:
+                transport = _pooled_async_transport_class(httpx)(
+                    self._limits(httpx), self.per_host, self.http2, self.acquire_timeout
+                )
+                client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(600.0, connect=5.0))
+                clients[httpx.__name__] = client
+            return client
+
+    async def aclose(self):
+        """Close the async pools belonging to the running event loop"""
+        with self._lock:
+            clients = list(self._async_clients.pop(asyncio.get_running_loop(), {}).values())
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Open/idle connections and reuse ratio per pool and host"""
+        pools: Dict[str, Any] = {}
+        with self._lock:
+            clients = list(self._httpx_clients.items())
+            for loop_clients in list(self._async_clients.values()):
+                clients.extend((f"{name}-async", client) for name, client in loop_clients.items())
+        for name, client in clients:
+            transport_stats = client._transport.stats()
+            if name in pools:
+                # Async pools from several event loops are reported together
+                merged = pools[name]
+                merged["open_connections"] += transport_stats["open_connections"]
+                merged["idle_connections"] += transport_stats["idle_connections"]
+                for host, counts in transport_stats["hosts"].items():
+                    totals = merged["hosts"].setdefault(host, {"requests": 0, "new_connections": 0, "in_flight": 0})
+                    for field, value in counts.items():
+                        totals[field] += value
+                transport_stats = merged
+            requests_made = sum(h["requests"] for h in transport_stats["hosts"].values())
+            new_connections = sum(h["new_connections"] for h in transport_stats["hosts"].values())
+            pools[name] = dict(
+                transport_stats,
+                requests=requests_made,
+                new_connections=new_connections,
+                reuse_ratio=_reuse_ratio(requests_made, new_connections)
+            )
+
+        # urllib3 keeps one pool per host behind the requests adapter
+        hosts = {}
+        open_connections = idle = 0
+        manager = self._adapter.poolmanager if self._adapter else None
+        for key in list(manager.pools.keys()) if manager else []:
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            # The pool queue holds idle connections plus None placeholders;
+            # whatever is missing from it is checked out
+            queued = list(pool.pool.queue) if pool.pool else []
+            pool_idle = sum(1 for conn in queued if conn is not None)
+            in_use = pool.pool.maxsize - len(queued) if pool.pool else 0
+            hosts[pool.host] = {
+                "requests": pool.num_requests,
+                "new_connections": pool.num_connections,
+                "in_flight": in_use
+            }
+            open_connections += pool_idle + in_use
+            idle += pool_idle
+        requests_made = sum(h["requests"] for h in hosts.values())
+        new_connections = sum(h["new_connections"] for h in hosts.values())
+        pools["requests"] = {
+            "open_connections": open_connections,
+            "idle_connections": idle,
+            "hosts": hosts,
+            "requests": requests_made,
+            "new_connections": new_connections,
+            "reuse_ratio": _reuse_ratio(requests_made, new_connections)
+        }
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "per_host": self.per_host,
+            "keepalive_seconds": self.keepalive_seconds,
+            "pools": pools
+        }
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            clients = list(self._httpx_clients.values())
+            self._httpx_clients.clear()
+            # Async pools can only be closed from their own loop (see aclose)
+            self._async_clients.clear()
+        for client in clients:
+            client.close()
+
+
+def _reuse_ratio(requests_made: int, new_connections: int) -> Optional[float]:
+    if not requests_made:
+        return None
+    return max(0.0, 1 - new_connections / requests_made)
+
+
+def youtube_search(query: str, max_results: int = 10, base_url: str = "", session: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """youtube_search results for a query. The library always fetches its
+    results page from youtube.com; base_url sends that request to another
+    origin instead, such as a local stand-in server."""
+    from youtube_search import YoutubeSearch
+    if not base_url:
+        return YoutubeSearch(query, max_results=max_results).to_dict()
+
+    class OriginSearch(YoutubeSearch):
+        def _search(self):
+            import requests
+            response = (session or requests).get(
+                f"{base_url.rstrip('/')}/results", params={"search_query": self.search_terms}, timeout=self.timeout
+            )
+            return self._parse_html(response.text)[:self.max_results]
+
+    return OriginSearch(query, max_results=max_results).to_dict()
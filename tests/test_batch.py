@@ -0,0 +1,28 @@
+import io
+import json
+
+from sage_lens_batch import completed_topics, percentile, read_topics
+
+
+def test_read_topics_skips_blanks_comments_and_repeats():
+    source = io.StringIO("# topics\nQuantum computing\n\n  RAG  \nQuantum computing\n#skip\n")
+    assert read_topics(source) == ["Quantum computing", "RAG"]
+
+
+def test_completed_topics(tmp_path):
+    output = tmp_path / "out.jsonl"
+    assert completed_topics(str(output)) == set()
+    output.write_text(
+        json.dumps({"topic": "done", "status": "ok"}) + "\n"
+        + json.dumps({"topic": "failed", "status": "error"}) + "\n"
+        + '{"topic": "cut off", "sta'
+    )
+    assert completed_topics(str(output)) == {"done"}
+
+
+def test_percentile_is_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile(values, 0) == 1
+    assert percentile([], 50) == 0.0
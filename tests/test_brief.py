@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from sage_lens_brief import cited_sources, parse_brief, render_brief
+from sage_lens_tokens import ContextBudget
+
+WEB = [
+    {"title": "First", "url": "https://a.example/1"},
+    {"title": "Second", "url": "https://b.example/2"}
+]
+
+
+def brief(**overrides):
+    data = {
+        "summary": "Overview.",
+        "outline": [{"heading": "Basics", "points": ["one", "two"]}],
+        "key_facts": [{"fact": "A fact", "sources": [1, 2]}],
+        "citations": [{"source": 2, "note": "supports the fact"}]
+    }
+    data.update(overrides)
+    return json.dumps(data)
+
+
+def test_parses_fenced_reply_with_chatter():
+    parsed = parse_brief("Here you go:\n```json\n" + brief() + "\n```", WEB)
+    assert parsed["outline"] == [{"heading": "Basics", "points": ["one", "two"]}]
+    assert parsed["key_facts"] == [{"fact": "A fact", "sources": [1, 2]}]
+    assert cited_sources(parsed) == {1, 2}
+
+
+def test_drops_out_of_range_and_duplicate_sources():
+    parsed = parse_brief(brief(key_facts=[{"fact": "f", "sources": [2, 2, 0, 7, "x"]}], citations=[{"source": 9}]), WEB)
+    assert parsed["key_facts"][0]["sources"] == [2]
+    assert parsed["citations"] == []
+
+
+def test_sources_beyond_the_prompt_are_dropped():
+    web = [{"title": f"Source {i}", "url": f"https://example.com/{i}", "snippet": "word " * 40} for i in range(8)]
+    budget = ContextBudget(web_budget=60, max_results=5)
+    shown = budget.web_sources(web, numbered=True)
+    assert len(budget.web_context(web, numbered=True).splitlines()) == len(shown) < 5
+    parsed = parse_brief(brief(key_facts=[{"fact": "f", "sources": [1, len(shown) + 1, 6]}], citations=[{"source": 5}]), shown)
+    assert parsed["key_facts"][0]["sources"] == [1]
+    assert parsed["citations"] == []
+
+
+@pytest.mark.parametrize("field", ["outline", "key_facts", "citations"])
+def test_null_lists_read_as_empty(field):
+    parsed = parse_brief(brief(**{field: None}), WEB)
+    assert parsed is not None
+    assert parsed[field] == []
+
+
+def test_null_points_sources_and_strings():
+    parsed = parse_brief(brief(
+        summary=None,
+        outline=[{"heading": None, "points": None}, {"heading": "Kept", "points": "not a list"}],
+        key_facts=[{"fact": "f", "sources": None}],
+        citations=[{"source": 1, "note": None}]
+    ), WEB)
+    assert parsed["summary"] == ""
+    assert parsed["outline"] == [{"heading": "Kept", "points": []}]
+    assert parsed["key_facts"] == [{"fact": "f", "sources": []}]
+    assert parsed["citations"] == [{"source": 1, "note": ""}]
+
+
+@pytest.mark.parametrize("text", ["", "plain markdown", "[1, 2]", '{"summary": "only"}', brief(outline=None, key_facts=None)])
+def test_not_a_brief(text):
+    assert parse_brief(text, WEB) is None
+
+
+def test_render_lists_only_cited_sources():
+    rendered = render_brief(parse_brief(brief(key_facts=[{"fact": "f", "sources": [2]}], citations=[]), WEB), WEB)
+    assert "[2] Second (https://b.example/2)" in rendered
+    assert "First" not in rendered
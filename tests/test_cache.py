@@ -0,0 +1,193 @@
+import time
+import threading
+
+import pytest
+
+from sage_lens_cache import BackgroundRefresher, CompletionCache, SearchCache, TieredCache
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_memory_then_disk_tier(db):
+    cache = TieredCache(db, memory_items=1)
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    # "a" was pushed out of memory but is still on disk, and comes back to memory
+    assert cache.lookup("a")[0] == "disk"
+    assert cache.lookup("a")[0] == "memory"
+    assert TieredCache(db).get("b") == {"n": 2}
+
+
+def test_memory_tier_is_lru():
+    cache = TieredCache(None, memory_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1 and cache.get("b") is None and cache.get("c") == 3
+
+
+def test_expired_entries_miss(db):
+    cache = TieredCache(db, default_ttl=3600)
+    cache.set("gone", "old", ttl=-1)
+    cache.set("live", "new")
+    assert cache.get("gone") is None
+    assert TieredCache(db).get("gone") is None
+    assert cache.get("live") == "new"
+    assert cache.disk_usage()["entries"] == 1
+
+
+def test_stale_reads_are_opt_in_and_bounded_by_retention(db):
+    cache = TieredCache(db, stale_retention=60)
+    cache.set("k", "v", ttl=-10)
+    assert cache.lookup("k") == (None, None)
+    tier, entry = cache.lookup("k", max_stale=30)
+    assert tier == "memory" and entry["value"] == "v" and entry["expires_at"] < entry["stored_at"]
+    # Older than max_stale, or than the retention whatever max_stale asks for
+    assert cache.lookup("k", max_stale=5) == (None, None)
+    cache.set("older", "v", ttl=-100)
+    assert cache.lookup("older", max_stale=1000) == (None, None)
+
+
+def test_disk_tier_evicts_least_recently_used_rows(db):
+    # Each row is 92 bytes: three fit, four do not
+    cache = TieredCache(db, memory_items=1, max_disk_bytes=300)
+    for key in "abc":
+        cache.set(key, "x" * 90)
+    # Reading "a" back from disk makes "b" the least recently used row
+    assert cache.lookup("a")[0] == "disk"
+    cache.set("d", "x" * 90)
+    assert cache.disk_usage() == {"entries": 3, "bytes": 276}
+    fresh = TieredCache(db)
+    assert fresh.get("b") is None
+    assert all(fresh.get(key) for key in "acd")
+
+
+def test_compressed_rows_round_trip(db):
+    value = {"content": "repeated text " * 200}
+    plain = TieredCache(db + ".plain")
+    packed = TieredCache(db, compress=True)
+    plain.set("k", value)
+    packed.set("k", value)
+    assert TieredCache(db, compress=True).get("k") == value
+    assert packed.disk_usage()["bytes"] < plain.disk_usage()["bytes"] / 10
+
+
+def stale_search_cache(db, refresher=None):
+    cache = SearchCache(TieredCache(db, stale_retention=3600), ttls={"tavily": 3600}, max_stale={"tavily": 600}, refresher=refresher)
+    # Stored already expired, so every read is a stale hit
+    cache.cache.set(cache.key("tavily", "Solid-state batteries", 5), ["old"], ttl=-5)
+    return cache
+
+
+def test_stale_result_is_served_and_refreshed_in_the_background(db):
+    cache = stale_search_cache(db)
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        return ["new"]
+
+    assert cache.get_or_fetch("tavily", "solid-state  batteries?", 5, fetch) == ["old"]
+    release.set()
+    for _ in range(100):
+        if cache.refresher.stats()["refreshed"]:
+            break
+        time.sleep(0.01)
+    assert cache.get_or_fetch("tavily", "solid-state batteries", 5, lambda: pytest.fail("fresh entry refetched")) == ["new"]
+    stats = cache.stats()["tavily"]
+    assert (stats["stale_hits"], stats["refreshes"], stats["memory_hits"], stats["misses"]) == (1, 1, 1, 0)
+    assert stats["max_stale_age"] >= 5
+
+
+def test_failed_refresh_keeps_the_stale_result(db):
+    cache = stale_search_cache(db)
+    assert cache.get_or_fetch("tavily", "solid-state batteries", 5, lambda: []) == ["old"]
+    for _ in range(100):
+        if cache.refresher.stats()["failed"]:
+            break
+        time.sleep(0.01)
+    assert cache.stats()["tavily"]["refresh_failures"] == 1
+    assert cache.get_or_fetch("tavily", "solid-state batteries", 5, lambda: ["new"]) == ["old"]
+
+
+def test_too_stale_results_are_fetched_inline(db):
+    cache = SearchCache(TieredCache(db, stale_retention=3600), max_stale={"serper": 60})
+    cache.cache.set(cache.key("serper", "q", 5), ["old"], ttl=-120)
+    assert cache.get_or_fetch("serper", "q", 5, lambda: ["new"]) == ["new"]
+    assert cache.stats()["serper"]["misses"] == 1
+
+
+def test_refresher_runs_one_refresh_per_key_and_drops_overflow():
+    refresher = BackgroundRefresher(workers=1, max_pending=2)
+    release = threading.Event()
+
+    def refresh():
+        return release.wait(5)
+
+    assert refresher.schedule("a", refresh)
+    assert not refresher.schedule("a", refresh)
+    assert refresher.schedule("b", refresh)
+    assert not refresher.schedule("c", refresh)
+    release.set()
+    for _ in range(100):
+        if refresher.stats()["refreshed"] == 2:
+            break
+        time.sleep(0.01)
+    assert refresher.stats() == {"scheduled": 2, "refreshed": 2, "failed": 0, "dropped": 1, "pending": 0}
+
+
+REQUEST = {"model": "gpt-4-turbo", "temperature": 0.7, "max_tokens": 2000, "messages": [{"role": "user", "content": "Explain batteries"}]}
+
+
+def completion_cache(db):
+    return CompletionCache(TieredCache(db, compress=True), ttl=3600)
+
+
+def test_completion_key_covers_what_changes_the_answer():
+    key = CompletionCache.key("openai", REQUEST)
+    assert key == CompletionCache.key("openai", dict(reversed(list(REQUEST.items()))))
+    assert key == CompletionCache.key("openai", dict(REQUEST, stream=True))
+    for changed in ({"model": "gpt-4o"}, {"temperature": 0.2}, {"max_tokens": 100}, {"messages": [{"role": "user", "content": "Explain cells"}]}):
+        assert CompletionCache.key("openai", dict(REQUEST, **changed)) != key
+    assert CompletionCache.key("deepseek", REQUEST) != key
+
+
+def test_completions_are_stored_compressed_and_replayed(db):
+    cache = completion_cache(db)
+    calls = []
+    replayed = []
+
+    def call():
+        calls.append(1)
+        return {"content": "Batteries store energy. " * 50, "provider": "OpenAI", "latency": 2.5, "usage": {"output_tokens": 250}}
+
+    first = cache.complete("openai", REQUEST, call)
+    assert not first.get("cached")
+    assert cache.cache.disk_usage()["bytes"] < len(first["content"]) / 5
+
+    hit = completion_cache(db).complete("openai", REQUEST, call, on_hit=lambda result: replayed.append(result["content"]))
+    assert calls == [1]
+    assert hit["cached"] and hit["cache_tier"] == "disk"
+    assert hit["content"] == first["content"] and hit["usage"] == {"output_tokens": 250}
+    assert hit["original_latency"] == 2.5 and hit["latency"] < 2.5
+    assert replayed == [first["content"]]
+
+
+def test_use_cache_false_bypasses_the_lookup_but_refreshes_the_entry(db):
+    cache = completion_cache(db)
+    cache.complete("openai", REQUEST, lambda: {"content": "old", "latency": 1.0})
+    fresh = cache.complete("openai", REQUEST, lambda: {"content": "new", "latency": 1.0}, use_cache=False)
+    assert fresh["content"] == "new" and not fresh.get("cached")
+    assert cache.complete("openai", REQUEST, lambda: pytest.fail("should hit"))["content"] == "new"
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 1, "bypassed": 1}
+
+
+def test_empty_completions_are_not_stored(db):
+    cache = completion_cache(db)
+    assert cache.complete("openai", REQUEST, lambda: {"content": "", "latency": 1.0})["content"] == ""
+    assert cache.complete("openai", REQUEST, lambda: None) is None
+    assert cache.cache.disk_usage()["entries"] == 0
@@ -0,0 +1,117 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from sage_lens_concurrency import ConcurrentExecutor, StageGraph, gather_within, gather_within_async
+
+
+@pytest.fixture
+def executor():
+    executor = ConcurrentExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def sleeper(seconds, value):
+    def stage(**inputs):
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+def test_independent_stages_overlap(executor):
+    graph = StageGraph()
+    graph.add("research", sleeper(0.01, "brief"))
+    graph.add("content", sleeper(0.1, "text"), inputs=["research"])
+    graph.add("analysis", sleeper(0.1, "notes"), inputs=["research"])
+    graph.add("final", lambda content, analysis: content + "+" + analysis, inputs=["content", "analysis"])
+    started = time.perf_counter()
+    outputs = graph.run(executor.group())
+    assert outputs == {"research": "brief", "content": "text", "analysis": "notes", "final": "text+notes"}
+    assert time.perf_counter() - started < 0.19
+
+    report = graph.report()
+    assert report["critical_path"][0] == "research" and report["critical_path"][-1] == "final"
+    assert report["saved"] > 0.05
+    assert report["critical_time"] < report["serial_time"]
+
+
+def test_stages_after_a_failure_or_none_are_skipped(executor):
+    def fail():
+        raise RuntimeError("provider down")
+
+    graph = StageGraph()
+    graph.add("research", fail)
+    graph.add("content", lambda research: "text", inputs=["research"])
+    graph.add("empty", lambda: None)
+    graph.add("analysis", lambda empty: "notes", inputs=["empty"])
+    graph.add("videos", lambda: ["v"])
+    outputs = graph.run(executor.group())
+    assert outputs == {"research": None, "content": None, "empty": None, "analysis": None, "videos": ["v"]}
+    statuses = {name: timing["status"] for name, timing in graph.report()["stages"].items()}
+    assert statuses == {"research": "error", "content": "skipped", "empty": "ok", "analysis": "skipped", "videos": "ok"}
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        StageGraph().add("content", lambda research: research, inputs=["research"])
+
+
+def test_async_graph_runs_stages_concurrently(executor):
+    async def stage(seconds, value, **inputs):
+        await asyncio.sleep(seconds)
+        return value
+
+    graph = StageGraph()
+    graph.add("a", lambda: stage(0.05, 1))
+    graph.add("b", lambda: stage(0.05, 2))
+    graph.add("c", lambda a, b: stage(0, a + b), inputs=["a", "b"])
+    started = time.perf_counter()
+    assert asyncio.run(graph.run_async(executor.group())) == {"a": 1, "b": 2, "c": 3}
+    assert time.perf_counter() - started < 0.09
+
+
+def test_gather_within_stops_waiting_after_the_grace(executor):
+    release = threading.Event()
+    futures = {
+        "fast": executor.submit(sleeper(0, "fast")),
+        "empty": executor.submit(sleeper(0, "")),
+        "slow": executor.submit(lambda: release.wait(5) and "slow")
+    }
+    try:
+        outcome = gather_within(futures, deadline=5, grace=0.05, accept=bool)
+    finally:
+        release.set()
+    assert outcome["results"] == {"fast": "fast"}
+    assert outcome["stragglers"] == ["slow"]
+    assert outcome["elapsed"] < 1
+
+
+def test_gather_within_deadline_without_a_result(executor):
+    release = threading.Event()
+    futures = {"slow": executor.submit(lambda: release.wait(5))}
+    try:
+        outcome = gather_within(futures, deadline=0.05)
+    finally:
+        release.set()
+    assert outcome["results"] == {} and outcome["stragglers"] == ["slow"]
+    assert outcome["elapsed"] < 1
+
+
+def test_gather_within_async_cancels_stragglers():
+    async def answer(seconds, value):
+        await asyncio.sleep(seconds)
+        return value
+
+    async def main():
+        tasks = {"fast": asyncio.create_task(answer(0, "fast")), "slow": asyncio.create_task(answer(5, "slow"))}
+        outcome = await gather_within_async(tasks, deadline=5, grace=0.05)
+        await asyncio.sleep(0)
+        return outcome, tasks["slow"].cancelled()
+
+    outcome, cancelled = asyncio.run(main())
+    assert outcome["results"] == {"fast": "fast"}
+    assert outcome["stragglers"] == ["slow"]
+    assert cancelled
@@ -0,0 +1,54 @@
+import pytest
+
+from sage_lens_enhanced import make_section_router, split_fused_sections
+
+FUSED = "Sure!\n<<<RESEARCH>>>\nFindings.\n<<< content >>>\nThe article.\n\n<<<ANALYSIS>>>\nScore: 8/10\n"
+
+
+def test_split_fused_sections():
+    assert split_fused_sections(FUSED) == {"research": "Findings.", "content": "The article.", "analysis": "Score: 8/10"}
+
+
+def test_response_without_markers_is_content():
+    assert split_fused_sections("Just an article.") == {"content": "Just an article."}
+    assert split_fused_sections(None) == {"content": ""}
+
+
+def test_marker_must_stand_alone_on_its_line():
+    assert split_fused_sections("<<<RESEARCH>>>\nSee the <<<CONTENT>>> marker.") == {"research": "See the <<<CONTENT>>> marker."}
+
+
+def route_in_chunks(text, size):
+    received = []
+    route, flush = make_section_router(lambda label, delta: received.append((label, delta)))
+    for i in range(0, len(text), size):
+        route(text[i:i + size])
+    flush()
+    sections = {}
+    for label, delta in received:
+        sections[label] = sections.get(label, "") + delta
+    return sections
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(FUSED)])
+def test_router_splits_markers_across_deltas(size):
+    sections = route_in_chunks(FUSED, size)
+    assert {label: text.strip() for label, text in sections.items()} == {
+        "research_agent": "Sure!\nFindings.",
+        "content_agent": "The article.",
+        "analysis_agent": "Score: 8/10"
+    }
+    assert not any("<<<" in text for text in sections.values())
+
+
+def test_router_streams_long_sections_before_the_next_marker():
+    received = []
+    route, _ = make_section_router(lambda label, delta: received.append((label, delta)))
+    route("<<<CONTENT>>>\n" + "word " * 20)
+    assert received and received[0][0] == "content_agent"
+
+
+def test_text_after_a_marker_on_its_line_is_not_a_marker():
+    # The first delta ends right after what looks like a complete marker
+    sections = route_in_chunks("<<<RESEARCH>>>\n<<<CONTENT>>> opens the article.\n", 28)
+    assert sections == {"research_agent": "<<<CONTENT>>> opens the article.\n"}
@@ -0,0 +1,99 @@
+import pytest
+
+from sage_lens_history import HistoryStore, _units, apply_delta, content_diff, make_delta
+
+
+def result(topic, content, n=0):
+    return {
+        "content": {"content": content, "provider": "OpenAI", "latency": 1.0},
+        "analysis": None,
+        "references": {"web": [{"title": f"Source {i}", "url": f"https://example.com/{i}"} for i in range(5)], "videos": []},
+        "metadata": {"timestamp": f"2026-01-01T00:00:{n:02d}", "topic": topic, "method": "Standard"}
+    }
+
+
+def test_versions_round_trip_with_summaries(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), keyframe_every=1)
+    stored = result("Batteries", "Solid-state cells.", 1)
+    version_id = store.add("s", stored)
+    assert store.load("s", version_id) == stored
+    assert store.entries("s") == [{
+        "timestamp": "2026-01-01T00:00:01", "topic": "Batteries", "method": "Standard",
+        "provider": "OpenAI", "latency": 1.0, "id": version_id
+    }]
+
+
+def test_sessions_only_see_their_own_versions(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), keyframe_every=1)
+    other = store.add("t", result("Batteries", "theirs"))
+    assert store.entries("s") == []
+    assert store.load("s", other) is None
+    store.clear("t")
+    assert store.stats()["versions"] == 0
+
+
+def test_sessions_keep_their_newest_versions(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), max_per_session=3, keyframe_every=1)
+    ids = [store.add("s", result(f"Topic {v}", f"content {v}", v)) for v in range(5)]
+    assert [entry["id"] for entry in store.entries("s")] == ids[2:]
+    assert store.stats()["evicted"] == 2
+    assert store.load("s", ids[0]) is None
+
+
+def test_byte_budget_keeps_the_newest_version(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), max_bytes=1, keyframe_every=1)
+    store.add("s", result("A", "first"))
+    newest = store.add("s", result("B", "second", 1))
+    assert [entry["id"] for entry in store.entries("s")] == [newest]
+
+
+def document(version):
+    paragraphs = [f"Paragraph {i} about solid-state batteries and their electrolytes." for i in range(40)]
+    paragraphs[version % 40] = f"Rewritten paragraph in version {version}."
+    return "\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("base, target", [
+    ("", "new"),
+    ('{"a": "x\\ny"}', '{"a": "x\\nz\\ny", "b": 1}'),
+    ("line\n" * 50, "line\n" * 20 + "changed\n" + "line\n" * 30),
+    ("same", "same")
+])
+def test_delta_round_trip(base, target):
+    assert "".join(apply_delta(_units(base), make_delta(base, target))) == target
+
+
+def test_regenerations_are_stored_as_deltas_with_keyframes(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), keyframe_every=4)
+    ids = [store.add("s", result("Batteries", document(v), v)) for v in range(6)]
+    stats = store.stats()
+    assert stats["versions"] == 6
+    # Versions 0 and 4 are keyframes
+    assert stats["delta_versions"] == 4
+    assert stats["bytes"] < stats["raw_bytes"] / 3
+    for v, version_id in enumerate(ids):
+        assert store.load("s", version_id)["content"]["content"] == document(v)
+
+
+def test_deltas_stay_within_a_topic(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), keyframe_every=4)
+    store.add("s", result("Batteries", document(0)))
+    store.add("s", result("Quantum error correction", document(1), 1))
+    store.add("t", result("batteries!", document(2), 2))
+    assert store.stats()["delta_versions"] == 0
+    store.add("s", result("  BATTERIES ", document(3), 3))
+    assert store.stats()["delta_versions"] == 1
+
+
+def test_evicting_a_base_keeps_later_versions_loadable(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), max_per_session=3, keyframe_every=10)
+    ids = [store.add("s", result("Batteries", document(v), v)) for v in range(5)]
+    assert [entry["id"] for entry in store.entries("s")] == ids[2:]
+    for v in range(2, 5):
+        assert store.load("s", ids[v])["content"]["content"] == document(v)
+
+
+def test_content_diff():
+    diff = content_diff(result("A", "one\ntwo\n", 1), result("A", "one\nthree\n", 2))
+    assert diff[:2] == ["--- 2026-01-01T00:00:01", "+++ 2026-01-01T00:00:02"]
+    assert "-two" in diff and "+three" in diff
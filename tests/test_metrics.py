@@ -0,0 +1,61 @@
+import pytest
+
+from sage_lens_metrics import MetricsRegistry
+
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    queries = registry.counter("sage_lens_queries_total", "Research queries run", ("engine", "outcome"))
+    queries.inc(engine="sync", outcome="ok")
+    queries.inc(2, engine="async", outcome="error")
+    registry.gauge("sage_lens_jobs", "Jobs by status", ("status",)).set(3, status="running")
+    assert registry.render() == (
+        "# HELP sage_lens_queries_total Research queries run\n"
+        "# TYPE sage_lens_queries_total counter\n"
+        'sage_lens_queries_total{engine="sync",outcome="ok"} 1\n'
+        'sage_lens_queries_total{engine="async",outcome="error"} 2\n'
+        "# HELP sage_lens_jobs Jobs by status\n"
+        "# TYPE sage_lens_jobs gauge\n"
+        'sage_lens_jobs{status="running"} 3\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("sage_lens_search_seconds", "Search time", ("provider",), buckets=(1, 0.5))
+    for value in (0.2, 0.7, 3):
+        latency.observe(value, provider="tavily")
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE sage_lens_search_seconds histogram"
+    assert lines[2:] == [
+        'sage_lens_search_seconds_bucket{provider="tavily",le="0.5"} 1',
+        'sage_lens_search_seconds_bucket{provider="tavily",le="1"} 2',
+        'sage_lens_search_seconds_bucket{provider="tavily",le="+Inf"} 3',
+        'sage_lens_search_seconds_sum{provider="tavily"} 3.9',
+        'sage_lens_search_seconds_count{provider="tavily"} 3'
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors", ("error",)).inc(error='bad "quote"\\\nnext')
+    assert registry.render().splitlines()[-1] == 'errors_total{error="bad \\"quote\\"\\\\\\nnext"} 1'
+
+
+def test_misuse_is_rejected():
+    registry = MetricsRegistry()
+    counter = registry.counter("calls_total", "Calls", ("provider",))
+    with pytest.raises(ValueError):
+        counter.inc(-1, provider="openai")
+    with pytest.raises(ValueError):
+        counter.inc(model="gpt-4")
+    assert registry.counter("calls_total", "Calls", ("provider",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total", "Calls", ("provider",))
+
+
+def test_a_failing_collector_does_not_break_rendering():
+    registry = MetricsRegistry()
+    registry.collector(lambda: 1 / 0)
+    registry.collector(lambda: [("queue_depth", "gauge", "Queued calls", [("", {"provider": "openai"}, 2.5)])])
+    assert registry.render().splitlines()[-1] == 'queue_depth{provider="openai"} 2.5'
@@ -0,0 +1,72 @@
+import pytest
+
+from sage_lens_cache import normalize_query
+from sage_lens_ranking import canonical_url, merge_results
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Quantum  Computing?", "quantum computing"),
+    ("  what's   NEW in RAG  ", "what s new in rag"),
+    ("", "")
+])
+def test_normalize_query(query, expected):
+    assert normalize_query(query) == expected
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.example.com/post/",
+    "http://example.com/post?utm_source=x&gclid=1",
+    "https://m.example.com//post/index.html",
+    "https://example.com/post/amp",
+    "https://example-com.cdn.ampproject.org/c/s/example.com/post"
+])
+def test_mirrors_share_a_canonical_url(url):
+    assert canonical_url(url) == "example.com/post"
+
+
+def test_content_parameters_are_kept():
+    assert canonical_url("https://example.com/search?q=a&page=2") == "example.com/search?page=2&q=a"
+    assert canonical_url("https://example.com:8080/a") == "example.com:8080/a"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/docs/page/", "/docs/page"),
+    ("docs/page?utm_source=x&id=7", "docs/page?id=7"),
+    ("ab", "ab")
+])
+def test_hostless_urls_keep_their_path(url, expected):
+    assert canonical_url(url) == expected
+
+
+def item(url, title="", snippet=""):
+    return {"url": url, "title": title, "snippet": snippet}
+
+
+def test_results_found_by_both_engines_rank_first():
+    merged, stats = merge_results({
+        "tavily": [item("https://a.com/1"), item("https://b.com/2")],
+        "serper": [item("https://www.b.com/2/"), item("https://c.com/3")]
+    })
+    # The cluster keeps its best-ranked copy: Serper's first result
+    assert [r["url"] for r in merged] == ["https://www.b.com/2/", "https://a.com/1", "https://c.com/3"]
+    assert merged[0]["sources"] == ["serper", "tavily"]
+    assert stats == {"candidates": 4, "url_duplicates": 1, "near_duplicates": 0, "returned": 3}
+
+
+def test_near_duplicate_pages_are_merged():
+    text = "Solid state batteries replace the liquid electrolyte with a solid one for safety and density"
+    merged, stats = merge_results({
+        "tavily": [item("https://news.com/a", "Solid-state batteries explained", text)],
+        "serper": [item("https://mirror.net/copy", "Solid-state batteries explained", text + ".")]
+    })
+    assert len(merged) == 1
+    assert stats["near_duplicates"] == 1
+
+
+def test_weights_and_limit():
+    merged, _ = merge_results(
+        {"tavily": [item("https://a.com")], "serper": [item("https://b.com")]},
+        max_results=1,
+        weights={"serper": 2.0}
+    )
+    assert [r["url"] for r in merged] == ["https://b.com"]
@@ -0,0 +1,63 @@
+import pytest
+
+from sage_lens_ratelimit import ProviderLimiter, TokenBucket
+
+
+def test_bucket_refills_continuously_up_to_one_minute():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1, bucket.updated) == pytest.approx(1.0)
+    assert bucket.wait_time(1, bucket.updated + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, bucket.updated + 1000) == 0.0
+    assert bucket.level == 60
+
+
+def test_oversized_requests_wait_for_a_full_bucket():
+    bucket = TokenBucket(60)
+    bucket.take(30)
+    assert bucket.wait_time(500, bucket.updated) == pytest.approx(30.0)
+
+
+def test_give_back_is_capped():
+    bucket = TokenBucket(60)
+    bucket.take(10)
+    bucket.give_back(100)
+    assert bucket.level == 60
+
+
+def test_settle_corrects_the_estimate():
+    limiter = ProviderLimiter("openai", tpm=6000)
+    reservation = limiter.reserve(1000)
+    assert limiter._tokens.level == pytest.approx(5000, abs=1)
+    reservation.settle({"input_tokens": 200, "output_tokens": 100})
+    assert limiter._tokens.level == pytest.approx(5700, abs=1)
+    # Settling twice changes nothing
+    reservation.settle({"input_tokens": 5000, "output_tokens": 0})
+    assert limiter._tokens.level == pytest.approx(5700, abs=1)
+    assert limiter.stats()["actual_tokens"] == 300
+
+
+def test_failed_calls_give_their_estimate_back():
+    limiter = ProviderLimiter("openai", rpm=2, tpm=6000)
+    for _ in range(2):
+        limiter.reserve(2500).refund()
+    assert limiter._tokens.level == pytest.approx(6000, abs=1)
+    # The requests themselves still count
+    assert limiter._requests.level == pytest.approx(0, abs=0.1)
+    assert limiter.stats()["actual_tokens"] == 0
+
+
+def test_refund_after_settle_is_ignored():
+    limiter = ProviderLimiter("openai", tpm=6000)
+    reservation = limiter.reserve(1000)
+    reservation.settle({"input_tokens": 1500, "output_tokens": 0})
+    reservation.refund()
+    assert limiter._tokens.level == pytest.approx(4500, abs=1)
+
+
+def test_callers_proceed_after_max_wait():
+    limiter = ProviderLimiter("serper", rpm=1, max_wait=0.05)
+    limiter.reserve()
+    reservation = limiter.reserve()
+    assert reservation.waited >= 0.05
+    assert limiter.stats()["timeouts"] == 1
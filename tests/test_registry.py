@@ -0,0 +1,49 @@
+from sage_lens_registry import SystemRegistry
+
+
+class System:
+    def __init__(self, config):
+        self.config = config
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_rebuilds_only_on_config_change():
+    registry = SystemRegistry()
+    first = registry.get("agentic", {"key": "a"}, System)
+    assert registry.get("agentic", {"key": "a"}, System) is first
+    second = registry.get("agentic", {"key": "b"}, System)
+    assert second is not first and first.closed
+    assert registry.stats()["agentic"]["builds"] == 2
+
+
+def test_leased_system_is_closed_after_its_last_release():
+    registry = SystemRegistry()
+    first = registry.get("agentic", {"key": "a"}, System, acquire=True)
+    registry.get("agentic", {"key": "a"}, System, acquire=True)
+    registry.get("agentic", {"key": "b"}, System)
+    assert not first.closed
+    registry.release(first)
+    assert not first.closed
+    registry.release(first)
+    assert first.closed
+
+
+def test_release_without_retirement_keeps_the_system_open():
+    registry = SystemRegistry()
+    system = registry.get("agentic", {"key": "a"}, System, acquire=True)
+    registry.release(system)
+    assert not system.closed
+    assert registry.stats()["agentic"]["leases"] == 0
+
+
+def test_clear_defers_leased_systems():
+    registry = SystemRegistry()
+    leased = registry.get("agentic", {"key": "a"}, System, acquire=True)
+    idle = registry.get("legacy", {"key": "a"}, System)
+    registry.clear()
+    assert idle.closed and not leased.closed
+    registry.release(leased)
+    assert leased.closed
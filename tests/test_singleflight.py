@@ -0,0 +1,119 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from sage_lens_singleflight import SingleFlight
+from sage_lens_streaming import StreamCancelled
+
+
+def lead_with_follower(flight, value, after=None):
+    """Lead a call for "k" that a second thread joins while it runs. The
+    leader's result goes through after() as soon as do() returns; gives
+    the leader's and the follower's (value, shared)."""
+    follower = {}
+    joined = threading.Event()
+
+    def follow():
+        follower["result"] = flight.do("k", lambda: pytest.fail("follower must not execute"))
+        joined.set()
+
+    def work():
+        threading.Thread(target=follow).start()
+        while flight.stats()["coalesced"] == 0:
+            time.sleep(0.001)
+        return value
+
+    leader = flight.do("k", work)
+    if after:
+        after(leader[0])
+    assert joined.wait(5)
+    return leader, follower["result"]
+
+
+def test_follower_shares_one_execution():
+    flight = SingleFlight()
+    leader, follower = lead_with_follower(flight, {"content": "text"})
+    assert leader == ({"content": "text"}, False)
+    assert follower == ({"content": "text"}, True)
+    assert flight.stats() == {"calls": 2, "executions": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_leader_mutating_its_result_does_not_reach_followers():
+    def mutate(result):
+        # As _generate_with_agent does, straight after the call returns
+        result["provider"] = "Agent-research_agent"
+        result["agent_name"] = "research_agent"
+        result["items"].clear()
+
+    flight = SingleFlight()
+    leader, follower = lead_with_follower(flight, {"provider": "OpenAI", "items": list(range(1000))}, after=mutate)
+    assert leader[0]["agent_name"] == "research_agent"
+    assert follower == ({"provider": "OpenAI", "items": list(range(1000))}, True)
+
+
+def test_exceptions_are_shared_and_the_key_freed():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_followers_get_copies():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return {"content": "text"}
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", work) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert [shared for _, shared in results] == [False, True, True]
+    assert all(value == {"content": "text"} for value, _ in results)
+    assert len({id(value) for value, _ in results}) == 3
+    assert flight.stats()["executions"] == 1
+
+
+def test_async_leader_cancellation_lets_followers_retry():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == (2, False)
+
+
+def test_cancelled_stream_leader_lets_followers_retry():
+    flight = SingleFlight()
+    follower = {}
+
+    def follow():
+        follower["result"] = flight.do("k", lambda: "retried")
+
+    def work():
+        thread = threading.Thread(target=follow)
+        thread.start()
+        while flight.stats()["coalesced"] == 0:
+            time.sleep(0.001)
+        follower["thread"] = thread
+        raise StreamCancelled("openai stream cancelled")
+
+    with pytest.raises(StreamCancelled):
+        flight.do("k", work)
+    follower["thread"].join(5)
+    assert follower["result"] == ("retried", False)
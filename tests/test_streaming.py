@@ -0,0 +1,108 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from sage_lens_streaming import AsyncGenerationStream, GenerationStream, StreamCancelled, stream_openai_chat
+
+
+def test_cancelled_stream_is_closed_between_chunks():
+    cancelled = threading.Event()
+    closed = []
+    seen = []
+
+    def deltas(usage):
+        try:
+            for i in range(10):
+                yield f"w{i} "
+        finally:
+            closed.append(True)
+
+    def on_delta(delta):
+        seen.append(delta)
+        if len(seen) == 3:
+            cancelled.set()
+
+    with pytest.raises(StreamCancelled):
+        GenerationStream("OpenAI", deltas).consume(on_delta, cancelled)
+    assert seen == ["w0 ", "w1 ", "w2 "]
+    assert closed == [True]
+
+
+def timed_deltas(first_token_after, chunks, every=0.0, output_tokens=None):
+    def deltas(usage):
+        time.sleep(first_token_after)
+        for i in range(chunks):
+            if i:
+                time.sleep(every)
+            yield f"w{i} "
+        if output_tokens:
+            usage["output_tokens"] = output_tokens
+    return deltas
+
+
+def test_ttft_and_tokens_per_second():
+    seen = []
+    result = GenerationStream("OpenAI", timed_deltas(0.05, 5, every=0.01)).consume(seen.append)
+    assert seen == ["w0 ", "w1 ", "w2 ", "w3 ", "w4 "]
+    assert result["content"] == "w0 w1 w2 w3 w4 "
+    assert 0.05 <= result["ttft"] < result["latency"]
+    # Five chunks over the four gaps after the first token
+    assert 0 < result["tokens_per_sec"] <= 5 / 0.04
+
+
+def test_reported_output_tokens_win_over_chunk_count():
+    result = GenerationStream("Claude", timed_deltas(0, 2, every=0.02, output_tokens=40)).consume()
+    assert result["usage"] == {"output_tokens": 40}
+    assert result["tokens_per_sec"] == pytest.approx(40 / (result["latency"] - result["ttft"]), rel=0.05)
+
+
+def test_empty_stream():
+    result = GenerationStream("OpenAI", timed_deltas(0, 0)).consume()
+    assert result["content"] == "" and result["tokens_per_sec"] == 0.0
+
+
+def test_async_stream_measures_the_same_way():
+    async def deltas(usage):
+        await asyncio.sleep(0.03)
+        for i in range(3):
+            yield f"w{i} "
+            await asyncio.sleep(0.01)
+        usage.update(input_tokens=10, output_tokens=3)
+
+    stream = AsyncGenerationStream("DeepSeek", deltas)
+    with pytest.raises(TypeError):
+        iter(stream)
+    result = asyncio.run(stream.consume())
+    assert result["content"] == "w0 w1 w2 "
+    assert result["ttft"] >= 0.03
+    assert result["usage"] == {"input_tokens": 10, "output_tokens": 3}
+
+
+class Chunk:
+    def __init__(self, content=None, usage=None):
+        self.choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+        self.usage = usage
+
+
+class FakeStream(list):
+    closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+def test_openai_chunks_and_final_usage():
+    stream = FakeStream([Chunk("Hello"), Chunk(""), Chunk(" world"), Chunk(usage=SimpleNamespace(prompt_tokens=7, completion_tokens=2))])
+    requests = []
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: requests.append(kwargs) or stream)))
+    result = stream_openai_chat(client, "OpenAI-gpt-4o", model="gpt-4o", messages=[]).consume()
+    assert result["content"] == "Hello world"
+    assert result["usage"] == {"input_tokens": 7, "output_tokens": 2}
+    assert requests[0]["stream"] and requests[0]["stream_options"] == {"include_usage": True}
+    assert stream.closed
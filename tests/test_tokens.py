@@ -0,0 +1,67 @@
+from sage_lens_tokens import (
+    MIN_OUTPUT_TOKENS,
+    PROMPT_OVERHEAD,
+    TRUNCATION_NOTE,
+    ContextBudget,
+    count_tokens,
+    model_limits
+)
+
+
+def results(n, snippet="word " * 100):
+    return [{"title": f"Source {i}", "url": f"https://example.com/{i}", "snippet": snippet} for i in range(n)]
+
+
+def test_web_context_caps_results_and_snippets():
+    budget = ContextBudget(web_budget=10000, snippet_tokens=10, max_results=5)
+    lines = budget.web_context(results(8)).splitlines()
+    assert len(lines) == 5
+    assert all(line.startswith("- Source") for line in lines)
+    assert all(count_tokens(line.split(": ", 1)[1]) <= 10 for line in lines)
+    assert budget.stats()["web_results_dropped"] == 0
+
+
+def test_web_context_stops_at_the_web_budget():
+    budget = ContextBudget(web_budget=40, snippet_tokens=10, max_results=5)
+    context = budget.web_context(results(5), numbered=True)
+    lines = context.splitlines()
+    assert lines[0].startswith("[1] Source 0:")
+    assert 0 < len(lines) < 5
+    assert count_tokens(context) <= 40
+    assert budget.stats()["web_results_dropped"] == 5 - len(lines)
+
+
+def test_fit_document_keeps_whole_paragraphs():
+    budget = ContextBudget(input_budget=PROMPT_OVERHEAD + 100)
+    paragraphs = [f"Paragraph {i}. " + "text " * 30 for i in range(10)]
+    fitted = budget.fit_document("\n\n".join(paragraphs))
+    assert fitted.endswith(TRUNCATION_NOTE)
+    kept = fitted[:-len(TRUNCATION_NOTE)].split("\n\n")
+    assert kept == paragraphs[:len(kept)]
+    assert count_tokens(fitted[:-len(TRUNCATION_NOTE)]) <= 100
+    assert budget.stats()["documents_trimmed"] == 1
+
+
+def test_short_document_is_untouched():
+    budget = ContextBudget()
+    assert budget.fit_document("short") == "short"
+    assert budget.stats()["documents_trimmed"] == 0
+
+
+def test_max_tokens_follows_stage_and_model_limits():
+    budget = ContextBudget()
+    assert budget.max_tokens("analysis", "gpt-4-turbo", "prompt") == 1200
+    # Content grows with its input, up to the model's completion limit
+    long_prompt = "word " * 4000
+    assert budget.max_tokens("content", "gpt-4o", long_prompt) == 2000 + count_tokens(long_prompt, "gpt-4o") // 2
+    assert budget.max_tokens("content", "gpt-4-turbo", long_prompt) == model_limits("gpt-4-turbo")["output"]
+
+
+def test_max_tokens_leaves_room_in_the_context_window():
+    budget = ContextBudget()
+    context = model_limits(None)["context"]
+    prompt = "word " * 7000
+    room = context - count_tokens(prompt)
+    assert budget.max_tokens("standard", None, prompt) == max(MIN_OUTPUT_TOKENS, min(3000, room))
+    assert budget.max_tokens("standard", None, "word " * 40000) == MIN_OUTPUT_TOKENS
+    assert budget.stats()["requests"] == 2
@@ -0,0 +1,103 @@
+import json
+import asyncio
+import contextvars
+
+import pytest
+
+import sage_lens_tracing
+from sage_lens_concurrency import ConcurrentExecutor
+from sage_lens_tracing import TraceExporter, current_span, span, trace
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Records of the traces exported during the test, kept in memory"""
+    exporter = TraceExporter("", max_bytes=0)
+    records = []
+    export = exporter.export
+    monkeypatch.setattr(exporter, "export", lambda record: (records.append(record), export(record)))
+    monkeypatch.setattr(sage_lens_tracing, "_tracer", exporter)
+    return records
+
+
+def by_name(record):
+    return {s["name"]: s for s in record["spans"]}
+
+
+def test_spans_nest_across_pool_threads(exported):
+    executor = ConcurrentExecutor(max_workers=2)
+
+    def search(provider):
+        with span(f"search.{provider}", provider=provider) as s:
+            s.set(results=5)
+
+    try:
+        with trace("query", topic="batteries") as t:
+            with span("search.web"):
+                futures = [executor.submit(search, provider) for provider in ("tavily", "serper")]
+                for future in futures:
+                    future.result()
+    finally:
+        executor.shutdown(wait=True)
+
+    assert exported == [t.record]
+    spans = by_name(t.record)
+    assert t.record["attributes"] == {"topic": "batteries"}
+    assert spans["search.web"]["parent_id"] == spans["query"]["id"]
+    assert spans["search.tavily"]["parent_id"] == spans["search.web"]["id"]
+    assert spans["search.serper"]["attributes"] == {"provider": "serper", "results": 5}
+    assert all(s["status"] == "ok" for s in spans.values())
+
+
+def test_async_tasks_inherit_the_current_span(exported):
+    async def agent(name):
+        with span(f"agent.{name}"):
+            await asyncio.sleep(0)
+
+    async def main():
+        with trace("query") as t:
+            with span("agents"):
+                await asyncio.gather(agent("content"), agent("analysis"))
+        return t
+
+    spans = by_name(asyncio.run(main()).record)
+    assert spans["agent.content"]["parent_id"] == spans["agent.analysis"]["parent_id"] == spans["agents"]["id"]
+
+
+def test_errors_and_unfinished_spans_are_marked(exported):
+    with pytest.raises(RuntimeError):
+        with trace("query"):
+            with span("llm.openai"):
+                raise RuntimeError("rate limited")
+    spans = by_name(exported[0])
+    assert spans["llm.openai"]["status"] == "error"
+    assert spans["llm.openai"]["attributes"]["error"] == "rate limited"
+    assert spans["query"]["status"] == "error"
+
+    with trace("query") as t:
+        # Opened and never closed, as by an ensemble straggler's thread
+        straggler, context = span("llm.anthropic"), contextvars.copy_context()
+        context.run(straggler.__enter__)
+    assert by_name(t.record)["llm.anthropic"]["status"] == "unfinished"
+    context.run(straggler.__exit__, None, None, None)
+
+
+def test_spans_outside_a_trace_record_nothing(exported):
+    with span("search.web") as s:
+        assert current_span() is None
+        s.set(results=3)
+    assert exported == []
+
+
+def test_exporter_rotates_and_keeps_backups(tmp_path):
+    path = tmp_path / "traces" / "traces.jsonl"
+    exporter = TraceExporter(str(path), max_bytes=1000, backups=2)
+    record = {"trace_id": "t", "spans": [{"name": "query", "pad": "x" * 300}]}
+    for i in range(10):
+        exporter.export(dict(record, trace_id=str(i)))
+    files = sorted(p.name for p in path.parent.iterdir())
+    assert files == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(p.stat().st_size <= 1000 for p in path.parent.iterdir())
+    # The newest trace is in the current file, whole lines only
+    assert json.loads(path.read_text().splitlines()[-1])["trace_id"] == "9"
+    assert exporter.stats() == {"traces": 10, "spans": 10, "failed": 0, "path": str(path)}